@@ -8,6 +8,11 @@ from datetime import timedelta
 from backend.config import config
 from backend.models import db
 from backend.routes import api, views, auth
+from backend.commands import register_commands
+from backend.migrations import upgrade_schema
+from backend.query_stats import init_query_stats
+from backend.metrics import init_metrics
+from backend.profiling import init_profiling
 
 
 def create_app(config_name='default'):
@@ -31,12 +36,29 @@ def create_app(config_name='default'):
     app.register_blueprint(views)
     app.register_blueprint(auth)
     
+    # CLI commands (rollups and other scheduled jobs)
+    register_commands(app)
+    
+    # Per-request SQL statement counts, timings and N+1 warnings
+    init_query_stats(app)
+    
+    # Prometheus /metrics (request latency, DB time, pool, caches, queues)
+    init_metrics(app)
+    
+    # ?__profile=1 on /api calls for admins, optional sampled profiling
+    init_profiling(app)
+    
     # Create tables and initialize roles
     with app.app_context():
         db.create_all()
+        # Add columns/indexes introduced since the tables were created
+        upgrade_schema(db.engine, db.metadata)
         # Create default roles
         from backend.models.user import Role
         Role.create_default_roles()
+        # Counter behind /api/changes tokens
+        from backend.models import ChangeSequence
+        ChangeSequence.ensure_counter()
     
     return app
 
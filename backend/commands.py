@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+GearGuard - CLI Commands (run via `flask --app app <group> <command>`)
+
+Intended for cron / scheduled jobs, e.g. nightly:
+    flask --app app facts refresh --days 2
+    flask --app app exports cleanup
+    flask --app app events prune
+    flask --app app changes prune
+    flask --app app schedules materialize
+    flask --app app counters verify
+
+One-off:
+    flask --app app transitions backfill
+    flask --app app assignments simulate --days 90
+    flask --app app counters recount
+"""
+import click
+from datetime import datetime, timedelta
+from flask.cli import AppGroup
+from backend.models import db
+
+facts_cli = AppGroup('facts', help='Maintain the request_daily_facts rollup.')
+
+
+@facts_cli.command('rebuild')
+def facts_rebuild():
+    """Rebuild the whole rollup from maintenance_request"""
+    from backend.services.facts import rebuild_all_facts
+    rows = rebuild_all_facts()
+    db.session.commit()
+    click.echo(f'Rebuilt request_daily_facts: {rows} rows')
+
+
+@facts_cli.command('refresh')
+@click.option('--days', default=2, show_default=True,
+              help='Number of trailing days (including today) to recompute.')
+def facts_refresh(days):
+    """Recompute recent days (open requests turn overdue as deadlines pass)"""
+    from backend.services.facts import rebuild_facts
+    today = datetime.utcnow().date()
+    rows = rebuild_facts(today - timedelta(days=days - 1), today + timedelta(days=1))
+    db.session.commit()
+    click.echo(f'Refreshed {days} day(s) of request_daily_facts: {rows} rows')
+
+
+sketches_cli = AppGroup('sketches', help='Maintain the request_time_sketches percentiles.')
+
+
+@sketches_cli.command('rebuild')
+def sketches_rebuild():
+    """Rebuild every quantile sketch from maintenance_request"""
+    from backend.services.sketches import rebuild_all_sketches
+    rows = rebuild_all_sketches()
+    db.session.commit()
+    click.echo(f'Rebuilt request_time_sketches: {rows} rows')
+
+
+exports_cli = AppGroup('exports', help='Maintain background report exports.')
+
+
+@exports_cli.command('cleanup')
+@click.option('--orphan-hours', default=6, show_default=True,
+              help='Fail queued/running jobs older than this many hours.')
+def exports_cleanup(orphan_hours):
+    """Delete expired export files and fail orphaned jobs"""
+    from backend.services.exports import purge_expired_exports, fail_orphaned_exports
+    expired = purge_expired_exports()
+    orphaned = fail_orphaned_exports(orphan_hours)
+    click.echo(f'Expired {expired} export(s), failed {orphaned} orphaned job(s)')
+
+
+events_cli = AppGroup('events', help='Maintain the request_events outbox.')
+
+
+@events_cli.command('prune')
+@click.option('--hours', default=None, type=int,
+              help='Keep events newer than this (default EVENT_RETENTION_HOURS).')
+def events_prune(hours):
+    """Delete old live-stream events"""
+    from flask import current_app
+    from backend.services.events import prune_events
+    hours = hours or current_app.config.get('EVENT_RETENTION_HOURS', 24)
+    deleted = prune_events(hours)
+    click.echo(f'Pruned {deleted} request event(s) older than {hours}h')
+
+
+
+changes_cli = AppGroup('changes', help='Maintain the /api/changes delta feed.')
+
+
+@changes_cli.command('prune')
+@click.option('--days', default=None, type=int,
+              help='Keep tombstones newer than this (default CHANGE_TOMBSTONE_RETENTION_DAYS).')
+def changes_prune(days):
+    """Delete old tombstones (older tokens then get a full snapshot)"""
+    from flask import current_app
+    from backend.services.changes import prune_tombstones
+    days = days or current_app.config.get('CHANGE_TOMBSTONE_RETENTION_DAYS', 30)
+    deleted = prune_tombstones(days)
+    click.echo(f'Pruned {deleted} change tombstone(s) older than {days} day(s)')
+
+
+@changes_cli.command('reset')
+def changes_reset():
+    """Make every client resync from a full snapshot"""
+    from backend.services.changes import reset_change_feed
+    reset_change_feed()
+    db.session.commit()
+    click.echo('Change feed reset; clients will resync from scratch')
+
+
+transitions_cli = AppGroup('transitions', help='Maintain the request_stage_transition history.')
+
+
+@transitions_cli.command('backfill')
+def transitions_backfill():
+    """Record the current stage of requests that have no history yet"""
+    from backend.services.transitions import backfill_transitions
+    rows = backfill_transitions()
+    db.session.commit()
+    click.echo(f'Backfilled {rows} stage transition(s)')
+
+
+schedules_cli = AppGroup('schedules', help='Generate requests from preventive schedules.')
+
+
+@schedules_cli.command('materialize')
+@click.option('--horizon-days', default=None, type=int,
+              help='Create requests this far ahead (default SCHEDULE_HORIZON_DAYS).')
+@click.option('--batch-size', default=None, type=int,
+              help='Schedules per transaction (default SCHEDULE_BATCH_SIZE).')
+def schedules_materialize(horizon_days, batch_size):
+    """Create requests for schedule occurrences inside the horizon"""
+    from flask import current_app
+    from backend.services.schedules import materialize_schedules
+    horizon_days = horizon_days or current_app.config.get('SCHEDULE_HORIZON_DAYS', 14)
+    batch_size = batch_size or current_app.config.get('SCHEDULE_BATCH_SIZE', 200)
+    created = materialize_schedules(horizon_days, batch_size)
+    click.echo(f'Created {created} preventive request(s) up to {horizon_days} day(s) ahead')
+
+
+assignments_cli = AppGroup('assignments', help='Evaluate request auto-assignment policies.')
+
+
+@assignments_cli.command('simulate')
+@click.option('--days', default=90, show_default=True, help='Replay requests created in this many trailing days.')
+@click.option('--policy', 'policies', multiple=True,
+              help='Policy to replay (repeatable; default every registered policy).')
+@click.option('--with-technician', is_flag=True, help='Also pick a technician per request.')
+def assignments_simulate(days, policies, with_technician):
+    """Replay past requests through each policy and compare team loads"""
+    from backend.services.auto_assign import simulate_assignments
+    try:
+        report = simulate_assignments(days, policies, with_technician)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--policy')
+    click.echo(f"Replayed {report['requests']} request(s) from {report['window_start'][:10]} "
+               f"({report['initially_open']} open at start, {report['teams']} team(s), "
+               f"{report['technicians']} technician(s))")
+    click.echo(f"{'policy':<16}{'mean spread':>12}{'max spread':>12}{'peak open':>11}"
+               f"{'skill match':>13}{'same team':>11}")
+    for name, r in report['results'].items():
+        click.echo(f"{name:<16}{r['mean_spread']:>12}{r['max_spread']:>12}{r['peak_team_open']:>11}"
+                   f"{r['skill_match_rate']:>13.1%}{r['same_team_rate']:>11.1%}")
+
+
+counters_cli = AppGroup('counters', help='Maintain the denormalized counter columns.')
+
+
+@counters_cli.command('recount')
+@click.option('--counter', 'names', multiple=True,
+              help='Counter to recompute, e.g. equipment.open_request_count (repeatable; default all).')
+def counters_recount(names):
+    """Recompute counter columns from the child rows"""
+    from backend.services.counters import recount
+    try:
+        corrected = recount(names)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--counter')
+    db.session.commit()
+    for name, rows in corrected.items():
+        click.echo(f'{name}: corrected {rows} row(s)')
+
+
+@counters_cli.command('verify')
+@click.option('--sample', default=None, type=int,
+              help='Rows per counter to check, 0 for all (default COUNTER_VERIFY_SAMPLE).')
+@click.option('--fix', is_flag=True, help='Recount the drifted rows.')
+def counters_verify(sample, fix):
+    """Compare sampled counters with fresh COUNTs; exits 1 on drift"""
+    from flask import current_app
+    from backend.services.counters import verify_counters, recount
+    if sample is None:
+        sample = current_app.config.get('COUNTER_VERIFY_SAMPLE', 200)
+    report = verify_counters(sample)
+    drifted = 0
+    for name, result in report.items():
+        drifted += len(result['drifted'])
+        click.echo(f"{name}: checked {result['checked']}, drifted {len(result['drifted'])}")
+        for row in result['drifted'][:10]:
+            click.echo(f"  id {row['id']}: stored {row['stored']}, actual {row['actual']}")
+        if fix and result['drifted']:
+            recount([name], [row['id'] for row in result['drifted']])
+    if fix and drifted:
+        db.session.commit()
+        click.echo(f'Recounted {drifted} drifted row(s)')
+    elif drifted:
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    """Attach CLI command groups to the app"""
+    app.cli.add_command(facts_cli)
+    app.cli.add_command(sketches_cli)
+    app.cli.add_command(exports_cli)
+    app.cli.add_command(events_cli)
+    app.cli.add_command(changes_cli)
+    app.cli.add_command(transitions_cli)
+    app.cli.add_command(schedules_cli)
+    app.cli.add_command(assignments_cli)
+    app.cli.add_command(counters_cli)
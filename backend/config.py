@@ -18,6 +18,85 @@ class Config:
     APP_NAME = 'GearGuard'
     APP_VERSION = '1.0.0'
     ITEMS_PER_PAGE = 20
+    
+    # Report result cache (seconds): entries are fresh for REPORT_CACHE_TTL and
+    # may be served stale while one worker recomputes for up to REPORT_CACHE_STALE_TTL;
+    # each worker keeps at most REPORT_CACHE_MAX_ENTRIES (least recently used evicted)
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 60))
+    REPORT_CACHE_STALE_TTL = int(os.environ.get('REPORT_CACHE_STALE_TTL', 600))
+    REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 500))
+    
+    # Background report exports (EXPORT_DIR defaults to <instance>/exports)
+    EXPORT_DIR = os.environ.get('EXPORT_DIR')
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+    EXPORT_TTL_HOURS = int(os.environ.get('EXPORT_TTL_HOURS', 24))
+    
+    # Live request stream (SSE): every worker polls the request_events outbox
+    # each EVENT_POLL_INTERVAL seconds; streams close after EVENT_STREAM_TIMEOUT
+    # and the browser reconnects with Last-Event-ID
+    EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 1.0))
+    EVENT_LOOKBACK_SECONDS = int(os.environ.get('EVENT_LOOKBACK_SECONDS', 30))
+    EVENT_HEARTBEAT_SECONDS = int(os.environ.get('EVENT_HEARTBEAT_SECONDS', 15))
+    EVENT_STREAM_TIMEOUT = int(os.environ.get('EVENT_STREAM_TIMEOUT', 300))
+    EVENT_RETENTION_HOURS = int(os.environ.get('EVENT_RETENTION_HOURS', 24))
+
+    # Delta sync (/api/changes): tombstones for deleted rows are kept this long;
+    # clients that last synced before that get a full snapshot instead
+    CHANGE_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('CHANGE_TOMBSTONE_RETENTION_DAYS', 30))
+
+    # Preventive schedules: `schedules materialize` creates requests this many
+    # days ahead, SCHEDULE_BATCH_SIZE schedules per transaction; later
+    # occurrences are only expanded on the calendar
+    SCHEDULE_HORIZON_DAYS = int(os.environ.get('SCHEDULE_HORIZON_DAYS', 14))
+    SCHEDULE_BATCH_SIZE = int(os.environ.get('SCHEDULE_BATCH_SIZE', 200))
+
+    # Auto-scheduler working hours (UTC): SCHEDULER_DAY_HOURS from
+    # SCHEDULER_DAY_START_HOUR on SCHEDULER_WORKDAYS (0 = Monday); requests
+    # without duration_hours are planned at SCHEDULER_DEFAULT_DURATION_HOURS
+    SCHEDULER_DAY_START_HOUR = int(os.environ.get('SCHEDULER_DAY_START_HOUR', 8))
+    SCHEDULER_DAY_HOURS = int(os.environ.get('SCHEDULER_DAY_HOURS', 8))
+    SCHEDULER_WORKDAYS = tuple(int(d) for d in os.environ.get('SCHEDULER_WORKDAYS', '0,1,2,3,4').split(','))
+    SCHEDULER_DEFAULT_DURATION_HOURS = float(os.environ.get('SCHEDULER_DEFAULT_DURATION_HOURS', 2))
+
+    # Auto-assignment on request creation: AUTO_ASSIGN_POLICY (round_robin,
+    # least_loaded, skill_weighted) picks the team when the request asks for
+    # it, or for every request created without a team_id when
+    # AUTO_ASSIGN_ON_CREATE; AUTO_ASSIGN_TECHNICIAN also picks a technician
+    AUTO_ASSIGN_POLICY = os.environ.get('AUTO_ASSIGN_POLICY', 'least_loaded')
+    AUTO_ASSIGN_ON_CREATE = os.environ.get('AUTO_ASSIGN_ON_CREATE', 'false').lower() == 'true'
+    AUTO_ASSIGN_TECHNICIAN = os.environ.get('AUTO_ASSIGN_TECHNICIAN', 'false').lower() == 'true'
+
+    # Open-request counts on team listings: 'query' (one grouped COUNT) or
+    # 'column' (maintenance_team.open_requests_count, read by primary key)
+    TEAM_OPEN_COUNTS = os.environ.get('TEAM_OPEN_COUNTS', 'query')
+
+    # Rows per counter that `flask counters verify` compares with a fresh COUNT
+    COUNTER_VERIFY_SAMPLE = int(os.environ.get('COUNTER_VERIFY_SAMPLE', 200))
+
+    # Per-request SQL statistics (X-DB-* headers, `gearguard.queries` log):
+    # a statement fingerprint running more than QUERY_REPEAT_LIMIT times in one
+    # request is logged as a likely N+1, and raises with QUERY_STRICT (tests)
+    QUERY_STATS = os.environ.get('QUERY_STATS', 'true').lower() == 'true'
+    QUERY_REPEAT_LIMIT = int(os.environ.get('QUERY_REPEAT_LIMIT', 10))
+    QUERY_STRICT = os.environ.get('QUERY_STRICT', 'false').lower() == 'true'
+
+    # Prometheus /metrics: gunicorn workers share their totals through files in
+    # METRICS_DIR (written at most every METRICS_FLUSH_SECONDS; empty it on
+    # deploy); with METRICS_TOKEN scrapes need "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Request profiling (?__profile=1 / X-Profile: 1 on /api calls, users with
+    # can_manage_settings): stored in PROFILE_DIR (default <instance>/profiles),
+    # newest PROFILE_MAX_FILES kept. PROFILE_SAMPLE_RATE also stack-samples
+    # that share of all /api requests and keeps those slower than PROFILE_SLOW_MS
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS', 500))
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
 
 
 class DevelopmentConfig(Config):
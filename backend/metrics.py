@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+GearGuard - Prometheus Metrics (/metrics)
+
+Every response adds to per-thread counters (no locks on the request path):
+requests by method, endpoint and status, a latency histogram per
+blueprint/endpoint, and the statements and DB time query_stats recorded.
+A scrape merges the threads and adds gauges read at that moment: the
+SQLAlchemy pool (checked out, overflow, size), report cache lookups,
+live event stream subscribers and queued/running report exports.
+
+gunicorn workers are separate processes, so each worker writes its totals
+to METRICS_DIR/metrics-<pid>.json at most every METRICS_FLUSH_SECONDS (and
+on every scrape it answers); a scrape sums the files. Counters of workers
+that exited stay in the sum so totals never go backwards; gauges only come
+from live workers. Without METRICS_DIR only the answering process is
+reported. Empty METRICS_DIR on deploy.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, request
+from sqlalchemy import func, select
+from backend.models import db, ReportExport
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+EXPORT_QUEUE_STATUSES = ('queued', 'running')
+
+
+class _Shard:
+    """Counters of one thread"""
+    __slots__ = ('requests', 'latency', 'db')
+
+    def __init__(self):
+        self.requests = {}      # (method, endpoint, status) -> requests
+        self.latency = {}       # (blueprint, endpoint) -> [count per bucket..., +Inf, sum]
+        self.db = {}            # endpoint -> [statements, seconds]
+
+
+class RequestMetrics:
+    """Per-thread request counters of this process"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()       # shard registration and flushes only
+        self._flushed_at = 0.0
+        self._base = None                   # counters left by an earlier process with our pid
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, method, blueprint, endpoint, status, seconds, statements=0, db_seconds=0.0):
+        shard = self._shard()
+        key = (method, endpoint, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        histogram = shard.latency.get((blueprint, endpoint))
+        if histogram is None:
+            histogram = shard.latency[(blueprint, endpoint)] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+        if statements:
+            totals = shard.db.get(endpoint)
+            if totals is None:
+                totals = shard.db[endpoint] = [0, 0.0]
+            totals[0] += statements
+            totals[1] += db_seconds
+
+    def counters(self):
+        """Totals of every thread plus report cache lookups (JSON-able)"""
+        with self._lock:
+            shards = list(self._shards)
+        merged = _empty_counters()
+        merged['cache'] = _cache_counters()
+        for shard in shards:
+            # dict() copies atomically under the GIL while the owner keeps counting
+            _merge_counters(merged, {
+                'requests': [[*key, n] for key, n in dict(shard.requests).items()],
+                'latency': [[*key, list(h)] for key, h in dict(shard.latency).items()],
+                'db': [[endpoint, *totals] for endpoint, totals in dict(shard.db).items()]
+            })
+        if self._base:
+            _merge_counters(merged, self._base)
+        return merged
+
+    def flush(self, directory, force=False):
+        """Write this worker's totals and gauges to `directory` (at most every METRICS_FLUSH_SECONDS)"""
+        now = time.monotonic()
+        interval = current_app.config.get('METRICS_FLUSH_SECONDS', 5)
+        if not force and now - self._flushed_at < interval:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None   # another thread is flushing
+        try:
+            self._flushed_at = now
+            path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+            if self._base is None:
+                # A worker that exited left this pid's file: keep counting from its totals
+                self._base = _read(path).get('counters') or {}
+        finally:
+            self._lock.release()
+        snapshot = {'pid': os.getpid(), 'counters': self.counters(), 'gauges': process_gauges()}
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+        return snapshot
+
+
+request_metrics = RequestMetrics()
+
+
+def _empty_counters():
+    return {'requests': [], 'latency': [], 'db': [], 'cache': {}}
+
+
+def _merge_counters(into, other):
+    """Add `other` into `into` (both in the JSON layout of RequestMetrics.counters)"""
+    requests = {tuple(r[:3]): r for r in into['requests']}
+    for method, endpoint, status, n in other.get('requests', ()):
+        if (method, endpoint, status) in requests:
+            requests[(method, endpoint, status)][3] += n
+        else:
+            into['requests'].append(requests.setdefault((method, endpoint, status), [method, endpoint, status, n]))
+    latency = {tuple(h[:2]): h for h in into['latency']}
+    for blueprint, endpoint, histogram in other.get('latency', ()):
+        if (blueprint, endpoint) in latency:
+            mine = latency[(blueprint, endpoint)][2]
+            latency[(blueprint, endpoint)][2] = [a + b for a, b in zip(mine, histogram)]
+        else:
+            into['latency'].append(latency.setdefault((blueprint, endpoint), [blueprint, endpoint, list(histogram)]))
+    totals = {d[0]: d for d in into['db']}
+    for endpoint, statements, seconds in other.get('db', ()):
+        if endpoint in totals:
+            totals[endpoint][1] += statements
+            totals[endpoint][2] += seconds
+        else:
+            into['db'].append(totals.setdefault(endpoint, [endpoint, statements, seconds]))
+    for key, n in other.get('cache', {}).items():
+        into['cache'][key] = into['cache'].get(key, 0) + n
+    return into
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+# ==================== GAUGES ====================
+def process_gauges():
+    """Gauges of this process: connection pool and live stream subscribers"""
+    from backend.services.events import event_broker
+    pool = db.engine.pool
+    gauges = {'event_subscribers': event_broker.subscriber_count()}
+    for name in ('checkedout', 'overflow', 'size'):
+        value = getattr(pool, name, None)
+        if callable(value):
+            # QueuePool.overflow() is negative until the pool is full
+            gauges[f'pool_{name}'] = max(value(), 0)
+    return gauges
+
+
+def _cache_counters():
+    from backend.services.report_cache import report_cache
+    stats = report_cache.stats()
+    return {key: stats[key] for key in ('hits', 'stale_hits', 'misses')}
+
+
+# ==================== EXPOSITION ====================
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels.items()) + '}' if labels else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def collect():
+    """(counters, gauges, workers) across the workers sharing METRICS_DIR"""
+    counters = request_metrics.counters()
+    gauges = process_gauges()
+    workers = 1
+    directory = current_app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        request_metrics.flush(directory, force=True)
+        own = f'metrics-{os.getpid()}.json'
+        for name in sorted(os.listdir(directory)):
+            if not name.startswith('metrics-') or not name.endswith('.json') or name == own:
+                continue
+            snapshot = _read(os.path.join(directory, name))
+            if not snapshot:
+                continue
+            _merge_counters(counters, snapshot.get('counters', {}))
+            if _alive(snapshot.get('pid', 0)):
+                workers += 1
+                for key, value in snapshot.get('gauges', {}).items():
+                    gauges[key] = gauges.get(key, 0) + value
+    return counters, gauges, workers
+
+
+def render_metrics():
+    """Prometheus text exposition"""
+    counters, gauges, workers = collect()
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('gearguard_http_requests_total', 'counter', 'HTTP requests by method, endpoint and status.')
+    for method, endpoint, status, n in sorted(counters['requests']):
+        lines.append(f'gearguard_http_requests_total{_labels(method=method, endpoint=endpoint, status=status)} {n}')
+
+    family('gearguard_http_request_duration_seconds', 'histogram', 'Request latency by blueprint and endpoint.')
+    for blueprint, endpoint, histogram in sorted(counters['latency']):
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), histogram[:-1]):
+            cumulative += n
+            labels = _labels(blueprint=blueprint, endpoint=endpoint, le=bound)
+            lines.append(f'gearguard_http_request_duration_seconds_bucket{labels} {cumulative}')
+        labels = _labels(blueprint=blueprint, endpoint=endpoint)
+        lines.append(f'gearguard_http_request_duration_seconds_sum{labels} {_number(histogram[-1])}')
+        lines.append(f'gearguard_http_request_duration_seconds_count{labels} {cumulative}')
+
+    family('gearguard_db_statements_total', 'counter', 'SQL statements executed, by endpoint.')
+    for endpoint, statements, _ in sorted(counters['db']):
+        lines.append(f'gearguard_db_statements_total{_labels(endpoint=endpoint)} {statements}')
+    family('gearguard_db_seconds_total', 'counter', 'Time spent executing SQL, by endpoint.')
+    for endpoint, _, seconds in sorted(counters['db']):
+        lines.append(f'gearguard_db_seconds_total{_labels(endpoint=endpoint)} {_number(seconds)}')
+
+    family('gearguard_db_pool_connections', 'gauge', 'SQLAlchemy pool connections by state, summed over workers.')
+    for state, key in (('checked_out', 'pool_checkedout'), ('overflow', 'pool_overflow'), ('size', 'pool_size')):
+        if key in gauges:
+            lines.append(f'gearguard_db_pool_connections{_labels(state=state)} {gauges[key]}')
+
+    family('gearguard_report_cache_lookups_total', 'counter', 'Report cache lookups by result.')
+    cache = counters['cache']
+    for result in ('hits', 'stale_hits', 'misses'):
+        lines.append(f'gearguard_report_cache_lookups_total{_labels(result=result)} {cache.get(result, 0)}')
+    family('gearguard_report_cache_hit_ratio', 'gauge', 'Share of report cache lookups served from the cache.')
+    lookups = sum(cache.get(result, 0) for result in ('hits', 'stale_hits', 'misses'))
+    ratio = (cache.get('hits', 0) + cache.get('stale_hits', 0)) / lookups if lookups else 0.0
+    lines.append(f'gearguard_report_cache_hit_ratio {_number(round(ratio, 4))}')
+
+    family('gearguard_export_jobs', 'gauge', 'Report export jobs waiting or running.')
+    queued = dict(db.session.execute(select(ReportExport.status, func.count()).where(
+        ReportExport.status.in_(EXPORT_QUEUE_STATUSES)).group_by(ReportExport.status)).all())
+    for status in EXPORT_QUEUE_STATUSES:
+        lines.append(f'gearguard_export_jobs{_labels(status=status)} {queued.get(status, 0)}')
+
+    family('gearguard_event_subscribers', 'gauge', 'Open live request streams.')
+    lines.append(f"gearguard_event_subscribers {gauges.get('event_subscribers', 0)}")
+
+    family('gearguard_workers', 'gauge', 'Worker processes reporting metrics.')
+    lines.append(f'gearguard_workers {workers}')
+    return '\n'.join(lines) + '\n'
+
+
+# ==================== HOOKS ====================
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    stats = g.get('query_stats')
+    request_metrics.observe(
+        request.method, request.blueprint or '', request.endpoint or 'unmatched', response.status_code,
+        time.perf_counter() - started,
+        stats.count if stats else 0, stats.seconds if stats else 0.0
+    )
+    directory = current_app.config.get('METRICS_DIR')
+    if directory:
+        try:
+            request_metrics.flush(directory)
+        except OSError:
+            current_app.logger.exception('Could not write metrics to %s', directory)
+    return response
+
+
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+
+def init_metrics(app):
+    """Register /metrics and the request hooks (METRICS_ENABLED off skips both)"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    if app.config.get('METRICS_DIR'):
+        os.makedirs(app.config['METRICS_DIR'], exist_ok=True)
+    app.before_request(_start_timer)
+    app.after_request(_observe)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
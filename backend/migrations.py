@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+GearGuard - Schema Upgrades
+
+db.create_all() only creates missing tables. upgrade_schema() then adds the
+columns and indexes that were declared on the models after a table was first
+created, so existing databases pick up new fields on startup. It only ever
+adds: nothing is dropped, renamed or altered, and added columns must be
+nullable or carry a server default. Derived columns register a backfill
+that runs in the same transaction once every missing column exists, in
+BACKFILLS order (counters read is_open, so it is filled first).
+"""
+from functools import partial
+from sqlalchemy import false, func, inspect, select, text, true
+from sqlalchemy.schema import CreateColumn
+
+
+def _backfill_request_is_open(conn, metadata):
+    requests = metadata.tables['maintenance_request']
+    stages = metadata.tables['maintenance_stage']
+    open_stage = select(stages.c.id).where(
+        stages.c.id == requests.c.stage_id,
+        func.coalesce(stages.c.is_done, false()) == false(),
+        func.coalesce(stages.c.is_scrap, false()) == false()
+    ).exists()
+    conn.execute(requests.update().values(is_open=open_stage))
+
+
+def _backfill_count(parent, column, child, foreign_key, conn, metadata, open_only=False):
+    parents = metadata.tables[parent]
+    children = metadata.tables[child]
+    counted = select(func.count()).select_from(children).where(children.c[foreign_key] == parents.c.id)
+    if open_only:
+        counted = counted.where(children.c.is_open == true())
+    conn.execute(parents.update().values({column: counted.scalar_subquery()}))
+
+
+BACKFILLS = {
+    'maintenance_request.is_open': _backfill_request_is_open,
+    # Counter columns (services/counters.py)
+    'equipment_category.equipment_count': partial(_backfill_count, 'equipment_category', 'equipment_count',
+                                                  'equipment', 'category_id'),
+    'maintenance_stage.request_count': partial(_backfill_count, 'maintenance_stage', 'request_count',
+                                               'maintenance_request', 'stage_id'),
+    'maintenance_team.member_count': partial(_backfill_count, 'maintenance_team', 'member_count',
+                                             'team_member', 'team_id'),
+    'maintenance_team.open_requests_count': partial(_backfill_count, 'maintenance_team', 'open_requests_count',
+                                                    'maintenance_request', 'team_id', open_only=True),
+    'equipment.request_count': partial(_backfill_count, 'equipment', 'request_count',
+                                       'maintenance_request', 'equipment_id'),
+    'equipment.open_request_count': partial(_backfill_count, 'equipment', 'open_request_count',
+                                            'maintenance_request', 'equipment_id', open_only=True)
+}
+
+
+def upgrade_schema(engine, metadata):
+    """Add missing columns and indexes; returns a list of what was added"""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+                added.append(f'{table.name}.{column.name}')
+
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    added.append(index.name)
+
+        for name, backfill in BACKFILLS.items():
+            if name in added:
+                backfill(conn, metadata)
+
+    return added
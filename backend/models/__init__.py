@@ -13,6 +13,14 @@ from .maintenance_stage import MaintenanceStage
 from .maintenance_request import MaintenanceRequest
 from .user import User, Role, ActivityLog
 from .technician import Technician, SKILL_TYPES, AVAILABILITY_STATUSES
+from .request_daily_fact import RequestDailyFact
+from .report_export import ReportExport
+from .request_time_sketch import RequestTimeSketch
+from .request_event import RequestEvent
+from .change_feed import ChangeSequence, ChangeTombstone
+from .request_stage_transition import RequestStageTransition
+from .maintenance_schedule import MaintenanceSchedule, SCHEDULE_KINDS
+from .technician_shift import TechnicianShift, SHIFT_KINDS
 
 __all__ = [
     'db',
@@ -27,5 +35,16 @@ __all__ = [
     'ActivityLog',
     'Technician',
     'SKILL_TYPES',
-    'AVAILABILITY_STATUSES'
+    'AVAILABILITY_STATUSES',
+    'RequestDailyFact',
+    'ReportExport',
+    'RequestTimeSketch',
+    'RequestEvent',
+    'ChangeSequence',
+    'ChangeTombstone',
+    'RequestStageTransition',
+    'MaintenanceSchedule',
+    'SCHEDULE_KINDS',
+    'TechnicianShift',
+    'SHIFT_KINDS'
 ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Change Feed Models
+"""
+from . import db
+from datetime import datetime
+
+
+class ChangeSequence(db.Model):
+    """Change Sequence - Single-row counter behind /api/changes tokens
+
+    Every flush that writes a synced row bumps `value` and stamps it on the
+    rows' change_seq. The UPDATE keeps the row locked until commit, so
+    sequence numbers become visible in the order they were handed out.
+    `reset_seq` marks the oldest token that can still be answered with a
+    delta (tombstones before it were pruned, or the data was re-seeded).
+    """
+    __tablename__ = 'change_sequence'
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    reset_seq = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @staticmethod
+    def ensure_counter():
+        """Create the counter row if it does not exist"""
+        if db.session.get(ChangeSequence, 1) is None:
+            db.session.add(ChangeSequence(id=1, value=0, reset_seq=0))
+            db.session.commit()
+
+    def __repr__(self):
+        return f'<ChangeSequence {self.value} reset={self.reset_seq}>'
+
+
+class ChangeTombstone(db.Model):
+    """Change Tombstone - Records a deleted synced row for delta clients"""
+    __tablename__ = 'change_tombstones'
+    __table_args__ = (
+        db.Index('ix_change_tombstones_change_seq', 'change_seq'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # requests, equipment, technicians, teams
+    entity_id = db.Column(db.Integer, nullable=False)
+    change_seq = db.Column(db.BigInteger, nullable=False)
+
+    # Timestamps
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'entity': self.entity,
+            'id': self.entity_id,
+            'change_seq': self.change_seq,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+    def __repr__(self):
+        return f'<ChangeTombstone {self.entity} {self.entity_id} @{self.change_seq}>'
@@ -9,6 +9,12 @@ from datetime import datetime
 class Equipment(db.Model):
     """Equipment - Assets that need maintenance"""
     __tablename__ = 'equipment'
+    __table_args__ = (
+        db.Index('ix_equipment_status', 'status'),
+        db.Index('ix_equipment_category_id', 'category_id'),
+        db.Index('ix_equipment_department', 'department'),
+        db.Index('ix_equipment_default_team_id', 'default_team_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), unique=True, nullable=False)
@@ -49,9 +55,14 @@ class Equipment(db.Model):
     scrap_date = db.Column(db.Date)
     scrap_reason = db.Column(db.Text)
     
+    # Request counts (maintained by services/counters.py)
+    request_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    open_request_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # not done/scrapped
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, index=True)  # /api/changes sequence of the last write
     
     # Relationships
     maintenance_requests = db.relationship('MaintenanceRequest', backref='equipment', lazy='dynamic')
@@ -84,15 +95,6 @@ class Equipment(db.Model):
         }
         return colors.get(self.status, 'secondary')
     
-    @property
-    def open_request_count(self):
-        """Count of open (non-completed) maintenance requests"""
-        from .maintenance_stage import MaintenanceStage
-        return self.maintenance_requests.join(MaintenanceStage).filter(
-            MaintenanceStage.is_done == False,
-            MaintenanceStage.is_scrap == False
-        ).count()
-    
     def to_dict(self):
         return {
             'id': self.id,
@@ -123,7 +125,7 @@ class Equipment(db.Model):
             'is_scrapped': self.is_scrapped,
             'scrap_date': self.scrap_date.isoformat() if self.scrap_date else None,
             'scrap_reason': self.scrap_reason,
-            'request_count': self.maintenance_requests.count(),
+            'request_count': self.request_count,
             'open_request_count': self.open_request_count
         }
     
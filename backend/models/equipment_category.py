@@ -15,12 +15,18 @@ class EquipmentCategory(db.Model):
     description = db.Column(db.Text)
     color = db.Column(db.String(20), default='#6c757d')
     icon = db.Column(db.String(50), default='bi-box')
+    required_skills = db.Column(db.String(200))  # comma-separated SKILL_TYPES, used to match technicians
+    equipment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # services/counters.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     equipment = db.relationship('Equipment', backref='category', lazy='dynamic')
     
+    @property
+    def skill_list(self):
+        return [s.strip() for s in (self.required_skills or '').split(',') if s.strip()]
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -28,7 +34,8 @@ class EquipmentCategory(db.Model):
             'description': self.description,
             'color': self.color,
             'icon': self.icon,
-            'equipment_count': self.equipment.count()
+            'required_skills': self.skill_list,
+            'equipment_count': self.equipment_count
         }
     
     def __repr__(self):
@@ -9,6 +9,33 @@ from datetime import datetime
 class MaintenanceRequest(db.Model):
     """Maintenance Request - Core entity for tracking maintenance"""
     __tablename__ = 'maintenance_request'
+    __table_args__ = (
+        # Open/overdue lookups are index range scans on is_open, no stage join
+        db.Index('ix_maintenance_request_open_deadline', 'is_open', 'deadline'),
+        db.Index('ix_maintenance_request_open_team', 'is_open', 'team_id'),
+        db.Index('ix_maintenance_request_equipment_open', 'equipment_id', 'is_open'),
+        # Kanban pages per stage are ordered by (created_at, id)
+        db.Index('ix_maintenance_request_stage_created', 'stage_id', 'created_at', 'id'),
+        # Team filters and per-team priority counts
+        db.Index('ix_maintenance_request_team_priority', 'team_id', 'priority'),
+        db.Index('ix_maintenance_request_priority_created', 'priority', 'created_at'),
+        # Request list order and daily fact rollups by created/deadline day
+        db.Index('ix_maintenance_request_created_at', 'created_at'),
+        db.Index('ix_maintenance_request_deadline', 'deadline'),
+        # Calendar ranges
+        db.Index('ix_maintenance_request_scheduled_date', 'scheduled_date'),
+        # Completed-day rollups and the export keyset (completed_date, id)
+        db.Index('ix_maintenance_request_completed', 'completed_date', 'id'),
+        # History pages: closed requests, newest completion first
+        db.Index('ix_maintenance_request_history', 'is_open', 'completed_date', 'id'),
+        # Reliability report: corrective requests since a date
+        db.Index('ix_maintenance_request_type_requested', 'request_type', 'request_date'),
+        # One request per schedule occurrence, even if two generator runs overlap
+        db.Index('ix_maintenance_request_schedule_occurrence', 'schedule_id', 'equipment_id', 'scheduled_date',
+                 unique=True),
+        # Technician timelines: booked slots per technician
+        db.Index('ix_maintenance_request_technician_scheduled', 'technician_id', 'scheduled_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     reference = db.Column(db.String(20), unique=True, nullable=False)
@@ -19,6 +46,12 @@ class MaintenanceRequest(db.Model):
     equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'))
     team_id = db.Column(db.Integer, db.ForeignKey('maintenance_team.id'))
     stage_id = db.Column(db.Integer, db.ForeignKey('maintenance_stage.id'))
+    schedule_id = db.Column(db.Integer, db.ForeignKey('maintenance_schedule.id'))  # generated by a schedule
+    technician_id = db.Column(db.Integer, db.ForeignKey('technician.id'))
+    
+    # Denormalized from the stage (not done, not scrapped); kept in sync on
+    # stage changes and stage flag edits
+    is_open = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
     
     # Request details
     request_type = db.Column(db.String(20), default='corrective')  # corrective, preventive
@@ -46,6 +79,7 @@ class MaintenanceRequest(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, index=True)  # /api/changes sequence of the last write
     
     @staticmethod
     def generate_reference():
@@ -100,9 +134,13 @@ class MaintenanceRequest(db.Model):
             'equipment_code': self.equipment.code if self.equipment else None,
             'team_id': self.team_id,
             'team_name': self.team.name if self.team else None,
+            'technician_id': self.technician_id,
+            'technician_name': self.technician.name if self.technician else None,
             'stage_id': self.stage_id,
             'stage_name': self.stage.name if self.stage else None,
             'stage_color': self.stage.color if self.stage else '#6c757d',
+            'is_open': self.is_open,
+            'schedule_id': self.schedule_id,
             'request_type': self.request_type,
             'priority': self.priority,
             'priority_color': self.priority_color,
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Maintenance Schedule Model
+"""
+from . import db
+from datetime import datetime
+
+SCHEDULE_KINDS = ('interval_days', 'operating_hours', 'rrule')
+
+
+class MaintenanceSchedule(db.Model):
+    """Maintenance Schedule - Recurring preventive maintenance
+
+    Targets one equipment, or every equipment of a category. Occurrences are
+    computed on demand; requests are only created up to a short horizon
+    ahead, and generated_until marks how far that has happened.
+    """
+    __tablename__ = 'maintenance_schedule'
+    __table_args__ = (
+        db.Index('ix_maintenance_schedule_active_generated', 'is_active', 'generated_until'),
+        db.Index('ix_maintenance_schedule_equipment', 'equipment_id'),
+        db.Index('ix_maintenance_schedule_category', 'category_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+
+    # Target: one equipment or a whole category
+    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'))
+    category_id = db.Column(db.Integer, db.ForeignKey('equipment_category.id'))
+    team_id = db.Column(db.Integer, db.ForeignKey('maintenance_team.id'))  # default: equipment's team
+
+    # Recurrence: interval_days, operating_hours (projected at hours_per_day)
+    # or rrule (RFC 5545 RRULE, e.g. FREQ=MONTHLY;BYDAY=1MO)
+    kind = db.Column(db.String(20), nullable=False, default='interval_days')
+    interval_days = db.Column(db.Integer)
+    operating_hours = db.Column(db.Float)
+    hours_per_day = db.Column(db.Float, default=8.0)
+    rrule = db.Column(db.String(500))
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime)
+
+    # Generated requests
+    priority = db.Column(db.String(10), default='normal')
+    duration_hours = db.Column(db.Numeric(6, 2))
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
+    generated_until = db.Column(db.DateTime)  # requests exist for occurrences up to here
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    equipment = db.relationship('Equipment')
+    category = db.relationship('EquipmentCategory')
+    team = db.relationship('MaintenanceTeam')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'equipment_id': self.equipment_id,
+            'equipment_name': self.equipment.name if self.equipment else None,
+            'category_id': self.category_id,
+            'category_name': self.category.name if self.category else None,
+            'team_id': self.team_id,
+            'kind': self.kind,
+            'interval_days': self.interval_days,
+            'operating_hours': self.operating_hours,
+            'hours_per_day': self.hours_per_day,
+            'rrule': self.rrule,
+            'starts_at': self.starts_at.isoformat() if self.starts_at else None,
+            'ends_at': self.ends_at.isoformat() if self.ends_at else None,
+            'priority': self.priority,
+            'duration_hours': float(self.duration_hours) if self.duration_hours else None,
+            'is_active': self.is_active,
+            'generated_until': self.generated_until.isoformat() if self.generated_until else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<MaintenanceSchedule {self.name}>'
@@ -23,6 +23,9 @@ class MaintenanceStage(db.Model):
     # Description
     description = db.Column(db.Text)
     
+    # Requests in this stage (maintained by services/counters.py)
+    request_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -30,8 +33,9 @@ class MaintenanceStage(db.Model):
     requests = db.relationship('MaintenanceRequest', backref='stage', lazy='dynamic')
     
     @property
-    def request_count(self):
-        return self.requests.count()
+    def is_open(self):
+        """Requests in this stage count as open (MaintenanceRequest.is_open)"""
+        return not self.is_done and not self.is_scrap
     
     def to_dict(self):
         return {
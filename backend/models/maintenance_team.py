@@ -23,29 +23,24 @@ class MaintenanceTeam(db.Model):
     # Status
     is_active = db.Column(db.Boolean, default=True)
     
+    # Counts (maintained by services/counters.py)
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    open_requests_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, index=True)  # /api/changes sequence of the last write
     
     # Relationships
     members = db.relationship('TeamMember', backref='team', lazy='dynamic', cascade='all, delete-orphan')
     maintenance_requests = db.relationship('MaintenanceRequest', backref='team', lazy='dynamic')
     equipment = db.relationship('Equipment', foreign_keys='Equipment.default_team_id', backref='assigned_team', lazy='dynamic', viewonly=True)
     
-    @property
-    def member_count(self):
-        return self.members.count()
-    
-    @property
-    def open_requests_count(self):
-        return self.maintenance_requests.join(MaintenanceRequest.stage).filter(
-            db.not_(db.or_(
-                MaintenanceStage.is_done == True,
-                MaintenanceStage.is_scrap == True
-            ))
-        ).count()
-    
-    def to_dict(self):
+    def to_dict(self, members=None):
+        """`members`: preloaded TeamMember rows (services/teams.py batches them)"""
+        if members is None:
+            members = self.members.all()
         return {
             'id': self.id,
             'name': self.name,
@@ -55,8 +50,8 @@ class MaintenanceTeam(db.Model):
             'leader_email': self.leader_email,
             'leader_phone': self.leader_phone,
             'is_active': self.is_active,
-            'member_count': self.member_count,
-            'members': [m.to_dict() for m in self.members]
+            'member_count': len(members),
+            'members': [m.to_dict() for m in members]
         }
     
     def __repr__(self):
@@ -66,6 +61,9 @@ class MaintenanceTeam(db.Model):
 class TeamMember(db.Model):
     """Team Member - Technicians in a team"""
     __tablename__ = 'team_member'
+    __table_args__ = (
+        db.Index('ix_team_member_team_id', 'team_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('maintenance_team.id'), nullable=False)
@@ -90,7 +88,3 @@ class TeamMember(db.Model):
     
     def __repr__(self):
         return f'<TeamMember {self.name}>'
-
-
-# Import at bottom to avoid circular imports
-from .maintenance_stage import MaintenanceStage
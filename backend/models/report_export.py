@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Report Export Model
+"""
+from . import db
+from datetime import datetime
+import json
+
+
+class ReportExport(db.Model):
+    """Report Export - Background export job and its rendered file"""
+    __tablename__ = 'report_export'
+    __table_args__ = (
+        db.Index('ix_report_export_status', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    report = db.Column(db.String(50), nullable=False)  # maintenance_costs, team_workload
+    format = db.Column(db.String(10), nullable=False)  # csv, xlsx, pdf
+    params = db.Column(db.Text)  # JSON encoded report arguments
+
+    # Status: queued, running, done, failed, expired
+    status = db.Column(db.String(20), default='queued', nullable=False)
+    progress = db.Column(db.Integer, default=0)  # 0-100
+    rows_written = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+
+    # Result file on local disk
+    file_path = db.Column(db.String(500))
+    file_size = db.Column(db.Integer)
+
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+    @property
+    def params_dict(self):
+        return json.loads(self.params) if self.params else {}
+
+    @property
+    def filename(self):
+        year = self.params_dict.get('year', '')
+        return f'gearguard-{self.report}-{year}.{self.format}'.replace('--', '-')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'report': self.report,
+            'format': self.format,
+            'params': self.params_dict,
+            'status': self.status,
+            'progress': self.progress,
+            'rows_written': self.rows_written,
+            'error': self.error,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'requested_by': self.requested_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'download_url': f'/api/reports/exports/{self.id}/download' if self.status == 'done' else None
+        }
+
+    def __repr__(self):
+        return f'<ReportExport {self.id} {self.report}.{self.format} {self.status}>'
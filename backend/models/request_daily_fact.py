@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Request Daily Fact Model
+"""
+from . import db
+from datetime import datetime
+
+
+class RequestDailyFact(db.Model):
+    """Request Daily Fact - Rollup of maintenance requests per day
+
+    One row per day x team x category x priority x type. A request counts as
+    created on its created_at day, completed on its completed_date day and
+    overdue on its deadline day when it was (or still is) open past deadline.
+    """
+    __tablename__ = 'request_daily_facts'
+    __table_args__ = (
+        db.Index('ix_request_daily_facts_day', 'day'),
+        db.Index('ix_request_daily_facts_team_day', 'team_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+
+    # Dimensions
+    team_id = db.Column(db.Integer)
+    category_id = db.Column(db.Integer)
+    priority = db.Column(db.String(10))
+    request_type = db.Column(db.String(20))
+
+    # Measures
+    created = db.Column(db.Integer, default=0, nullable=False)
+    completed = db.Column(db.Integer, default=0, nullable=False)
+    overdue = db.Column(db.Integer, default=0, nullable=False)
+    cost_sum = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+    duration_sum = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+
+    # Timestamps
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'team_id': self.team_id,
+            'category_id': self.category_id,
+            'priority': self.priority,
+            'request_type': self.request_type,
+            'created': self.created,
+            'completed': self.completed,
+            'overdue': self.overdue,
+            'cost_sum': float(self.cost_sum or 0),
+            'duration_sum': float(self.duration_sum or 0)
+        }
+
+    def __repr__(self):
+        return f'<RequestDailyFact {self.day} team={self.team_id}>'
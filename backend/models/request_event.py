@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Request Event Model
+"""
+from . import db
+from datetime import datetime
+import json
+
+
+class RequestEvent(db.Model):
+    """Request Event - Outbox of request changes for live board updates
+
+    Written in the same transaction as the change it describes, so every
+    worker's stream can pick up committed events by polling this table.
+    """
+    __tablename__ = 'request_events'
+    __table_args__ = (
+        db.Index('ix_request_events_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    action = db.Column(db.String(20), nullable=False)  # create, update, move, assign, delete
+    request_id = db.Column(db.Integer, nullable=False)
+    stage_id = db.Column(db.Integer)
+    previous_stage_id = db.Column(db.Integer)
+    origin = db.Column(db.String(64))  # X-Client-Id of the browser tab that made the change
+    payload = db.Column(db.Text)  # JSON: card, open/overdue flags before and after
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'action': self.action,
+            'request_id': self.request_id,
+            'stage_id': self.stage_id,
+            'previous_stage_id': self.previous_stage_id,
+            'origin': self.origin,
+            'at': self.created_at.isoformat() if self.created_at else None
+        }
+        data.update(json.loads(self.payload) if self.payload else {})
+        return data
+
+    def __repr__(self):
+        return f'<RequestEvent {self.id} {self.action} request={self.request_id}>'
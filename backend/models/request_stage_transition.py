@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Request Stage Transition Model
+"""
+from . import db
+from datetime import datetime
+
+
+class RequestStageTransition(db.Model):
+    """Request Stage Transition - One row each time a request enters a stage
+
+    The time spent in a stage is the gap to the request's next transition
+    (or to now while it is still there).
+    """
+    __tablename__ = 'request_stage_transition'
+    __table_args__ = (
+        db.Index('ix_request_stage_transition_request_at', 'request_id', 'at'),
+        db.Index('ix_request_stage_transition_stage_at', 'stage_id', 'at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    request_id = db.Column(db.Integer, db.ForeignKey('maintenance_request.id', ondelete='CASCADE'), nullable=False)
+    from_stage_id = db.Column(db.Integer, db.ForeignKey('maintenance_stage.id', ondelete='SET NULL'))  # None when created
+    stage_id = db.Column(db.Integer, db.ForeignKey('maintenance_stage.id', ondelete='SET NULL'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    action = db.Column(db.String(20))  # create, update, move, bulk, backfill
+
+    at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'request_id': self.request_id,
+            'from_stage_id': self.from_stage_id,
+            'stage_id': self.stage_id,
+            'user_id': self.user_id,
+            'action': self.action,
+            'at': self.at.isoformat() if self.at else None
+        }
+
+    def __repr__(self):
+        return f'<RequestStageTransition request={self.request_id} {self.from_stage_id}->{self.stage_id}>'
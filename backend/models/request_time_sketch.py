@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Request Time Sketch Model
+"""
+from . import db
+from datetime import datetime
+import json
+
+
+class RequestTimeSketch(db.Model):
+    """Request Time Sketch - Mergeable quantile sketch (t-digest) of request times
+
+    One row per metric x month x team x priority. `payload` holds the
+    serialized digest; `count` and `total` give exact counts and means.
+    """
+    __tablename__ = 'request_time_sketches'
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'month', 'team_id', 'priority',
+                            name='uq_request_time_sketches_cell'),
+        db.Index('ix_request_time_sketches_metric_month', 'metric', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(20), nullable=False)  # resolution, response
+    month = db.Column(db.Date, nullable=False)  # first day of the month
+
+    # Dimensions
+    team_id = db.Column(db.Integer)
+    priority = db.Column(db.String(10))
+
+    # Measures (hours)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Float, default=0, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON encoded t-digest
+
+    # Timestamps
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'metric': self.metric,
+            'month': self.month.isoformat() if self.month else None,
+            'team_id': self.team_id,
+            'priority': self.priority,
+            'count': self.count,
+            'mean_hours': round(self.total / self.count, 2) if self.count else None,
+            'digest': json.loads(self.payload) if self.payload else None
+        }
+
+    def __repr__(self):
+        return f'<RequestTimeSketch {self.metric} {self.month} team={self.team_id} {self.priority}>'
@@ -9,6 +9,12 @@ from datetime import datetime
 class Technician(db.Model):
     """Technician - Skilled workers for maintenance operations"""
     __tablename__ = 'technician'
+    __table_args__ = (
+        db.Index('ix_technician_team_availability', 'team_id', 'availability_status'),
+        db.Index('ix_technician_availability', 'availability_status'),
+        # Active technicians listed by name
+        db.Index('ix_technician_active_name', 'is_active', 'name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -38,9 +44,11 @@ class Technician(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, index=True)  # /api/changes sequence of the last write
     
     # Relationship
     team = db.relationship('MaintenanceTeam', backref=db.backref('technicians', lazy='dynamic'))
+    maintenance_requests = db.relationship('MaintenanceRequest', backref='technician', lazy='dynamic')
     
     @property
     def initials(self):
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Technician Shift Model
+"""
+from . import db
+from datetime import datetime
+
+SHIFT_KINDS = ('shift', 'leave')
+
+
+class TechnicianShift(db.Model):
+    """Technician Shift - When a technician works (shift) or is away (leave)
+
+    One record is a single interval, or a recurring one: starts_at/ends_at is
+    the first occurrence and rrule (RFC 5545, e.g. FREQ=WEEKLY;BYDAY=MO,TU)
+    repeats it until `until`. Leave overrides shifts.
+    """
+    __tablename__ = 'technician_shift'
+    __table_args__ = (
+        db.Index('ix_technician_shift_technician', 'technician_id', 'starts_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    technician_id = db.Column(db.Integer, db.ForeignKey('technician.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False, default='shift')
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+    rrule = db.Column(db.String(500))
+    until = db.Column(db.DateTime)  # last occurrence starts before this (open-ended when empty)
+    note = db.Column(db.String(200))
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    technician = db.relationship('Technician', backref=db.backref(
+        'shifts', lazy='dynamic', cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'technician_id': self.technician_id,
+            'kind': self.kind,
+            'starts_at': self.starts_at.isoformat() if self.starts_at else None,
+            'ends_at': self.ends_at.isoformat() if self.ends_at else None,
+            'rrule': self.rrule,
+            'until': self.until.isoformat() if self.until else None,
+            'note': self.note,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<TechnicianShift {self.kind} {self.technician_id} {self.starts_at}>'
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+GearGuard - On-demand Request Profiling
+
+Users with can_manage_settings can profile any /api call by adding
+`?__profile=1` (or the header `X-Profile: 1`):
+
+    sample    (default, also `1`) a thread samples the request's stack every
+              PROFILE_INTERVAL_MS and writes collapsed stacks, one
+              `frame;frame;frame count` line per distinct stack, ready for
+              flamegraph.pl or speedscope
+    cprofile  deterministic cProfile, written as pstats text sorted by
+              cumulative time
+
+The response is the normal one plus `X-Profile-Id` and `X-Profile-Url`
+headers; profiles live in PROFILE_DIR (default <instance>/profiles), newest
+PROFILE_MAX_FILES kept, listed at /api/profiles.
+
+With PROFILE_SAMPLE_RATE above 0, that share of all /api requests is also
+stack-sampled, and kept when it took at least PROFILE_SLOW_MS.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, request
+
+PROFILE_MODES = ('sample', 'cprofile')
+PROFILE_EXTENSIONS = {'sample': 'collapsed', 'cprofile': 'txt'}
+PROFILE_NAME = re.compile(
+    r'^(?P<created>\d{8}T\d{6})-(?P<trigger>manual|auto)-(?P<endpoint>[\w.]+)-(?P<duration_ms>\d+)ms-[0-9a-f]{8}'
+    r'\.(?P<ext>collapsed|txt)$'
+)
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+                              .replace(';', ':'))
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def profile_dir():
+    return current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+
+
+def requested_mode():
+    """Profile mode asked for by the query string or X-Profile header (None when not asked)"""
+    value = request.args.get('__profile') or request.headers.get('X-Profile')
+    if not value or value in ('0', 'false'):
+        return None
+    return value if value in PROFILE_MODES else 'sample'
+
+
+def list_profiles(limit=None):
+    """Stored profiles, newest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        match = PROFILE_NAME.match(name)
+        if not match:
+            continue
+        profiles.append({
+            'id': name,
+            'created_at': datetime.strptime(match['created'], '%Y%m%dT%H%M%S').isoformat(),
+            'trigger': match['trigger'],
+            'endpoint': match['endpoint'],
+            'duration_ms': int(match['duration_ms']),
+            'mode': 'sample' if match['ext'] == 'collapsed' else 'cprofile',
+            'size': os.path.getsize(os.path.join(directory, name)),
+            'url': f'/api/profiles/{name}'
+        })
+    return profiles[:limit] if limit else profiles
+
+
+def profile_path(name):
+    """Path of a stored profile; None for names that are not ours or missing files"""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(profile_dir(), name)
+    return path if os.path.exists(path) else None
+
+
+def _save(mode, trigger, duration, body):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r'[^\w.]', '_', request.endpoint or 'unmatched')
+    name = (f'{datetime.utcnow():%Y%m%dT%H%M%S}-{trigger}-{endpoint}-{int(duration * 1000)}ms-'
+            f'{uuid.uuid4().hex[:8]}.{PROFILE_EXTENSIONS[mode]}')
+    header = f'# {request.method} {request.full_path.rstrip("?")} {int(duration * 1000)}ms\n'
+    with open(os.path.join(directory, name), 'w') as f:
+        f.write(body if mode == 'sample' else header + body)
+
+    keep = current_app.config.get('PROFILE_MAX_FILES', 200)
+    stored = sorted(n for n in os.listdir(directory) if PROFILE_NAME.match(n))
+    for old in stored[:-keep] if keep else ():
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+    return name
+
+
+# ==================== REQUEST HOOKS ====================
+def _start_profile():
+    if not request.path.startswith('/api/'):
+        return
+    mode = requested_mode()
+    trigger = 'manual'
+    if mode:
+        from backend.routes.auth import get_current_user
+        user = get_current_user()
+        if not user or not user.has_permission('can_manage_settings'):
+            return
+    elif random.random() < current_app.config.get('PROFILE_SAMPLE_RATE', 0.0):
+        mode, trigger = 'sample', 'auto'
+    else:
+        return
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this process (Python 3.12+ allows one)
+            mode, profiler = 'sample', None
+    if mode == 'sample':
+        interval = current_app.config.get('PROFILE_INTERVAL_MS', 5) / 1000
+        profiler = StackSampler(threading.get_ident(), interval).start()
+    g.profile = (mode, trigger, profiler, time.perf_counter())
+
+
+def _finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    mode, trigger, profiler, started = profile
+    duration = time.perf_counter() - started
+    if mode == 'cprofile':
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(80)
+        body = out.getvalue()
+    else:
+        body = profiler.stop().collapsed()
+
+    if trigger == 'auto' and duration * 1000 < current_app.config.get('PROFILE_SLOW_MS', 500):
+        return response
+    try:
+        name = _save(mode, trigger, duration, body)
+    except OSError:
+        current_app.logger.exception('Could not store request profile')
+        return response
+    if trigger == 'manual':
+        response.headers['X-Profile-Id'] = name
+        response.headers['X-Profile-Url'] = f'/api/profiles/{name}'
+    return response
+
+
+def _discard_profile(exc):
+    """Stop a profiler whose request never reached after_request"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        mode, _, profiler, _ = profile
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+
+
+def init_profiling(app):
+    """Attach the profiling request hooks"""
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_discard_profile)
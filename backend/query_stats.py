@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+GearGuard - Per-request SQL Statistics
+
+Cursor events on the app's engine count the statements each request runs,
+time them and group them by fingerprint (the statement with literals and
+IN-list lengths folded away, so one query issued per row shows up as one
+fingerprint with a high count). Every response carries:
+
+    X-DB-Queries     statements executed
+    X-DB-Time        time spent in them (ms)
+    X-DB-Max-Repeat  executions of the most repeated fingerprint
+    Server-Timing    db and app durations (shown by browser dev tools)
+
+and one JSON line goes to the `gearguard.queries` logger: INFO normally,
+WARNING when a fingerprint ran more than QUERY_REPEAT_LIMIT times (the N+1
+signature). With QUERY_STRICT (tests), the execution past the limit raises
+RepeatedQueryError from the query itself, so the traceback points at the
+loop that issued it.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from functools import lru_cache
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from backend.models import db
+
+logger = logging.getLogger('gearguard.queries')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_IN_LISTS = re.compile(rf'\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)')
+LOGGED_REPEATS = 5
+
+
+class RepeatedQueryError(RuntimeError):
+    """A statement ran more than QUERY_REPEAT_LIMIT times in one request (QUERY_STRICT)"""
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement):
+    """Statement shape: whitespace collapsed, literals and IN-list lengths folded"""
+    normalized = _LITERALS.sub('?', ' '.join(statement.split()))
+    return _IN_LISTS.sub('(?+)', normalized)
+
+
+def fingerprint_id(shape):
+    """Short stable id of a fingerprint for logs"""
+    return hashlib.sha1(shape.encode()).hexdigest()[:10]
+
+
+class QueryStats:
+    """Statements of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = {}    # fingerprint -> [executions, seconds]
+
+    def record(self, statement, seconds):
+        """Count one execution; returns how often its fingerprint has run"""
+        self.count += 1
+        self.seconds += seconds
+        entry = self.fingerprints.setdefault(fingerprint(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        return entry[0]
+
+    @property
+    def max_repeat(self):
+        return max((entry[0] for entry in self.fingerprints.values()), default=0)
+
+    def repeated(self, limit=LOGGED_REPEATS):
+        """Most executed fingerprints that ran more than once: [(fingerprint, executions, seconds)]"""
+        entries = [(shape, n, s) for shape, (n, s) in self.fingerprints.items() if n > 1]
+        return sorted(entries, key=lambda e: (-e[1], -e[2]))[:limit]
+
+
+# ==================== ENGINE EVENTS ====================
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not has_request_context():
+        return
+    stats = g.get('query_stats')
+    if stats is None:
+        return
+    executions = stats.record(statement, time.perf_counter() - context.query_started)
+    limit = current_app.config.get('QUERY_REPEAT_LIMIT', 10)
+    if executions == limit + 1 and current_app.config.get('QUERY_STRICT'):
+        raise RepeatedQueryError(f'Statement ran more than {limit} times in {request.method} {request.path} '
+                                 f'(N+1?): {fingerprint(statement)[:300]}')
+
+
+# ==================== REQUEST HOOKS ====================
+def _start_request():
+    g.query_stats = QueryStats()
+
+
+def _finish_request(response):
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    db_ms = stats.seconds * 1000
+    response.headers['X-DB-Queries'] = str(stats.count)
+    response.headers['X-DB-Time'] = f'{db_ms:.2f}'
+    response.headers['X-DB-Max-Repeat'] = str(stats.max_repeat)
+    response.headers['Server-Timing'] = f'db;dur={db_ms:.2f};desc="{stats.count} queries", app;dur={total_ms:.2f}'
+
+    limit = current_app.config.get('QUERY_REPEAT_LIMIT', 10)
+    level = logging.WARNING if stats.max_repeat > limit else logging.INFO
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'repeated': [{'fingerprint': fingerprint_id(shape), 'executions': n, 'db_ms': round(s * 1000, 2),
+                          'statement': shape[:200]} for shape, n, s in stats.repeated()]
+        }))
+    return response
+
+
+def init_query_stats(app):
+    """Attach the engine events and request hooks (QUERY_STATS off skips both)"""
+    if not app.config.get('QUERY_STATS', True):
+        return
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -2,10 +2,31 @@
 """
 GearGuard - API Routes with Authentication
 """
-from flask import Blueprint, jsonify, request, session
-from backend.models import db, EquipmentCategory, Equipment, MaintenanceTeam, TeamMember, MaintenanceStage, MaintenanceRequest
-from backend.routes.auth import login_required, permission_required, get_current_user, log_activity
+from flask import Blueprint, Response, current_app, jsonify, request, session, stream_with_context
+from backend.models import (db, EquipmentCategory, Equipment, MaintenanceTeam, TeamMember, MaintenanceStage,
+                            MaintenanceRequest, MaintenanceSchedule)
+from backend.routes.auth import login_required, permission_required, get_current_user, log_activity, log_activities
+from backend.signals import emit_requests_written, emit_equipment_written, emit_teams_written, request_snapshot
+from backend.services.facts import monthly_totals, month_starts, next_month
+from backend.services.sketches import sketch_percentiles, SKETCH_METRICS, SKETCH_DIMENSIONS
+from backend.services.report_cache import cached_report, invalidate_on_commit, report_cache
+from backend.services.events import event_broker, replay_events, format_sse
+from backend.services.changes import changes_since, CHANGES_PAGE_SIZE, CHANGES_MAX_PAGE_SIZE
+from backend.services.open_state import resync_stage_requests
+from backend.services.transitions import time_in_stage
+from backend.services.schedules import parse_schedule, occurrences, expand_schedules, detach_schedule_requests
+from backend.services.auto_schedule import parse_plan_params, plan_schedule, apply_schedule
+from backend.services.matching import (parse_skills, request_candidates, CANDIDATES_DEFAULT_LIMIT,
+                                      CANDIDATES_MAX_LIMIT)
+from backend.services.auto_assign import auto_assign
+from backend.services.shifts import parse_shift, parse_range, available_technicians, capacity_by_day
+from backend.services.dates import parse_datetime
+from backend.services.teams import serialize_teams
+from backend.services.technicians import (parse_technician_filters, technician_facets, technician_overview,
+                                          TECHNICIANS_PAGE_SIZE, TECHNICIANS_MAX_PAGE_SIZE)
 from datetime import datetime, timedelta
+import queue
+import time
 from sqlalchemy import func
 
 api = Blueprint('api', __name__, url_prefix='/api')
@@ -23,15 +44,11 @@ def dashboard_stats():
     total_requests = MaintenanceRequest.query.count()
     
     # Open requests (not done, not scrapped)
-    open_requests = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-        MaintenanceStage.is_done == False,
-        MaintenanceStage.is_scrap == False
-    ).count()
+    open_requests = MaintenanceRequest.query.filter_by(is_open=True).count()
     
     # Overdue requests
-    overdue = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-        MaintenanceStage.is_done == False,
-        MaintenanceStage.is_scrap == False,
+    overdue = MaintenanceRequest.query.filter(
+        MaintenanceRequest.is_open == True,
         MaintenanceRequest.deadline < datetime.utcnow()
     ).count()
     
@@ -106,26 +123,11 @@ def equipment_by_status():
 
 @api.route('/dashboard/monthly-requests')
 def monthly_requests():
-    """Get request counts for last 6 months"""
-    result = []
-    for i in range(5, -1, -1):
-        date = datetime.utcnow() - timedelta(days=i*30)
-        month_start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if date.month == 12:
-            month_end = month_start.replace(year=date.year+1, month=1)
-        else:
-            month_end = month_start.replace(month=date.month+1)
-        
-        count = MaintenanceRequest.query.filter(
-            MaintenanceRequest.created_at >= month_start,
-            MaintenanceRequest.created_at < month_end
-        ).count()
-        
-        result.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': count
-        })
-    return jsonify(result)
+    """Get request counts for last 6 months (from request_daily_facts)"""
+    return jsonify([{
+        'month': m['month'].strftime('%b %Y'),
+        'count': m['created']
+    } for m in monthly_totals(6)])
 
 
 # ==================== EQUIPMENT CATEGORIES ====================
@@ -149,13 +151,19 @@ def get_category(id):
 def create_category():
     """Create new category"""
     data = request.json
+    try:
+        required_skills = parse_skills(data.get('required_skills'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     category = EquipmentCategory(
         name=data['name'],
         description=data.get('description'),
         color=data.get('color', '#6c757d'),
-        icon=data.get('icon', 'bi-box')
+        icon=data.get('icon', 'bi-box'),
+        required_skills=required_skills
     )
     db.session.add(category)
+    emit_equipment_written('category')
     db.session.commit()
     
     log_activity('create', 'category', category.id, f'Created category: {category.name}')
@@ -173,6 +181,12 @@ def update_category(id):
     category.description = data.get('description', category.description)
     category.color = data.get('color', category.color)
     category.icon = data.get('icon', category.icon)
+    if 'required_skills' in data:
+        try:
+            category.required_skills = parse_skills(data['required_skills'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    emit_equipment_written('category')
     db.session.commit()
     
     log_activity('update', 'category', category.id, f'Updated category: {category.name}')
@@ -187,6 +201,7 @@ def delete_category(id):
     category = EquipmentCategory.query.get_or_404(id)
     name = category.name
     db.session.delete(category)
+    emit_equipment_written('category')
     db.session.commit()
     
     log_activity('delete', 'category', id, f'Deleted category: {name}')
@@ -263,6 +278,7 @@ def create_equipment():
         notes=data.get('notes')
     )
     db.session.add(equipment)
+    emit_equipment_written('create', [equipment])
     db.session.commit()
     
     log_activity('create', 'equipment', equipment.id, f'Created equipment: {equipment.code} - {equipment.name}')
@@ -288,6 +304,7 @@ def update_equipment(id):
     if 'warranty_expiry' in data:
         equipment.warranty_expiry = datetime.fromisoformat(data['warranty_expiry']).date() if data['warranty_expiry'] else None
     
+    emit_equipment_written('update', [equipment])
     db.session.commit()
     
     log_activity('update', 'equipment', equipment.id, f'Updated equipment: {equipment.code}')
@@ -302,6 +319,7 @@ def delete_equipment(id):
     equipment = Equipment.query.get_or_404(id)
     code = equipment.code
     db.session.delete(equipment)
+    emit_equipment_written('delete')
     db.session.commit()
     
     log_activity('delete', 'equipment', id, f'Deleted equipment: {code}')
@@ -353,28 +371,16 @@ def equipment_open_requests_count(id):
     """
     equipment = Equipment.query.get_or_404(id)
     
-    # Count open requests (not done, not scrapped)
-    open_count = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
+    # Count open requests (not done, not scrapped) per priority in one pass
+    by_priority = dict(db.session.query(
+        MaintenanceRequest.priority, func.count(MaintenanceRequest.id)
+    ).filter(
         MaintenanceRequest.equipment_id == id,
-        MaintenanceStage.is_done == False,
-        MaintenanceStage.is_scrap == False
-    ).count()
-    
-    # Check for urgent requests
-    urgent_count = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-        MaintenanceRequest.equipment_id == id,
-        MaintenanceStage.is_done == False,
-        MaintenanceStage.is_scrap == False,
-        MaintenanceRequest.priority == 'urgent'
-    ).count()
-    
-    # Also get high priority count
-    high_count = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-        MaintenanceRequest.equipment_id == id,
-        MaintenanceStage.is_done == False,
-        MaintenanceStage.is_scrap == False,
-        MaintenanceRequest.priority == 'high'
-    ).count()
+        MaintenanceRequest.is_open == True
+    ).group_by(MaintenanceRequest.priority).all())
+    open_count = sum(by_priority.values())
+    urgent_count = by_priority.get('urgent', 0)
+    high_count = by_priority.get('high', 0)
     
     return jsonify({
         'equipment_id': id,
@@ -406,6 +412,7 @@ def scrap_equipment(id):
     equipment.scrap_date = datetime.utcnow().date()
     equipment.scrap_reason = data.get('reason', 'No reason provided')
     
+    emit_equipment_written('scrap', [equipment])
     db.session.commit()
     
     log_activity('scrap', 'equipment', equipment.id, 
@@ -440,25 +447,16 @@ def equipment_requests(id):
 # ==================== MAINTENANCE TEAMS ====================
 @api.route('/teams')
 def get_teams():
-    """Get all teams"""
+    """Get all teams with members and open request counts"""
     teams = MaintenanceTeam.query.order_by(MaintenanceTeam.name).all()
-    return jsonify([t.to_dict() for t in teams])
+    return jsonify(serialize_teams(teams))
 
 
 @api.route('/teams/<int:id>')
 def get_team(id):
-    """Get single team with members"""
+    """Get single team with members and open request count"""
     team = MaintenanceTeam.query.get_or_404(id)
-    data = team.to_dict()
-    
-    # Add open requests count
-    data['open_requests'] = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-        MaintenanceRequest.team_id == id,
-        MaintenanceStage.is_done == False,
-        MaintenanceStage.is_scrap == False
-    ).count()
-    
-    return jsonify(data)
+    return jsonify(serialize_teams([team])[0])
 
 
 @api.route('/teams', methods=['POST'])
@@ -476,6 +474,7 @@ def create_team():
         leader_phone=data.get('leader_phone')
     )
     db.session.add(team)
+    emit_teams_written('create', [team])
     db.session.commit()
     
     log_activity('create', 'team', team.id, f'Created team: {team.name}')
@@ -494,6 +493,7 @@ def update_team(id):
         if field in data:
             setattr(team, field, data[field])
     
+    emit_teams_written('update', [team])
     db.session.commit()
     
     log_activity('update', 'team', team.id, f'Updated team: {team.name}')
@@ -508,6 +508,7 @@ def delete_team(id):
     team = MaintenanceTeam.query.get_or_404(id)
     name = team.name
     db.session.delete(team)
+    emit_teams_written('delete')
     db.session.commit()
     
     log_activity('delete', 'team', id, f'Deleted team: {name}')
@@ -529,6 +530,7 @@ def add_team_member(team_id):
         role=data.get('role', 'Technician')
     )
     db.session.add(member)
+    emit_teams_written('update', [team])
     db.session.commit()
     
     log_activity('create', 'team_member', member.id, f'Added member {member.name} to team {team.name}')
@@ -547,6 +549,7 @@ def update_team_member(team_id, member_id):
         if field in data:
             setattr(member, field, data[field])
     
+    emit_teams_written('update', [member.team])
     db.session.commit()
     return jsonify(member.to_dict())
 
@@ -557,7 +560,9 @@ def update_team_member(team_id, member_id):
 def remove_team_member(team_id, member_id):
     """Remove member from team"""
     member = TeamMember.query.filter_by(id=member_id, team_id=team_id).first_or_404()
+    team = member.team
     db.session.delete(member)
+    emit_teams_written('update', [team])
     db.session.commit()
     
     log_activity('delete', 'team_member', member_id, f'Removed member from team')
@@ -601,10 +606,16 @@ def update_stage(id):
     stage = MaintenanceStage.query.get_or_404(id)
     data = request.json
     
+    was_open = stage.is_open
     for field in ['name', 'sequence', 'color', 'is_done', 'is_scrap', 'fold']:
         if field in data:
             setattr(stage, field, data[field])
     
+    # Done/scrap flags decide whether the stage's requests count as open
+    if stage.is_open != was_open:
+        resync_stage_requests(stage)
+        invalidate_on_commit('requests')
+    
     db.session.commit()
     
     log_activity('update', 'stage', stage.id, f'Updated stage: {stage.name}')
@@ -619,7 +630,7 @@ def delete_stage(id):
     stage = MaintenanceStage.query.get_or_404(id)
     
     # Check if stage has requests
-    if stage.requests.count() > 0:
+    if stage.request_count > 0:
         return jsonify({'error': 'Cannot delete stage with existing requests'}), 400
     
     name = stage.name
@@ -664,9 +675,8 @@ def get_requests():
             )
         )
     if overdue_only:
-        query = query.join(MaintenanceStage).filter(
-            MaintenanceStage.is_done == False,
-            MaintenanceStage.is_scrap == False,
+        query = query.filter(
+            MaintenanceRequest.is_open == True,
             MaintenanceRequest.deadline < datetime.utcnow()
         )
     
@@ -684,19 +694,38 @@ def get_request(id):
 @api.route('/requests', methods=['POST'])
 @login_required
 def create_request():
-    """Create new maintenance request"""
+    """Create new maintenance request
+    
+    `auto_assign` (true for AUTO_ASSIGN_POLICY, or a policy name) picks the
+    team, unless team_id is given, and with `assign_technician` a technician.
+    Requests without team_id are auto-assigned when AUTO_ASSIGN_ON_CREATE.
+    """
     data = request.json
     user = get_current_user()
     
     # Get first stage as default
     default_stage = MaintenanceStage.query.order_by(MaintenanceStage.sequence).first()
     
+    team_id, technician_id = data.get('team_id'), None
+    policy = data.get('auto_assign')
+    if policy is None and not team_id:
+        policy = current_app.config.get('AUTO_ASSIGN_ON_CREATE', False)
+    if policy:
+        equipment = db.session.get(Equipment, data['equipment_id']) if data.get('equipment_id') else None
+        with_technician = data.get('assign_technician', current_app.config.get('AUTO_ASSIGN_TECHNICIAN', False))
+        try:
+            team_id, technician_id = auto_assign(equipment, policy if isinstance(policy, str) else None,
+                                                 bool(with_technician), team_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
     req = MaintenanceRequest(
         reference=MaintenanceRequest.generate_reference(),
         name=data['name'],
         description=data.get('description'),
         equipment_id=data.get('equipment_id'),
-        team_id=data.get('team_id'),
+        team_id=team_id,
+        technician_id=technician_id,
         stage_id=data.get('stage_id') or (default_stage.id if default_stage else None),
         request_type=data.get('request_type', 'corrective'),
         priority=data.get('priority', 'normal'),
@@ -707,9 +736,11 @@ def create_request():
         deadline=datetime.fromisoformat(data['deadline']) if data.get('deadline') else None
     )
     db.session.add(req)
+    emit_requests_written('create', [req])
     db.session.commit()
     
-    log_activity('create', 'request', req.id, f'Created request: {req.reference}')
+    detail = f' (auto-assigned to {req.team.name})' if policy and req.team else ''
+    log_activity('create', 'request', req.id, f'Created request: {req.reference}{detail}')
     return jsonify(req.to_dict()), 201
 
 
@@ -727,7 +758,17 @@ def update_request(id):
         if req.requester_email != user.email:
             return jsonify({'error': 'Permission denied'}), 403
     
-    for field in ['name', 'description', 'equipment_id', 'team_id', 'stage_id',
+    # Technicians are assigned under the same rules as /assign
+    if 'technician_id' in data:
+        if not user.has_permission('can_assign_requests'):
+            return jsonify({'error': 'Permission denied'}), 403
+        from backend.models.technician import Technician
+        if data['technician_id'] and not db.session.get(Technician, data['technician_id']):
+            return jsonify({'error': f"Unknown technician {data['technician_id']}"}), 400
+    
+    before = {req.id: request_snapshot(req)}
+    
+    for field in ['name', 'description', 'equipment_id', 'team_id', 'technician_id', 'stage_id',
                   'request_type', 'priority', 'requester_name', 'requester_email',
                   'requester_phone', 'duration_hours', 'maintenance_cost',
                   'technician_notes', 'resolution']:
@@ -749,7 +790,9 @@ def update_request(id):
         # Update equipment status if scrapped
         if stage and stage.is_scrap and req.equipment:
             req.equipment.status = 'scrapped'
+            emit_equipment_written('scrap', [req.equipment])
     
+    emit_requests_written('update', [req], before)
     db.session.commit()
     
     log_activity('update', 'request', req.id, f'Updated request: {req.reference}')
@@ -763,7 +806,9 @@ def delete_request(id):
     """Delete request"""
     req = MaintenanceRequest.query.get_or_404(id)
     reference = req.reference
+    before = {req.id: request_snapshot(req)}
     db.session.delete(req)
+    emit_requests_written('delete', before=before)
     db.session.commit()
     
     log_activity('delete', 'request', id, f'Deleted request: {reference}')
@@ -787,6 +832,7 @@ def move_request_stage(id):
             return jsonify({'error': 'Permission denied'}), 403
         
         old_stage_name = req.stage.name if req.stage else 'None'
+        before = {req.id: request_snapshot(req)}
         req.stage_id = new_stage_id
         
         # Auto-set completed date when moved to done stage
@@ -802,12 +848,15 @@ def move_request_stage(id):
             equipment.scrap_date = datetime.utcnow().date()
             equipment.scrap_reason = f"Equipment scrapped via maintenance request {req.reference}. Original request: {req.name}"
             
-            # Log scrap activity
-            log_activity('scrap', 'equipment', equipment.id, 
-                        f'Equipment {equipment.code} scrapped due to request {req.reference}')
+            emit_equipment_written('scrap', [equipment])
         
+        emit_requests_written('move', [req], before)
         db.session.commit()
         
+        # log_activity commits: only after the move and its derived rows are in
+        if stage.is_scrap and req.equipment:
+            log_activity('scrap', 'equipment', req.equipment.id,
+                        f'Equipment {req.equipment.code} scrapped due to request {req.reference}')
         log_activity('update', 'request', req.id, f'Moved {req.reference} from {old_stage_name} to {stage.name}')
     
     return jsonify(req.to_dict())
@@ -817,62 +866,438 @@ def move_request_stage(id):
 @login_required
 @permission_required('can_assign_requests')
 def assign_request(id):
-    """Assign request to team"""
+    """Assign request to team and, optionally, a technician
+
+    Without a team_id, a given technician's team is used.
+    """
+    from backend.models.technician import Technician
     req = MaintenanceRequest.query.get_or_404(id)
     data = request.json
     
-    req.team_id = data.get('team_id')
+    technician = None
+    if data.get('technician_id'):
+        technician = db.session.get(Technician, data['technician_id'])
+        if not technician:
+            return jsonify({'error': f"Unknown technician {data['technician_id']}"}), 400
+    
+    before = {req.id: request_snapshot(req)}
+    req.team_id = data.get('team_id', technician.team_id if technician else None)
+    if 'technician_id' in data:
+        req.technician_id = technician.id if technician else None
+    emit_requests_written('assign', [req], before)
     db.session.commit()
     
     team_name = req.team.name if req.team else 'Unassigned'
+    if technician:
+        team_name = f'{technician.name} ({team_name})'
     log_activity('update', 'request', req.id, f'Assigned {req.reference} to {team_name}')
     
     return jsonify(req.to_dict())
 
 
+@api.route('/requests/<int:id>/candidates')
+@login_required
+def get_request_candidates(id):
+    """Technicians ranked for a request by skill match, team, availability and open load
+
+    Query params: limit (default 10), include_off_duty=1
+    """
+    req = MaintenanceRequest.query.get_or_404(id)
+    limit = min(max(request.args.get('limit', CANDIDATES_DEFAULT_LIMIT, type=int), 1), CANDIDATES_MAX_LIMIT)
+    return jsonify(request_candidates(req, limit, include_off_duty=request.args.get('include_off_duty') == '1'))
+
+
+@api.route('/requests/bulk', methods=['POST'])
+@login_required
+def bulk_update_requests():
+    """Apply a batch of triage operations in one transaction
+
+    Body: {"operations": [{"op": "move_stage" | "assign_team" | "set_priority" |
+    "set_deadline", "ids": [...], "value": ...}, ...]}. Operations run in order;
+    the batch is all-or-nothing.
+    """
+    from backend.services.bulk_requests import (parse_operations, required_permissions,
+                                                apply_bulk_operations, BulkError)
+    user = get_current_user()
+    try:
+        operations = parse_operations(request.json)
+    except BulkError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    missing = sorted(p for p in required_permissions(operations) if not user.has_permission(p))
+    if missing:
+        return jsonify({'error': 'Permission denied', 'missing_permissions': missing}), 403
+
+    requests, audit = apply_bulk_operations(operations)
+    log_activities(audit)
+    # Serialized before the commit expires the (eagerly loaded) rows
+    result = {
+        'updated': len(requests),
+        'operations': len(operations),
+        'requests': [req.to_dict() for req in requests]
+    }
+    db.session.commit()
+
+    return jsonify(result)
+
+
+# ==================== KANBAN ====================
+def _kanban_filters():
+    """Shared query params: limit, search, priority"""
+    from backend.services.kanban import KANBAN_PAGE_SIZE, KANBAN_MAX_PAGE_SIZE
+    limit = min(max(request.args.get('limit', KANBAN_PAGE_SIZE, type=int), 1), KANBAN_MAX_PAGE_SIZE)
+    return {
+        'limit': limit,
+        'search': request.args.get('search') or None,
+        'priority': request.args.get('priority') or None
+    }
+
+
+@api.route('/kanban')
+def get_kanban():
+    """Get kanban columns: per-stage counts plus the first cards of each stage
+
+    Folded stages return only their count unless listed in `expand`
+    (comma separated stage ids). Query params: limit, search, priority.
+    """
+    from backend.services.kanban import kanban_board
+    try:
+        expand = {int(s) for s in request.args.get('expand', '').split(',') if s}
+    except ValueError:
+        return jsonify({'error': 'expand must be a comma separated list of stage ids'}), 400
+    return jsonify({'stages': kanban_board(expand=expand, **_kanban_filters())})
+
+
+@api.route('/kanban/stages/<int:id>/cards')
+def get_kanban_stage_cards(id):
+    """Get the next page of cards in a stage (cursor from the previous page)"""
+    from backend.services.kanban import stage_cards
+    stage = MaintenanceStage.query.get_or_404(id)
+    try:
+        page = stage_cards(stage, cursor=request.args.get('cursor'), **_kanban_filters())
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(page)
+
+
+# ==================== HISTORY ====================
+@api.route('/history')
+@login_required
+def get_history():
+    """Get a page of closed (completed / scrapped) requests, newest first
+
+    Query params: date_from, date_to (YYYY-MM-DD, completion date, both
+    inclusive), team_id, equipment_id, category_id, request_type, status
+    (completed, scrapped), cursor, limit. The first page includes totals.
+    """
+    from backend.services.history import (history_page, HISTORY_STATUSES,
+                                          HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+
+    filters = {
+        'team_id': request.args.get('team_id', type=int),
+        'equipment_id': request.args.get('equipment_id', type=int),
+        'category_id': request.args.get('category_id', type=int),
+        'request_type': request.args.get('request_type') or None,
+        'status': request.args.get('status') or None
+    }
+    if filters['status'] and filters['status'] not in HISTORY_STATUSES:
+        return jsonify({'error': f"status must be one of: {', '.join(HISTORY_STATUSES)}"}), 400
+    try:
+        if request.args.get('date_from'):
+            filters['date_from'] = datetime.strptime(request.args['date_from'], '%Y-%m-%d')
+        if request.args.get('date_to'):
+            filters['date_to'] = datetime.strptime(request.args['date_to'], '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'date_from and date_to must be dates (YYYY-MM-DD)'}), 400
+
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+    try:
+        page = history_page(filters, cursor=request.args.get('cursor'), limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(page)
+
+
+# ==================== LIVE STREAM ====================
+@api.route('/stream/requests')
+def stream_requests():
+    """Server-sent events for request create/update/move/assign/delete
+
+    Each event carries the compact kanban card plus open/overdue flags before
+    and after the change. Reconnecting clients send Last-Event-ID and get the
+    events they missed replayed first.
+    """
+    app = current_app._get_current_object()
+    last_event_id = request.headers.get('Last-Event-ID', type=int) or \
+        request.args.get('last_event_id', type=int)
+    heartbeat = app.config.get('EVENT_HEARTBEAT_SECONDS', 15)
+    deadline = time.monotonic() + app.config.get('EVENT_STREAM_TIMEOUT', 300)
+
+    def generate():
+        with event_broker.subscribe(app) as events:
+            yield 'retry: 3000\n\n'
+            if last_event_id:
+                for event in replay_events(last_event_id):
+                    yield format_sse(event)
+                db.session.remove()
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+# ==================== CHANGE FEED ====================
+@api.route('/changes')
+def get_changes():
+    """Requests, equipment, technicians and teams written after ?since=<token>
+
+    Without a token (or with one older than the retained tombstones) a full
+    snapshot is paged out; its first page has full=true. Clients store
+    `token`, apply `changes` (upserts by id) and `deleted` (ids), and call
+    again while has_more is true.
+    """
+    limit = min(max(request.args.get('limit', CHANGES_PAGE_SIZE, type=int), 1), CHANGES_MAX_PAGE_SIZE)
+    try:
+        return jsonify(changes_since(request.args.get('since') or None, limit))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 # ==================== CALENDAR ====================
 @api.route('/calendar/events')
 def calendar_events():
     """Get maintenance requests as calendar events"""
-    start = request.args.get('start')
-    end = request.args.get('end')
-    
-    query = MaintenanceRequest.query.filter(
-        MaintenanceRequest.scheduled_date.isnot(None)
-    )
+    from backend.services.calendar import calendar_rows, DEFAULT_EVENT_COLOR
+    try:
+        start = parse_datetime(request.args['start'], 'start') if request.args.get('start') else None
+        end = parse_datetime(request.args['end'], 'end') if request.args.get('end') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    team_id = request.args.get('team_id', type=int)
     
-    if start:
-        query = query.filter(MaintenanceRequest.scheduled_date >= datetime.fromisoformat(start.replace('Z', '')))
-    if end:
-        query = query.filter(MaintenanceRequest.scheduled_date <= datetime.fromisoformat(end.replace('Z', '')))
-    
-    requests_list = query.all()
+    rows = calendar_rows(start, end, team_id=team_id, end_inclusive=True)
     
     events = []
-    for req in requests_list:
-        color = req.stage.color if req.stage else '#6c757d'
+    for row in rows:
         events.append({
-            'id': req.id,
-            'title': f'{req.reference}: {req.name}',
-            'start': req.scheduled_date.isoformat(),
-            'end': req.scheduled_date.isoformat(),
-            'color': color,
+            'id': row.id,
+            'title': f'{row.reference}: {row.name}',
+            'start': row.scheduled_date.isoformat(),
+            'end': row.scheduled_date.isoformat(),
+            'color': row.stage_color or DEFAULT_EVENT_COLOR,
             'extendedProps': {
-                'reference': req.reference,
-                'equipment': req.equipment.name if req.equipment else None,
-                'team': req.team.name if req.team else None,
-                'priority': req.priority,
-                'is_overdue': req.is_overdue
+                'reference': row.reference,
+                'equipment': row.equipment_name,
+                'team': row.team_name,
+                'priority': row.priority,
+                'is_overdue': bool(row.is_overdue)
             }
         })
     
+    # Upcoming schedule occurrences are expanded only when the range is bounded
+    if start and end:
+        for occurrence in expand_schedules(start, end + timedelta(microseconds=1), team_id):
+            events.append({
+                'id': occurrence['id'],
+                'title': occurrence['name'],
+                'start': occurrence['scheduled_date'].isoformat(),
+                'end': occurrence['scheduled_date'].isoformat(),
+                'color': DEFAULT_EVENT_COLOR,
+                'extendedProps': {
+                    'reference': None,
+                    'equipment': occurrence['equipment_name'],
+                    'team': occurrence['team_name'],
+                    'priority': occurrence['priority'],
+                    'is_overdue': False,
+                    'schedule_id': occurrence['schedule_id'],
+                    'virtual': True
+                }
+            })
+    
     return jsonify(events)
 
 
+@api.route('/calendar')
+def calendar_range():
+    """Get compact events, or per-day counts for zoomed-out ranges
+
+    Query params: start, end (YYYY-MM-DD, end exclusive), team_id, mode
+    (auto, events, counts; auto answers wide or busy ranges with counts).
+    """
+    from backend.services.calendar import (calendar_range as compute_range, CALENDAR_MODES,
+                                           CALENDAR_MAX_RANGE_DAYS)
+
+    mode = request.args.get('mode', 'auto')
+    if mode not in CALENDAR_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(CALENDAR_MODES)}"}), 400
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'start and end are required dates (YYYY-MM-DD)'}), 400
+    if not start < end <= start + timedelta(days=CALENDAR_MAX_RANGE_DAYS):
+        return jsonify({'error': f'end must be after start and at most {CALENDAR_MAX_RANGE_DAYS} days later'}), 400
+
+    return jsonify(compute_range(start, end, mode=mode, team_id=request.args.get('team_id', type=int)))
+
+
+# ==================== PREVENTIVE SCHEDULES ====================
+@api.route('/schedules')
+@login_required
+def get_schedules():
+    """Get preventive maintenance schedules"""
+    query = MaintenanceSchedule.query
+    
+    equipment_id = request.args.get('equipment_id', type=int)
+    if equipment_id:
+        query = query.filter_by(equipment_id=equipment_id)
+    category_id = request.args.get('category_id', type=int)
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+    if request.args.get('active') == '1':
+        query = query.filter_by(is_active=True)
+    
+    schedules = query.order_by(MaintenanceSchedule.name).all()
+    return jsonify([s.to_dict() for s in schedules])
+
+
+@api.route('/schedules/<int:id>')
+@login_required
+def get_schedule(id):
+    """Get single schedule"""
+    schedule = MaintenanceSchedule.query.get_or_404(id)
+    return jsonify(schedule.to_dict())
+
+
+@api.route('/schedules', methods=['POST'])
+@login_required
+@permission_required('can_manage_requests')
+def create_schedule():
+    """Create preventive schedule"""
+    try:
+        values = parse_schedule(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    schedule = MaintenanceSchedule(**values)
+    db.session.add(schedule)
+    db.session.commit()
+    
+    log_activity('create', 'schedule', schedule.id, f'Created schedule: {schedule.name}')
+    return jsonify(schedule.to_dict()), 201
+
+
+@api.route('/schedules/<int:id>', methods=['PUT'])
+@login_required
+@permission_required('can_manage_requests')
+def update_schedule(id):
+    """Update schedule; requests already generated are left as they are"""
+    schedule = MaintenanceSchedule.query.get_or_404(id)
+    try:
+        values = parse_schedule(request.json, schedule)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    for field, value in values.items():
+        setattr(schedule, field, value)
+    db.session.commit()
+    
+    log_activity('update', 'schedule', schedule.id, f'Updated schedule: {schedule.name}')
+    return jsonify(schedule.to_dict())
+
+
+@api.route('/schedules/<int:id>', methods=['DELETE'])
+@login_required
+@permission_required('can_manage_requests')
+def delete_schedule(id):
+    """Delete schedule; its generated requests are kept"""
+    schedule = MaintenanceSchedule.query.get_or_404(id)
+    
+    name = schedule.name
+    detach_schedule_requests(schedule)
+    db.session.delete(schedule)
+    db.session.commit()
+    
+    log_activity('delete', 'schedule', id, f'Deleted schedule: {name}')
+    return '', 204
+
+
+@api.route('/schedules/<int:id>/occurrences')
+@login_required
+def get_schedule_occurrences(id):
+    """Preview a schedule's upcoming (not yet generated) occurrences
+
+    Query params: start, end (YYYY-MM-DD, end exclusive; default the next 90 days)
+    """
+    schedule = MaintenanceSchedule.query.get_or_404(id)
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') \
+            else datetime.utcnow()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') if request.args.get('end') \
+            else start + timedelta(days=90)
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+    if not start < end:
+        return jsonify({'error': 'end must be after start'}), 400
+    
+    return jsonify({
+        'schedule_id': schedule.id,
+        'generated_until': schedule.generated_until.isoformat() if schedule.generated_until else None,
+        'occurrences': [when.isoformat() for when in occurrences(schedule, start, end)]
+    })
+
+
+# ==================== AUTO-SCHEDULER ====================
+@api.route('/scheduler/preview', methods=['POST'])
+@login_required
+@permission_required('can_assign_requests')
+def preview_schedule():
+    """Dry run: slots the scheduler would give unscheduled preventive requests
+
+    Body (all optional): start (YYYY-MM-DD, default tomorrow), days (default
+    91), team_id, request_ids.
+    """
+    try:
+        params = parse_plan_params(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(plan_schedule(params))
+
+
+@api.route('/scheduler/apply', methods=['POST'])
+@login_required
+@permission_required('can_assign_requests')
+def apply_auto_schedule():
+    """Plan like /scheduler/preview and write the slots in one transaction"""
+    try:
+        params = parse_plan_params(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    plan = plan_schedule(params)
+    apply_schedule(plan)
+    log_activities([
+        ('update', 'request', slot['request_id'],
+         f"Scheduled {slot['reference']} for {slot['start']} ({slot['technician_name']})")
+        for slot in plan['scheduled']
+    ])
+    db.session.commit()
+    return jsonify(plan)
+
+
 # ==================== REPORTS ====================
 @api.route('/reports/summary')
 @login_required
 @permission_required('can_view_reports')
+@cached_report('requests', 'equipment', 'teams')
 def reports_summary():
     """Get reports summary data"""
     # Requests by type
@@ -898,11 +1323,7 @@ def reports_summary():
     team_workload = []
     teams = MaintenanceTeam.query.all()
     for team in teams:
-        open_count = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-            MaintenanceRequest.team_id == team.id,
-            MaintenanceStage.is_done == False,
-            MaintenanceStage.is_scrap == False
-        ).count()
+        open_count = MaintenanceRequest.query.filter_by(team_id=team.id, is_open=True).count()
         total_count = MaintenanceRequest.query.filter_by(team_id=team.id).count()
         team_workload.append({
             'team': team.name,
@@ -928,64 +1349,54 @@ def reports_summary():
 @api.route('/reports/requests-by-team')
 @login_required
 @permission_required('can_view_reports')
+@cached_report('requests', 'teams')
 def requests_by_team_report():
     """Get number of requests per team (Pivot Report)"""
-    # Get all teams with their request counts by status
-    teams = MaintenanceTeam.query.all()
-    result = []
+    # One grouped count over every request (per team, priority and state)
+    # instead of seven counts per team
+    rows = db.session.query(
+        MaintenanceRequest.team_id,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.is_open,
+        MaintenanceStage.is_done,
+        func.count(MaintenanceRequest.id)
+    ).outerjoin(MaintenanceStage, MaintenanceRequest.stage_id == MaintenanceStage.id).group_by(
+        MaintenanceRequest.team_id, MaintenanceRequest.priority, MaintenanceRequest.is_open, MaintenanceStage.is_done
+    ).all()
     
-    for team in teams:
-        # Count by priority
-        urgent = MaintenanceRequest.query.filter_by(team_id=team.id, priority='urgent').count()
-        high = MaintenanceRequest.query.filter_by(team_id=team.id, priority='high').count()
-        normal = MaintenanceRequest.query.filter_by(team_id=team.id, priority='normal').count()
-        low = MaintenanceRequest.query.filter_by(team_id=team.id, priority='low').count()
-        
-        # Count by stage (open vs completed)
-        open_count = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-            MaintenanceRequest.team_id == team.id,
-            MaintenanceStage.is_done == False,
-            MaintenanceStage.is_scrap == False
-        ).count()
-        
-        completed_count = db.session.query(MaintenanceRequest).join(MaintenanceStage).filter(
-            MaintenanceRequest.team_id == team.id,
-            MaintenanceStage.is_done == True
-        ).count()
-        
-        total = MaintenanceRequest.query.filter_by(team_id=team.id).count()
-        
+    def empty():
+        return {'total': 0, 'open': 0, 'completed': 0,
+                'by_priority': {'urgent': 0, 'high': 0, 'normal': 0, 'low': 0}}
+    
+    counts = {}
+    for team_id, priority, is_open, is_done, count in rows:
+        team_counts = counts.setdefault(team_id, empty())
+        team_counts['total'] += count
+        team_counts['open'] += count if is_open else 0
+        team_counts['completed'] += count if is_done else 0
+        if priority in team_counts['by_priority']:
+            team_counts['by_priority'][priority] += count
+    
+    result = []
+    for team in MaintenanceTeam.query.all():
         result.append({
             'team_id': team.id,
             'team_name': team.name,
             'team_color': team.color,
-            'total': total,
-            'open': open_count,
-            'completed': completed_count,
-            'by_priority': {
-                'urgent': urgent,
-                'high': high,
-                'normal': normal,
-                'low': low
-            }
+            **counts.get(team.id, empty())
         })
     
     # Also add unassigned requests
-    unassigned = MaintenanceRequest.query.filter_by(team_id=None).count()
-    if unassigned > 0:
+    if counts.get(None, {}).get('total'):
+        unassigned = counts[None]
         result.append({
             'team_id': None,
             'team_name': 'Unassigned',
             'team_color': '#6c757d',
-            'total': unassigned,
-            'open': unassigned,
+            'total': unassigned['total'],
+            'open': unassigned['total'],
             'completed': 0,
-            'by_priority': {
-                'urgent': MaintenanceRequest.query.filter_by(team_id=None, priority='urgent').count(),
-                'high': MaintenanceRequest.query.filter_by(team_id=None, priority='high').count(),
-                'normal': MaintenanceRequest.query.filter_by(team_id=None, priority='normal').count(),
-                'low': MaintenanceRequest.query.filter_by(team_id=None, priority='low').count()
-            }
+            'by_priority': unassigned['by_priority']
         })
     
     return jsonify({
@@ -997,6 +1408,7 @@ def requests_by_team_report():
 @api.route('/reports/requests-by-category')
 @login_required
 @permission_required('can_view_reports')
+@cached_report('requests', 'equipment')
 def requests_by_category_report():
     """Get number of requests per equipment category (Pivot Report)"""
     # Get requests grouped by equipment category
@@ -1103,35 +1515,236 @@ def equipment_breakdown_report():
 @api.route('/reports/maintenance-trends')
 @login_required
 @permission_required('can_view_reports')
+@cached_report('requests')
 def maintenance_trends_report():
-    """Get maintenance trends over time"""
-    result = []
+    """Get maintenance trends over time (last 12 months, from request_daily_facts)"""
+    return jsonify([{
+        'month': m['month'].strftime('%b %Y'),
+        'created': m['created'],
+        'completed': m['completed']
+    } for m in monthly_totals(12)])
+
+
+@api.route('/reports/long-term-trends')
+@login_required
+@permission_required('can_view_reports')
+@cached_report('requests')
+def long_term_trends_report():
+    """Get multi-year monthly trends with cost and duration (from request_daily_facts)
     
-    for i in range(11, -1, -1):  # Last 12 months
-        date = datetime.utcnow() - timedelta(days=i*30)
-        month_start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if date.month == 12:
-            month_end = month_start.replace(year=date.year+1, month=1)
-        else:
-            month_end = month_start.replace(month=date.month+1)
-        
-        created = MaintenanceRequest.query.filter(
-            MaintenanceRequest.created_at >= month_start,
-            MaintenanceRequest.created_at < month_end
-        ).count()
-        
-        completed = MaintenanceRequest.query.filter(
-            MaintenanceRequest.completed_date >= month_start,
-            MaintenanceRequest.completed_date < month_end
-        ).count()
-        
-        result.append({
-            'month': month_start.strftime('%b %Y'),
-            'created': created,
-            'completed': completed
-        })
+    Query params: months (default 60, max 240), team_id, category_id,
+    priority, request_type.
+    """
+    months = min(max(request.args.get('months', 60, type=int), 1), 240)
+    months_data = monthly_totals(
+        months,
+        team_id=request.args.get('team_id', type=int),
+        category_id=request.args.get('category_id', type=int),
+        priority=request.args.get('priority'),
+        request_type=request.args.get('request_type')
+    )
+    return jsonify([{
+        'month': m['month'].strftime('%b %Y'),
+        'created': m['created'],
+        'completed': m['completed'],
+        'overdue': m['overdue'],
+        'maintenance_cost': round(m['cost'], 2),
+        'avg_duration_hours': round(m['duration'] / m['completed'], 2) if m['completed'] else None
+    } for m in months_data])
+
+
+@api.route('/reports/time-percentiles')
+@login_required
+@permission_required('can_view_reports')
+@cached_report('requests', 'teams')
+def time_percentiles_report():
+    """Get resolution or response time percentiles merged from quantile sketches
+
+    Query params: metric (resolution, response), group_by (comma list of team_id,
+    priority, month; default team_id,priority), q (comma list of quantiles,
+    default 0.5,0.9,0.95), months (default 12, max 240), team_id, priority.
+    """
+    metric = request.args.get('metric', 'resolution')
+    if metric not in SKETCH_METRICS:
+        return jsonify({'error': f"metric must be one of: {', '.join(SKETCH_METRICS)}"}), 400
+
+    group_by = [g for g in request.args.get('group_by', 'team_id,priority').split(',') if g]
+    if any(g not in SKETCH_DIMENSIONS for g in group_by):
+        return jsonify({'error': f"group_by must be a list of: {', '.join(SKETCH_DIMENSIONS)}"}), 400
+
+    try:
+        quantiles = [float(q) for q in request.args.get('q', '0.5,0.9,0.95').split(',')]
+    except ValueError:
+        return jsonify({'error': 'q must be a comma separated list of numbers'}), 400
+    if not quantiles or len(quantiles) > 10 or any(not 0 <= q <= 1 for q in quantiles):
+        return jsonify({'error': 'q must list 1 to 10 quantiles between 0 and 1'}), 400
+
+    months = min(max(request.args.get('months', 12, type=int), 1), 240)
+    starts = month_starts(months)
+    items = sketch_percentiles(
+        starts[0], next_month(starts[-1]),
+        group_by=tuple(dict.fromkeys(group_by)),
+        quantiles=quantiles,
+        metric=metric,
+        team_id=request.args.get('team_id', type=int),
+        priority=request.args.get('priority')
+    )
+
+    if 'team_id' in group_by:
+        team_names = dict(db.session.query(MaintenanceTeam.id, MaintenanceTeam.name).all())
+        for item in items:
+            item['team_name'] = team_names.get(item['team_id'], 'Unassigned')
+
+    return jsonify({
+        'metric': metric,
+        'from': starts[0].isoformat(),
+        'to': next_month(starts[-1]).isoformat(),
+        'items': items
+    })
+
+
+@api.route('/reports/reliability')
+@login_required
+@permission_required('can_view_reports')
+@cached_report('requests', 'equipment')
+def reliability_report():
+    """Get MTBF / MTTR from corrective requests
+
+    Query params: group_by (equipment, category, department), since
+    (YYYY-MM-DD), sort (failures, mtbf, mttr), limit (default 50, max 1000).
+    """
+    from backend.services.reliability import (reliability_report as compute_reliability,
+                                              RELIABILITY_GROUPS, RELIABILITY_SORTS)
+
+    group_by = request.args.get('group_by', 'equipment')
+    sort = request.args.get('sort', 'failures')
+    if group_by not in RELIABILITY_GROUPS:
+        return jsonify({'error': f"group_by must be one of: {', '.join(RELIABILITY_GROUPS)}"}), 400
+    if sort not in RELIABILITY_SORTS:
+        return jsonify({'error': f"sort must be one of: {', '.join(RELIABILITY_SORTS)}"}), 400
+
+    since = None
+    if request.args.get('since'):
+        try:
+            since = datetime.strptime(request.args['since'], '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'since must be a date (YYYY-MM-DD)'}), 400
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    return jsonify(compute_reliability(group_by, since=since, sort=sort, limit=limit))
+
+
+@api.route('/reports/time-in-stage')
+@login_required
+@permission_required('can_view_reports')
+@cached_report('requests')
+def time_in_stage_report():
+    """Get visit counts and time spent per stage (avg / median / p90 / max hours)
+
+    Query params: since (YYYY-MM-DD, visits entered on or after), team_id.
+    """
+    since = None
+    if request.args.get('since'):
+        try:
+            since = datetime.strptime(request.args['since'], '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'since must be a date (YYYY-MM-DD)'}), 400
+
+    return jsonify(time_in_stage(since=since, team_id=request.args.get('team_id', type=int)))
+
+
+@api.route('/reports/cache-stats')
+@login_required
+@permission_required('can_view_reports')
+def report_cache_stats():
+    """Get report cache statistics for this worker"""
+    return jsonify(report_cache.stats())
+
+
+@api.route('/reports/cache', methods=['DELETE'])
+@login_required
+@permission_required('can_manage_settings')
+def clear_report_cache():
+    """Drop all cached report results in this worker"""
+    report_cache.clear()
+    return '', 204
+
+
+# ==================== REPORT EXPORTS ====================
+@api.route('/reports/exports', methods=['POST'])
+@login_required
+@permission_required('can_view_reports')
+def create_report_export():
+    """Queue a background export (report, format: csv/xlsx/pdf, year)"""
+    from backend.services.exports import validate_export, create_export, purge_expired_exports
     
-    return jsonify(result)
+    data = request.json or {}
+    try:
+        report, fmt, params = validate_export(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    purge_expired_exports()
+    user = get_current_user()
+    job = create_export(report, fmt, params, user.id if user else None)
+    
+    log_activity('export', 'report_export', job.id, f'Queued {fmt} export of {report} {params["year"]}')
+    return jsonify(job.to_dict()), 202
+
+
+@api.route('/reports/exports')
+@login_required
+@permission_required('can_view_reports')
+def get_report_exports():
+    """List recent export jobs (own jobs; admins see all)"""
+    from backend.models import ReportExport
+    from backend.services.exports import purge_expired_exports
+    
+    purge_expired_exports()
+    user = get_current_user()
+    query = ReportExport.query
+    if not user.has_permission('can_manage_settings'):
+        query = query.filter_by(requested_by=user.id)
+    jobs = query.order_by(ReportExport.created_at.desc()).limit(50).all()
+    return jsonify([j.to_dict() for j in jobs])
+
+
+def _get_visible_export(id):
+    from backend.models import ReportExport
+    job = ReportExport.query.get_or_404(id)
+    user = get_current_user()
+    if job.requested_by != user.id and not user.has_permission('can_manage_settings'):
+        return None
+    return job
+
+
+@api.route('/reports/exports/<int:id>')
+@login_required
+@permission_required('can_view_reports')
+def get_report_export(id):
+    """Get export job status and progress"""
+    job = _get_visible_export(id)
+    if job is None:
+        return jsonify({'error': 'Permission denied'}), 403
+    return jsonify(job.to_dict())
+
+
+@api.route('/reports/exports/<int:id>/download')
+@login_required
+@permission_required('can_view_reports')
+def download_report_export(id):
+    """Download a finished export file"""
+    import os
+    from flask import send_file
+    
+    job = _get_visible_export(id)
+    if job is None:
+        return jsonify({'error': 'Permission denied'}), 403
+    if job.status != 'done':
+        return jsonify({'error': f'Export is {job.status}'}), 409
+    if job.expires_at and job.expires_at <= datetime.utcnow() or not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Export has expired'}), 410
+    return send_file(job.file_path, as_attachment=True, download_name=job.filename)
 
 
 # ==================== TECHNICIANS ====================
@@ -1139,8 +1752,9 @@ def maintenance_trends_report():
 def get_all_technicians():
     """Get all technicians with optional filters"""
     from backend.models.technician import Technician
+    from sqlalchemy.orm import joinedload
     
-    query = Technician.query.filter_by(is_active=True)
+    query = Technician.query.options(joinedload(Technician.team)).filter_by(is_active=True)
     
     # Filter by skill
     skill = request.args.get('skill')
@@ -1271,19 +1885,27 @@ def update_technician_status(id):
 @api.route('/technicians/stats')
 def get_technician_stats():
     """Get technician statistics"""
-    from backend.models.technician import Technician
-    
-    total = Technician.query.filter_by(is_active=True).count()
-    available = Technician.query.filter_by(is_active=True, availability_status='available').count()
-    busy = Technician.query.filter_by(is_active=True, availability_status='busy').count()
-    off_duty = Technician.query.filter_by(is_active=True, availability_status='off_duty').count()
-    
-    return jsonify({
-        'total': total,
-        'available': available,
-        'busy': busy,
-        'off_duty': off_duty
-    })
+    stats, _, _ = technician_facets({})
+    return jsonify(stats)
+
+
+@api.route('/technicians/overview')
+def get_technician_overview():
+    """Technicians page in one call: a page of technicians (search, skill,
+    availability, team_id, cursor, limit); the first page adds stats, facet
+    counts and the team list
+    """
+    try:
+        filters = parse_technician_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = min(max(request.args.get('limit', TECHNICIANS_PAGE_SIZE, type=int), 1), TECHNICIANS_MAX_PAGE_SIZE)
+    try:
+        overview = technician_overview(filters, cursor=request.args.get('cursor'), limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify(overview)
 
 
 @api.route('/technicians/skills')
@@ -1293,6 +1915,132 @@ def get_skill_types():
     return jsonify(SKILL_TYPES)
 
 
+# ==================== SHIFTS ====================
+@api.route('/technicians/<int:id>/shifts')
+@login_required
+def get_technician_shifts(id):
+    """Shift and leave records of a technician"""
+    from backend.models.technician import Technician
+    from backend.models import TechnicianShift
+    Technician.query.get_or_404(id)
+    shifts = TechnicianShift.query.filter_by(technician_id=id).order_by(TechnicianShift.starts_at).all()
+    return jsonify([s.to_dict() for s in shifts])
+
+
+@api.route('/technicians/<int:id>/shifts', methods=['POST'])
+@login_required
+@permission_required('can_manage_teams')
+def create_technician_shift(id):
+    """Add a shift or leave (optionally recurring, rrule + until)"""
+    from backend.models.technician import Technician
+    from backend.models import TechnicianShift
+    technician = Technician.query.get_or_404(id)
+    try:
+        values = parse_shift(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    shift = TechnicianShift(technician_id=technician.id, **values)
+    db.session.add(shift)
+    db.session.commit()
+    
+    log_activity('create', 'shift', shift.id, f'Added {shift.kind} for {technician.name}')
+    return jsonify(shift.to_dict()), 201
+
+
+@api.route('/shifts/<int:id>', methods=['PUT'])
+@login_required
+@permission_required('can_manage_teams')
+def update_technician_shift(id):
+    """Update a shift or leave"""
+    from backend.models import TechnicianShift
+    shift = TechnicianShift.query.get_or_404(id)
+    try:
+        values = parse_shift(request.json, shift)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    for field, value in values.items():
+        setattr(shift, field, value)
+    db.session.commit()
+    
+    log_activity('update', 'shift', shift.id, f'Updated {shift.kind} for {shift.technician.name}')
+    return jsonify(shift.to_dict())
+
+
+@api.route('/shifts/<int:id>', methods=['DELETE'])
+@login_required
+@permission_required('can_manage_teams')
+def delete_technician_shift(id):
+    """Delete a shift or leave"""
+    from backend.models import TechnicianShift
+    shift = TechnicianShift.query.get_or_404(id)
+    kind, name = shift.kind, shift.technician.name
+    db.session.delete(shift)
+    db.session.commit()
+    
+    log_activity('delete', 'shift', id, f'Deleted {kind} for {name}')
+    return '', 204
+
+
+@api.route('/availability')
+@login_required
+def get_availability():
+    """Technicians on shift for the whole of [start, end) (team_id optional)"""
+    try:
+        start, end = parse_range(request.args, default_days=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    team_id = request.args.get('team_id', type=int)
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'technicians': available_technicians(start, end, team_id)
+    })
+
+
+@api.route('/availability/capacity')
+@login_required
+def get_availability_capacity():
+    """Free technician-hours per day over [start, end) (team_id optional)"""
+    try:
+        start, end = parse_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    team_id = request.args.get('team_id', type=int)
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': capacity_by_day(start, end, team_id)
+    })
+
+
+# ==================== PROFILES ====================
+@api.route('/profiles')
+@login_required
+@permission_required('can_manage_settings')
+def get_profiles():
+    """Stored request profiles, newest first (?__profile=1 on any /api call)"""
+    from backend.profiling import list_profiles
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify(list_profiles(limit))
+
+
+@api.route('/profiles/<name>')
+@login_required
+@permission_required('can_manage_settings')
+def download_profile(name):
+    """Download a profile (collapsed stacks or pstats text)"""
+    from flask import send_file
+    from backend.profiling import profile_path
+    
+    path = profile_path(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=request.args.get('download') == '1',
+                     download_name=name)
+
+
 # ==================== USERS (for technician selection) ====================
 @api.route('/users/technicians')
 def get_technicians_users():
@@ -82,6 +82,27 @@ def log_activity(action, entity_type=None, entity_id=None, description=None):
     db.session.commit()
 
 
+def log_activities(entries):
+    """Log many (action, entity_type, entity_id, description) entries at once
+
+    Written with one multi-row INSERT in the caller's transaction (no commit),
+    so a bulk change and its audit trail commit together.
+    """
+    if not entries:
+        return
+    user = get_current_user()
+    common = {
+        'user_id': user.id if user else None,
+        'ip_address': request.remote_addr,
+        'user_agent': request.user_agent.string[:500] if request.user_agent else None,
+        'created_at': datetime.utcnow()
+    }
+    db.session.execute(ActivityLog.__table__.insert(), [
+        dict(common, action=action, entity_type=entity_type, entity_id=entity_id, description=description)
+        for action, entity_type, entity_id, description in entries
+    ])
+
+
 # ==================== AUTH ROUTES ====================
 @auth.route('/register', methods=['POST'])
 def register():
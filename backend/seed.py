@@ -2,7 +2,7 @@
 """
 GearGuard - Seed Data
 """
-from backend.models import db, EquipmentCategory, Equipment, MaintenanceTeam, TeamMember, MaintenanceStage, MaintenanceRequest, User, Role
+from backend.models import db, EquipmentCategory, Equipment, MaintenanceTeam, TeamMember, MaintenanceStage, MaintenanceRequest, User, Role, RequestStageTransition, MaintenanceSchedule
 from datetime import datetime, timedelta
 import random
 
@@ -13,13 +13,18 @@ def seed_database():
     
     # Clear existing data
     print("  Clearing existing data...")
+    RequestStageTransition.query.delete()
     MaintenanceRequest.query.delete()
+    MaintenanceSchedule.query.delete()
     TeamMember.query.delete()
     MaintenanceTeam.query.delete()
     Equipment.query.delete()
     EquipmentCategory.query.delete()
     MaintenanceStage.query.delete()
     User.query.delete()
+    # Bulk deletes leave no tombstones: make synced clients start over
+    from backend.services.changes import reset_change_feed
+    reset_change_feed()
     db.session.commit()
     
     # Ensure roles exist
@@ -75,12 +80,12 @@ def seed_database():
     # ==================== CATEGORIES ====================
     print("  Creating categories...")
     categories_data = [
-        {'name': 'Computers & Laptops', 'description': 'Desktop computers, laptops, workstations', 'color': '#0d6efd', 'icon': 'bi-laptop'},
-        {'name': 'Vehicles', 'description': 'Cars, trucks, forklifts, company vehicles', 'color': '#198754', 'icon': 'bi-truck'},
-        {'name': 'Production Machines', 'description': 'Manufacturing and production equipment', 'color': '#dc3545', 'icon': 'bi-gear'},
-        {'name': 'HVAC Systems', 'description': 'Heating, ventilation, air conditioning', 'color': '#0dcaf0', 'icon': 'bi-thermometer-half'},
-        {'name': 'Office Equipment', 'description': 'Printers, copiers, projectors', 'color': '#6f42c1', 'icon': 'bi-printer'},
-        {'name': 'Safety Equipment', 'description': 'Fire extinguishers, alarms, safety gear', 'color': '#fd7e14', 'icon': 'bi-shield-check'},
+        {'name': 'Computers & Laptops', 'description': 'Desktop computers, laptops, workstations', 'color': '#0d6efd', 'icon': 'bi-laptop', 'required_skills': 'Electrical'},
+        {'name': 'Vehicles', 'description': 'Cars, trucks, forklifts, company vehicles', 'color': '#198754', 'icon': 'bi-truck', 'required_skills': 'Mechanical'},
+        {'name': 'Production Machines', 'description': 'Manufacturing and production equipment', 'color': '#dc3545', 'icon': 'bi-gear', 'required_skills': 'Mechanical,Automation'},
+        {'name': 'HVAC Systems', 'description': 'Heating, ventilation, air conditioning', 'color': '#0dcaf0', 'icon': 'bi-thermometer-half', 'required_skills': 'HVAC'},
+        {'name': 'Office Equipment', 'description': 'Printers, copiers, projectors', 'color': '#6f42c1', 'icon': 'bi-printer', 'required_skills': 'Electrical'},
+        {'name': 'Safety Equipment', 'description': 'Fire extinguishers, alarms, safety gear', 'color': '#fd7e14', 'icon': 'bi-shield-check', 'required_skills': 'Safety'},
     ]
     
     categories = {}
@@ -252,6 +257,16 @@ def seed_database():
     
     db.session.commit()
     
+    # ==================== REPORT ROLLUPS ====================
+    print("  Building report rollups...")
+    from backend.services.facts import rebuild_all_facts
+    from backend.services.sketches import rebuild_all_sketches
+    from backend.services.transitions import backfill_transitions
+    rebuild_all_facts()
+    rebuild_all_sketches()
+    backfill_transitions()
+    db.session.commit()
+    
     print("✅ Database seeded successfully!")
     print(f"   - {User.query.count()} users")
     print(f"   - {MaintenanceStage.query.count()} stages")
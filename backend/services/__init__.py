@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+GearGuard - Services (analytics, background jobs and derived data)
+"""
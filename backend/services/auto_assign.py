@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Request Auto-assignment
+
+Picks a team, and optionally a technician, for a new request instead of
+trusting the client's team_id. Eligible teams are active teams with at
+least one active technician who is not off duty (every active team while
+no technician is registered), narrowed to teams with someone holding one of
+the equipment category's required_skills when any team has.
+
+Policies are pluggable (ASSIGNMENT_POLICIES, register_policy):
+    round_robin    - next eligible team after the last one picked (per process)
+    least_loaded   - fewest open requests per available technician
+    skill_weighted - best-matching technician (services/matching.py scores),
+                     the team follows the technician
+
+Open requests per team and per technician come from the technician index,
+which keeps them incrementally from the change feed; nothing is counted per
+request. simulate_assignments() replays past requests through the policies
+(`flask --app app assignments simulate`).
+"""
+import heapq
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from backend.models import db, Equipment, EquipmentCategory, MaintenanceRequest, MaintenanceTeam
+from backend.services.matching import technician_index, score_technicians, skill_mask, AVAILABILITY_CODES
+
+ASSIGNMENT_POLICIES = {}
+
+
+def register_policy(cls):
+    """Class decorator adding a policy to ASSIGNMENT_POLICIES under cls.name"""
+    ASSIGNMENT_POLICIES[cls.name] = cls
+    return cls
+
+
+def get_policy_class(name):
+    """Policy class by name; ValueError with a user message when unknown"""
+    if name not in ASSIGNMENT_POLICIES:
+        raise ValueError(f"Unknown assignment policy '{name}' (one of: {', '.join(sorted(ASSIGNMENT_POLICIES))})")
+    return ASSIGNMENT_POLICIES[name]
+
+
+# ==================== WORKLOAD ====================
+class Workload:
+    """What a policy sees for one request: eligible teams and their loads
+
+    `arrays` is a technician index snapshot (matching.TechnicianIndex.sync);
+    the simulation passes copies with its own `loads` and `team_loads`.
+    """
+
+    def __init__(self, arrays, team_ids, required=0, default_team_id=None, fixed_team_id=None):
+        self.arrays = arrays
+        self.required = required
+        self.default_team_id = default_team_id
+        self.available = arrays['availability'] != AVAILABILITY_CODES['off_duty']
+
+        teams = arrays['teams'][self.available]
+        counted, counts = np.unique(teams, return_counts=True)
+        capacity = dict(zip(counted.tolist(), counts.tolist()))
+        if fixed_team_id is not None:
+            eligible = [fixed_team_id]
+        else:
+            eligible = [t for t in team_ids if capacity.get(t)] or list(team_ids)
+            if required:
+                skilled = set(teams[(arrays['masks'][self.available] & required) != 0].tolist())
+                eligible = [t for t in eligible if t in skilled] or eligible
+        self.team_ids = eligible
+        self.capacity = {t: capacity.get(t, 0) for t in eligible}
+
+    def team_load(self, team_id):
+        return self.arrays['team_loads'].get(team_id, 0)
+
+    def team_positions(self, team_id):
+        """Index positions of the team's technicians who are not off duty"""
+        return np.flatnonzero(self.available & (self.arrays['teams'] == team_id))
+
+    def best_technician(self, positions, team_id=None):
+        """Best match among `positions`: score, then lighter load, then lower id"""
+        if not len(positions):
+            return None
+        scores = score_technicians(self.arrays, self.required, team_id)[0]
+        order = np.lexsort((self.arrays['ids'][positions], self.arrays['loads'][positions], -scores[positions]))
+        return int(positions[order[0]])
+
+
+# ==================== POLICIES ====================
+class AssignmentPolicy:
+    """Picks a team; the technician is the team's best match"""
+    name = None
+
+    def choose_team(self, workload):
+        raise NotImplementedError
+
+    def choose(self, workload, with_technician=False):
+        """(team_id, technician index position or None)"""
+        if not workload.team_ids:
+            return None, None
+        team_id = workload.team_ids[0] if len(workload.team_ids) == 1 else self.choose_team(workload)
+        position = workload.best_technician(workload.team_positions(team_id), team_id) if with_technician else None
+        return team_id, position
+
+
+@register_policy
+class RoundRobinPolicy(AssignmentPolicy):
+    """Eligible teams in id order, one after another"""
+    name = 'round_robin'
+
+    def __init__(self):
+        self.last_team_id = None
+
+    def choose_team(self, workload):
+        team_ids = sorted(workload.team_ids)
+        following = [t for t in team_ids if self.last_team_id is None or t > self.last_team_id]
+        self.last_team_id = (following or team_ids)[0]
+        return self.last_team_id
+
+
+@register_policy
+class LeastLoadedPolicy(AssignmentPolicy):
+    """Fewest open requests per available technician; ties prefer the equipment's default team"""
+    name = 'least_loaded'
+
+    def choose_team(self, workload):
+        return min(workload.team_ids, key=lambda t: (
+            workload.team_load(t) / max(workload.capacity[t], 1), t != workload.default_team_id, t
+        ))
+
+
+@register_policy
+class SkillWeightedPolicy(AssignmentPolicy):
+    """Best-scoring technician across eligible teams (skill, default team, availability, load)"""
+    name = 'skill_weighted'
+
+    def choose(self, workload, with_technician=False):
+        positions = np.flatnonzero(workload.available & np.isin(workload.arrays['teams'], workload.team_ids))
+        position = workload.best_technician(positions, workload.default_team_id)
+        if position is None:
+            return LeastLoadedPolicy().choose(workload)
+        return int(workload.arrays['teams'][position]), position if with_technician else None
+
+
+# ==================== LIVE ====================
+_live_policies = {}
+_live_lock = threading.Lock()
+
+
+def auto_assign(equipment=None, policy=None, with_technician=False, team_id=None):
+    """(team_id, technician_id) for a new request on `equipment`
+
+    `policy` defaults to AUTO_ASSIGN_POLICY. A given team_id is kept and only
+    the technician is picked. Raises ValueError for an unknown policy.
+    """
+    policy_class = get_policy_class(policy or current_app.config.get('AUTO_ASSIGN_POLICY', 'least_loaded'))
+    arrays = technician_index.sync()
+    team_ids = db.session.execute(select(MaintenanceTeam.id).where(
+        MaintenanceTeam.is_active.is_(True)).order_by(MaintenanceTeam.id)).scalars().all()
+    category = equipment.category if equipment else None
+    workload = Workload(arrays, team_ids,
+                        required=skill_mask(category.required_skills) if category else 0,
+                        default_team_id=equipment.default_team_id if equipment else None,
+                        fixed_team_id=team_id)
+
+    with _live_lock:
+        # Live policies keep their state (the round-robin cursor) for the process
+        live = _live_policies.get(policy_class.name)
+        if live is None:
+            live = _live_policies[policy_class.name] = policy_class()
+        chosen_team_id, position = live.choose(workload, with_technician)
+    return chosen_team_id, int(arrays['ids'][position]) if position is not None else None
+
+
+# ==================== SIMULATION ====================
+def simulate_assignments(days, policies=None, with_technician=False, now=None):
+    """Replay the last `days` of requests through each policy
+
+    Requests are re-assigned in created_at order; each stays open until its
+    completed_date (updated_at for closed requests without one). Loads start
+    from the requests open when the window begins, on their actual team and
+    technician. Uses the current technician roster. Returns one result per
+    policy plus 'actual' (the recorded team_id), each with:
+        mean_spread / max_spread - open requests of the busiest minus the
+                                   idlest eligible team, at each assignment
+        peak_team_open           - most open requests any team reached
+        skill_match_rate         - share of requests whose team (technician)
+                                   fully covers the required skills
+        same_team_rate           - share matching the recorded team
+    """
+    now = now or datetime.utcnow()
+    window_start = now - timedelta(days=days)
+    policies = list(policies or sorted(ASSIGNMENT_POLICIES))
+    for name in policies:
+        get_policy_class(name)
+
+    arrays = technician_index.sync()
+    team_ids = db.session.execute(select(MaintenanceTeam.id).where(
+        MaintenanceTeam.is_active.is_(True)).order_by(MaintenanceTeam.id)).scalars().all()
+    equipment = {
+        row.id: (skill_mask(row.required_skills), row.default_team_id)
+        for row in db.session.execute(select(
+            Equipment.id, Equipment.default_team_id, EquipmentCategory.required_skills
+        ).outerjoin(EquipmentCategory, Equipment.category_id == EquipmentCategory.id))
+    }
+
+    def ends_at(row):
+        if row.is_open:
+            return None
+        return row.completed_date or row.updated_at
+
+    columns = (MaintenanceRequest.id, MaintenanceRequest.created_at, MaintenanceRequest.updated_at,
+               MaintenanceRequest.completed_date, MaintenanceRequest.is_open, MaintenanceRequest.equipment_id,
+               MaintenanceRequest.team_id, MaintenanceRequest.technician_id)
+    initial = [
+        (row.team_id, row.technician_id, ends_at(row))
+        for row in db.session.execute(select(*columns).where(MaintenanceRequest.created_at < window_start))
+        if ends_at(row) is None or ends_at(row) > window_start
+    ]
+    replay = db.session.execute(select(*columns).where(
+        MaintenanceRequest.created_at >= window_start, MaintenanceRequest.created_at <= now
+    ).order_by(MaintenanceRequest.created_at, MaintenanceRequest.id)).all()
+
+    results = {}
+    for name in ['actual'] + policies:
+        results[name] = _replay(name, arrays, team_ids, equipment, initial, replay, ends_at, with_technician)
+    return {
+        'days': days,
+        'window_start': window_start.isoformat(),
+        'requests': len(replay),
+        'initially_open': len(initial),
+        'technicians': len(arrays['ids']),
+        'teams': len(team_ids),
+        'results': results
+    }
+
+
+def _replay(name, arrays, team_ids, equipment, initial, replay, ends_at, with_technician):
+    policy = ASSIGNMENT_POLICIES[name]() if name != 'actual' else None
+    positions = arrays['positions']
+    loads = np.zeros(len(arrays['ids']), dtype=np.float64)
+    team_loads = {t: 0 for t in team_ids}
+    peak = dict(team_loads)
+    closing = []                  # heap of (ends_at, seq, team_id, position)
+
+    def open_request(team_id, position, end, seq):
+        if team_id is not None:
+            team_loads[team_id] = team_loads.get(team_id, 0) + 1
+            peak[team_id] = max(peak.get(team_id, 0), team_loads[team_id])
+        if position is not None:
+            loads[position] += 1
+        if end is not None:
+            heapq.heappush(closing, (end, seq, team_id, position))
+
+    for seq, (team_id, technician_id, end) in enumerate(initial):
+        open_request(team_id, positions.get(technician_id), end, -seq - 1)
+
+    spreads, skill_matches, same_team = [], 0, 0
+    for row in replay:
+        while closing and closing[0][0] <= row.created_at:
+            _, _, team_id, position = heapq.heappop(closing)
+            if team_id is not None:
+                team_loads[team_id] -= 1
+            if position is not None:
+                loads[position] -= 1
+
+        required, default_team_id = equipment.get(row.equipment_id, (0, None))
+        workload = Workload(dict(arrays, loads=loads, team_loads=team_loads), team_ids, required, default_team_id)
+        if policy is None:
+            team_id, position = row.team_id, positions.get(row.technician_id)
+        else:
+            team_id, position = policy.choose(workload, with_technician)
+
+        open_request(team_id, position, ends_at(row), row.id)
+
+        if workload.team_ids:
+            eligible_loads = [team_loads.get(t, 0) for t in workload.team_ids]
+            spreads.append(max(eligible_loads) - min(eligible_loads))
+        if team_id is not None and team_id == row.team_id:
+            same_team += 1
+        if not required:
+            skill_matches += 1
+        elif team_id is not None or position is not None:
+            covered = [position] if position is not None else workload.team_positions(team_id)
+            skill_matches += any((int(arrays['masks'][p]) & required) == required for p in covered)
+
+    total = len(replay) or 1
+    return {
+        'mean_spread': round(sum(spreads) / len(spreads), 2) if spreads else 0,
+        'max_spread': max(spreads, default=0),
+        'peak_team_open': max(peak.values(), default=0),
+        'skill_match_rate': round(skill_matches / total, 3),
+        'same_team_rate': round(same_team / total, 3)
+    }
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Capacity-aware Scheduling of Preventive Requests
+
+Books open preventive requests that have no scheduled_date into technicians'
+working hours over a planning window. Capacity is every active technician
+who is not off duty, pooled by team (Technician.team_id); a request goes to
+its team, else its equipment's default team, else to anyone (and then takes
+the technician's team). Open requests already scheduled in the window keep
+their slot and reserve it on their technician (or on a free team member).
+
+Greedy, earliest deadline first: requests are taken by deadline, priority
+and age, and each gets the earliest slot where any eligible technician can
+fit its duration_hours inside one working day (a request has one start and
+one duration, so requests longer than a working day are left unscheduled).
+Each technician's bookings are kept as sorted, non-overlapping intervals
+searched with bisect, and each pool is a heap keyed by the technician's
+first free instant, so a placement only looks at the few technicians that
+could start first.
+
+plan_schedule() never writes (dry run); apply_schedule() writes a plan.
+"""
+import heapq
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from backend.models import db, Equipment, MaintenanceRequest, MaintenanceTeam, Technician
+from backend.signals import emit_requests_written, request_snapshot
+
+SCHEDULER_DEFAULT_DAYS = 91       # a quarter
+SCHEDULER_MAX_DAYS = 184
+PRIORITY_RANK = {'urgent': 0, 'high': 1, 'normal': 2, 'low': 3}
+
+
+# ==================== PARAMETERS ====================
+def parse_plan_params(data, today=None):
+    """Validated planning parameters: start, end (datetimes), team_id, request_ids
+
+    Raises ValueError with a user message.
+    """
+    data = data or {}
+    today = today or datetime.utcnow().date()
+    try:
+        start = datetime.strptime(data['start'], '%Y-%m-%d').date() if data.get('start') else today + timedelta(days=1)
+    except (TypeError, ValueError):
+        raise ValueError('start must be a date (YYYY-MM-DD)')
+    if start < today:
+        raise ValueError('start cannot be in the past')
+    days = data.get('days', SCHEDULER_DEFAULT_DAYS)
+    if not isinstance(days, int) or not 1 <= days <= SCHEDULER_MAX_DAYS:
+        raise ValueError(f'days must be between 1 and {SCHEDULER_MAX_DAYS}')
+
+    team_id = data.get('team_id')
+    if team_id is not None and not db.session.get(MaintenanceTeam, team_id):
+        raise ValueError(f'Unknown team {team_id}')
+    request_ids = data.get('request_ids')
+    if request_ids is not None and (not isinstance(request_ids, list) or
+                                    not all(isinstance(i, int) for i in request_ids)):
+        raise ValueError('request_ids must be a list of request ids')
+
+    start_at = datetime.combine(start, time())
+    return {
+        'start': start_at,
+        'end': start_at + timedelta(days=days),
+        'team_id': team_id,
+        'request_ids': request_ids
+    }
+
+
+# ==================== TIMELINES ====================
+class _Workday:
+    """Working hours: start_hour for `hours` hours on `weekdays` (0 = Monday)"""
+
+    def __init__(self, start_hour, hours, weekdays, window_start, window_end):
+        self.hours = hours
+        self.opens, self.closes = [], []
+        day = window_start.date()
+        while datetime.combine(day, time()) < window_end:
+            opens = datetime.combine(day, time()) + timedelta(hours=start_hour)
+            if day.weekday() in weekdays and opens < window_end:
+                self.opens.append(opens)
+                self.closes.append(opens + timedelta(hours=hours))
+            day += timedelta(days=1)
+
+    def around(self, instant):
+        """(start, end) of the working day holding `instant` or the next one; None past the window"""
+        i = bisect_right(self.closes, instant)
+        return (self.opens[i], self.closes[i]) if i < len(self.opens) else None
+
+    def capacity_hours(self, start):
+        """Working hours of one technician from `start` to the window end"""
+        return sum((close - max(opens, start)).total_seconds()
+                   for opens, close in zip(self.opens, self.closes) if close > start) / 3600
+
+
+class _Timeline:
+    """One technician's bookings in the window: sorted, non-overlapping intervals"""
+    __slots__ = ('id', 'name', 'team_id', 'cursor', 'window_end', 'starts', 'ends', 'reserved_hours',
+                 'planned_hours')
+
+    def __init__(self, row, cursor, window_end):
+        self.id, self.name, self.team_id = row.id, row.name, row.team_id
+        self.cursor = cursor          # first free instant (nothing is free before it)
+        self.window_end = window_end
+        self.starts, self.ends = [], []
+        self.reserved_hours = self.planned_hours = 0.0
+
+    def reserve(self, intervals):
+        """Load existing bookings (they may overlap; merged here)"""
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def is_free(self, start, end):
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] > start:
+            return False
+        return i + 1 >= len(self.starts) or self.starts[i + 1] >= end
+
+    def book(self, start, end):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+
+    def hours_between(self, start, end):
+        return sum(
+            max(0.0, (min(e, end) - max(s, start)).total_seconds()) for s, e in zip(self.starts, self.ends)
+        ) / 3600
+
+    def advance(self, workday):
+        """Move the cursor to the first free instant; True if it moved"""
+        cursor = self.fit(0, workday) or self.window_end
+        moved, self.cursor = cursor != self.cursor, cursor
+        return moved
+
+    def fit(self, hours, workday):
+        """Earliest start >= cursor where `hours` fit in one working day; None if nowhere"""
+        if hours > workday.hours:
+            return None
+        length = timedelta(hours=hours)
+        candidate = self.cursor
+        while True:
+            day = workday.around(candidate)
+            if day is None:
+                return None
+            candidate = max(candidate, day[0])
+            if candidate + length > day[1] or candidate >= day[1]:
+                candidate = day[1]
+                continue
+            i = bisect_right(self.starts, candidate) - 1
+            if i >= 0 and self.ends[i] > candidate:
+                candidate = self.ends[i]
+            elif i + 1 < len(self.starts) and self.starts[i + 1] < candidate + length:
+                candidate = self.ends[i + 1]
+            else:
+                return candidate
+
+
+def _place(pool, timelines, hours, workday):
+    """Earliest (start, timeline) in a pool for a job of `hours`; None if it fits nowhere
+
+    Heap entries whose key is no longer their technician's cursor are stale
+    (a fresher entry was pushed when the cursor moved) and are dropped.
+    """
+    best, popped = None, {}
+    while pool and (best is None or pool[0][0] < best[0]):
+        key, technician_id = heapq.heappop(pool)
+        timeline = timelines[technician_id]
+        if key != timeline.cursor or technician_id in popped:
+            continue
+        popped[technician_id] = timeline
+        start = timeline.fit(hours, workday)
+        if start is not None and (best is None or start < best[0]):
+            best = (start, timeline)
+    for timeline in popped.values():
+        if timeline.cursor < timeline.window_end:
+            heapq.heappush(pool, (timeline.cursor, timeline.id))
+    return best
+
+
+# ==================== PLANNING ====================
+def _pending_requests(params):
+    statement = select(
+        MaintenanceRequest.id, MaintenanceRequest.reference, MaintenanceRequest.name,
+        MaintenanceRequest.team_id, MaintenanceRequest.priority, MaintenanceRequest.deadline,
+        MaintenanceRequest.duration_hours, MaintenanceRequest.created_at,
+        Equipment.default_team_id
+    ).outerjoin(Equipment, Equipment.id == MaintenanceRequest.equipment_id).where(
+        MaintenanceRequest.is_open.is_(True),
+        MaintenanceRequest.request_type == 'preventive',
+        MaintenanceRequest.scheduled_date.is_(None)
+    )
+    if params.get('request_ids') is not None:
+        statement = statement.where(MaintenanceRequest.id.in_(params['request_ids']))
+    rows = db.session.execute(statement).all()
+    if params.get('team_id'):
+        rows = [r for r in rows if (r.team_id or r.default_team_id) == params['team_id']]
+    return sorted(rows, key=lambda r: (
+        r.deadline is None, r.deadline or datetime.max, PRIORITY_RANK.get(r.priority, 2),
+        r.created_at or datetime.max, r.id
+    ))
+
+
+def plan_schedule(params, now=None):
+    """Dry-run plan for the pending preventive requests in params' window"""
+    config = current_app.config
+    default_hours = config.get('SCHEDULER_DEFAULT_DURATION_HOURS', 2.0)
+    window_start = max(params['start'], now or datetime.utcnow())
+    workday = _Workday(
+        config.get('SCHEDULER_DAY_START_HOUR', 8),
+        config.get('SCHEDULER_DAY_HOURS', 8),
+        set(config.get('SCHEDULER_WORKDAYS', (0, 1, 2, 3, 4))),
+        window_start,
+        params['end']
+    )
+
+    technicians = db.session.execute(
+        select(Technician.id, Technician.name, Technician.team_id).where(
+            Technician.is_active.is_(True),
+            Technician.availability_status != 'off_duty'
+        ).order_by(Technician.id)
+    ).all()
+    timelines = {row.id: _Timeline(row, window_start, params['end']) for row in technicians}
+    team_names = dict(db.session.query(MaintenanceTeam.id, MaintenanceTeam.name))
+
+    # Requests already booked in the window keep their slots
+    booked = db.session.execute(
+        select(MaintenanceRequest.technician_id, MaintenanceRequest.team_id,
+               MaintenanceRequest.scheduled_date, MaintenanceRequest.duration_hours).where(
+            MaintenanceRequest.is_open.is_(True),
+            MaintenanceRequest.scheduled_date < params['end'],
+            MaintenanceRequest.scheduled_date >= window_start - timedelta(days=1)
+        )
+    ).all()
+    by_team = {}
+    for timeline in timelines.values():
+        by_team.setdefault(timeline.team_id, []).append(timeline)
+    reserved, unassigned = {}, []
+    for row in booked:
+        interval = (row.scheduled_date,
+                    row.scheduled_date + timedelta(hours=float(row.duration_hours or default_hours)))
+        if row.technician_id in timelines:
+            reserved.setdefault(row.technician_id, []).append(interval)
+        elif row.technician_id is None and row.team_id in by_team:
+            unassigned.append((row.team_id, interval))
+    for technician_id, intervals in reserved.items():
+        timelines[technician_id].reserve(intervals)
+    for team_id, (start, end) in sorted(unassigned, key=lambda u: u[1]):
+        for timeline in by_team[team_id]:
+            if timeline.is_free(start, end):
+                timeline.book(start, end)
+                break
+    for timeline in timelines.values():
+        timeline.reserved_hours = timeline.hours_between(window_start, params['end'])
+        timeline.advance(workday)
+
+    # One pool per team plus one of everybody (for requests without a team)
+    pools = {team_id: [(t.cursor, t.id) for t in members] for team_id, members in by_team.items() if team_id}
+    pools[None] = [(t.cursor, t.id) for t in timelines.values()]
+    for pool in pools.values():
+        heapq.heapify(pool)
+
+    scheduled, unscheduled = [], []
+    for req in _pending_requests(params):
+        team_id = req.team_id or req.default_team_id
+        pool = pools.get(team_id)
+        if not pool and team_id is not None:
+            unscheduled.append({'request_id': req.id, 'reference': req.reference, 'name': req.name,
+                                'reason': 'No available technicians in the team'})
+            continue
+        hours = float(req.duration_hours or default_hours)
+        if hours > workday.hours:
+            unscheduled.append({'request_id': req.id, 'reference': req.reference, 'name': req.name,
+                                'reason': f'Longer than a working day ({workday.hours:g} hours)'})
+            continue
+        found = _place(pool, timelines, hours, workday)
+        if found is None:
+            unscheduled.append({'request_id': req.id, 'reference': req.reference, 'name': req.name,
+                                'reason': 'No free slot in the planning window'})
+            continue
+
+        start, timeline = found
+        end = start + timedelta(hours=hours)
+        timeline.book(start, end)
+        timeline.planned_hours += hours
+        if timeline.advance(workday) and timeline.cursor < params['end']:
+            for member_of in {timeline.team_id, None} & pools.keys():
+                heapq.heappush(pools[member_of], (timeline.cursor, timeline.id))
+        scheduled.append({
+            'request_id': req.id,
+            'reference': req.reference,
+            'name': req.name,
+            'team_id': team_id or timeline.team_id,
+            'team_name': team_names.get(team_id or timeline.team_id),
+            'technician_id': timeline.id,
+            'technician_name': timeline.name,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'duration_hours': hours,
+            'deadline': req.deadline.isoformat() if req.deadline else None,
+            'late': bool(req.deadline and end > req.deadline)
+        })
+
+    capacity = workday.capacity_hours(window_start)
+    return {
+        'start': params['start'].date().isoformat(),
+        'end': params['end'].date().isoformat(),
+        'summary': {
+            'requests': len(scheduled) + len(unscheduled),
+            'scheduled': len(scheduled),
+            'unscheduled': len(unscheduled),
+            'late': sum(1 for s in scheduled if s['late']),
+            'planned_hours': round(sum(s['duration_hours'] for s in scheduled), 2),
+            'technicians': len(timelines)
+        },
+        'scheduled': scheduled,
+        'unscheduled': unscheduled,
+        'technicians': [{
+            'technician_id': t.id,
+            'name': t.name,
+            'team_id': t.team_id,
+            'capacity_hours': round(capacity, 2),
+            'reserved_hours': round(t.reserved_hours, 2),
+            'planned_hours': round(t.planned_hours, 2),
+            'utilization': round((t.reserved_hours + t.planned_hours) / capacity, 3) if capacity else None
+        } for t in timelines.values()]
+    }
+
+
+def apply_schedule(plan):
+    """Write a plan's slots (scheduled_date, technician, team); returns the requests"""
+    slots = {s['request_id']: s for s in plan['scheduled']}
+    if not slots:
+        return []
+    requests = MaintenanceRequest.query.options(
+        selectinload(MaintenanceRequest.equipment),
+        selectinload(MaintenanceRequest.team),
+        selectinload(MaintenanceRequest.stage)
+    ).filter(MaintenanceRequest.id.in_(slots)).order_by(MaintenanceRequest.id).all()
+    before = {req.id: request_snapshot(req) for req in requests}
+    for req in requests:
+        slot = slots[req.id]
+        req.scheduled_date = datetime.fromisoformat(slot['start'])
+        req.technician_id = slot['technician_id']
+        req.team_id = slot['team_id']
+    emit_requests_written('schedule', requests, before)
+    return requests
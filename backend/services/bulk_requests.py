@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk Request Operations (weekly triage)
+
+A batch is a list of operations, each applying one value to a list of
+request ids: move_stage, assign_team, set_priority, set_deadline. The whole
+batch is validated first, then every operation becomes a single set-based
+UPDATE (plus one UPDATE for the scrap cascade to equipment) in the caller's
+transaction. Derived data is refreshed by one requests_written signal; the
+counter columns of the stages, teams and equipment the batch moved requests
+out of or into are recounted.
+"""
+from datetime import datetime
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.orm import selectinload
+from backend.models import db, Equipment, MaintenanceRequest, MaintenanceStage, MaintenanceTeam
+from backend.signals import emit_requests_written, emit_equipment_written, request_snapshot
+from backend.services.changes import next_change_seq
+from backend.services.counters import counted_parents, recount_parents
+
+BULK_OPERATIONS = ('move_stage', 'assign_team', 'set_priority', 'set_deadline')
+BULK_MAX_OPERATIONS = 50
+BULK_MAX_REQUESTS = 1000
+PRIORITIES = ('low', 'normal', 'high', 'urgent')
+
+# Permission each operation needs (moves to done/scrap stages also need
+# can_complete_requests)
+OPERATION_PERMISSIONS = {
+    'move_stage': None,
+    'assign_team': 'can_assign_requests',
+    'set_priority': 'can_manage_requests',
+    'set_deadline': 'can_manage_requests'
+}
+
+
+class BulkError(ValueError):
+    """Invalid batch; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_operations(data):
+    """Validate a batch and resolve its stages/teams (no writes)
+
+    Returns a list of dicts: op, ids, value and, for moves, the stage.
+    """
+    operations = (data or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        raise BulkError('operations must be a non-empty list')
+    if len(operations) > BULK_MAX_OPERATIONS:
+        raise BulkError(f'At most {BULK_MAX_OPERATIONS} operations per batch')
+
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BULK_OPERATIONS:
+            raise BulkError(f'operations[{index}]: op must be one of {", ".join(BULK_OPERATIONS)}')
+        ids = operation.get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            raise BulkError(f'operations[{index}]: ids must be a non-empty list of request ids')
+        parsed.append({'op': operation['op'], 'ids': sorted(set(ids)), 'value': operation.get('value')})
+
+    all_ids = {i for operation in parsed for i in operation['ids']}
+    if len(all_ids) > BULK_MAX_REQUESTS:
+        raise BulkError(f'At most {BULK_MAX_REQUESTS} requests per batch')
+    found = {i for i, in db.session.query(MaintenanceRequest.id).filter(MaintenanceRequest.id.in_(all_ids))}
+    if found != all_ids:
+        raise BulkError(f'Requests not found: {sorted(all_ids - found)}', 404)
+
+    stages = {s.id: s for s in MaintenanceStage.query.all()}
+    team_ids = {t for t, in db.session.query(MaintenanceTeam.id)}
+    for index, operation in enumerate(parsed):
+        value = operation['value']
+        if operation['op'] == 'move_stage':
+            if value not in stages:
+                raise BulkError(f'operations[{index}]: unknown stage {value}')
+            operation['stage'] = stages[value]
+        elif operation['op'] == 'assign_team':
+            if value is not None and value not in team_ids:
+                raise BulkError(f'operations[{index}]: unknown team {value}')
+        elif operation['op'] == 'set_priority':
+            if value not in PRIORITIES:
+                raise BulkError(f'operations[{index}]: priority must be one of {", ".join(PRIORITIES)}')
+        elif value is not None:
+            try:
+                operation['value'] = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise BulkError(f'operations[{index}]: deadline must be an ISO datetime or null')
+    return parsed
+
+
+def required_permissions(operations):
+    """Every permission the batch needs, checked once by the caller"""
+    needed = {OPERATION_PERMISSIONS[o['op']] for o in operations} - {None}
+    if any(o['op'] == 'move_stage' and (o['stage'].is_done or o['stage'].is_scrap) for o in operations):
+        needed.add('can_complete_requests')
+    return needed
+
+
+def _load(ids):
+    """Requests with everything snapshots and to_dict() touch, in a few queries"""
+    return MaintenanceRequest.query.options(
+        selectinload(MaintenanceRequest.equipment),
+        selectinload(MaintenanceRequest.team),
+        selectinload(MaintenanceRequest.stage)
+    ).filter(MaintenanceRequest.id.in_(ids)).order_by(MaintenanceRequest.id).populate_existing().all()
+
+
+def apply_bulk_operations(operations):
+    """Apply a parsed batch; returns (requests, audit entries)
+
+    Audit entries are (action, entity_type, entity_id, description) tuples
+    for the caller to write in one batch.
+    """
+    all_ids = sorted({i for operation in operations for i in operation['ids']})
+    current = {req.id: req for req in _load(all_ids)}
+    before = {req.id: request_snapshot(req) for req in current.values()}
+    stages = {s.id: s for s in MaintenanceStage.query.all()}
+    team_names = dict(db.session.query(MaintenanceTeam.id, MaintenanceTeam.name))
+    references = {req.id: req.reference for req in current.values()}
+    stage_of = {req.id: req.stage_id for req in current.values()}
+    moves = any(operation['op'] in ('move_stage', 'assign_team') for operation in operations)
+    counted_before = counted_parents(MaintenanceRequest, MaintenanceRequest.id.in_(all_ids)) if moves else {}
+
+    now = datetime.utcnow()
+    seq = next_change_seq(db.session)
+    audit, scrap_ids = [], set()
+
+    for operation in operations:
+        ids, value = operation['ids'], operation['value']
+        values = {'change_seq': seq}
+        if operation['op'] == 'move_stage':
+            stage = operation['stage']
+            values['stage_id'] = stage.id
+            values['is_open'] = stage.is_open
+            if stage.is_done:
+                values['completed_date'] = func.coalesce(MaintenanceRequest.completed_date, now)
+            if stage.is_scrap:
+                scrap_ids.update(ids)
+            for i in ids:
+                audit.append(('update', 'request', i, f'Moved {references[i]} from '
+                              f'{stages[stage_of[i]].name if stage_of[i] in stages else "None"} to {stage.name}'))
+                stage_of[i] = stage.id
+        elif operation['op'] == 'assign_team':
+            values['team_id'] = value
+            audit.extend(('update', 'request', i, f'Assigned {references[i]} to '
+                          f'{team_names.get(value, "Unassigned")}') for i in ids)
+        elif operation['op'] == 'set_priority':
+            values['priority'] = value
+            audit.extend(('update', 'request', i, f'Set priority of {references[i]} to {value}')
+                         for i in ids)
+        else:
+            values['deadline'] = value
+            label = value.isoformat() if value else 'none'
+            audit.extend(('update', 'request', i, f'Set deadline of {references[i]} to {label}')
+                         for i in ids)
+
+        db.session.execute(
+            update(MaintenanceRequest).where(MaintenanceRequest.id.in_(ids)).values(**values),
+            execution_options={'synchronize_session': False}
+        )
+
+    if moves:
+        recount_parents(counted_before, counted_parents(MaintenanceRequest, MaintenanceRequest.id.in_(all_ids)))
+
+    # SCRAP LOGIC: requests that ended in a scrap stage take their equipment with them
+    # (unless a later operation in the batch moved them on again)
+    scrap_ids = sorted(i for i in scrap_ids if stages[stage_of[i]].is_scrap)
+    scrapped = _scrap_equipment(scrap_ids, seq, now) if scrap_ids else []
+    for equipment in scrapped:
+        audit.append(('scrap', 'equipment', equipment.id,
+                      f'Equipment {equipment.code} scrapped via bulk update'))
+
+    requests = _load(all_ids)
+    if scrapped:
+        emit_equipment_written('scrap', scrapped)
+    emit_requests_written('bulk', requests, before)
+    return requests, audit
+
+
+def _scrap_equipment(request_ids, seq, now):
+    """One UPDATE marking the equipment of scrapped requests; returns it"""
+    scrapping = MaintenanceRequest.__table__.alias('scrapping')
+    reason = select(
+        literal('Equipment scrapped via maintenance request ') + scrapping.c.reference +
+        literal('. Original request: ') + scrapping.c.name
+    ).where(
+        scrapping.c.equipment_id == Equipment.id,
+        scrapping.c.id.in_(request_ids)
+    ).order_by(scrapping.c.id).limit(1).scalar_subquery()
+
+    equipment_ids = select(MaintenanceRequest.equipment_id).where(
+        MaintenanceRequest.id.in_(request_ids),
+        MaintenanceRequest.equipment_id.isnot(None)
+    )
+    db.session.execute(
+        update(Equipment).where(Equipment.id.in_(equipment_ids)).values(
+            status='scrapped',
+            is_scrapped=True,
+            scrap_date=now.date(),
+            scrap_reason=reason,
+            change_seq=seq
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    return Equipment.query.filter(Equipment.id.in_(equipment_ids)).populate_existing().all()
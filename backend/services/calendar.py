@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Calendar Queries
+
+Events come from one SELECT over the scheduled_date index with equipment,
+team and stage joined in, projected to the few fields the calendar shows;
+overdue is computed from the is_open flag instead of loading each stage.
+Zoomed-out ranges (a busy month, a year) return per-day counts from a
+GROUP BY instead of individual events. Upcoming occurrences of preventive
+schedules that have no request yet are expanded for the range and merged
+in as virtual events (see services/schedules.py).
+"""
+from datetime import datetime
+from sqlalchemy import and_, case, false, func, select
+from backend.models import db, Equipment, MaintenanceTeam, MaintenanceStage, MaintenanceRequest
+from backend.services.schedules import expand_schedules, schedule_day_counts
+
+CALENDAR_MODES = ('auto', 'events', 'counts')
+CALENDAR_EVENT_RANGE_DAYS = 62    # auto: wider ranges are answered with day counts
+CALENDAR_MAX_EVENTS = 500         # auto: so are ranges holding more events than this
+CALENDAR_MAX_RANGE_DAYS = 731
+DEFAULT_EVENT_COLOR = '#6c757d'
+
+
+def _in_range(statement, start, end, team_id=None, end_inclusive=False):
+    """Requests scheduled in [start, end) (or [start, end] when end_inclusive)"""
+    statement = statement.where(MaintenanceRequest.scheduled_date.isnot(None))
+    if start:
+        statement = statement.where(MaintenanceRequest.scheduled_date >= start)
+    if end:
+        statement = statement.where(
+            MaintenanceRequest.scheduled_date <= end if end_inclusive else MaintenanceRequest.scheduled_date < end
+        )
+    if team_id:
+        statement = statement.where(MaintenanceRequest.team_id == team_id)
+    return statement
+
+
+def _overdue(now):
+    return and_(MaintenanceRequest.is_open, MaintenanceRequest.deadline < now)
+
+
+def calendar_rows(start, end, team_id=None, end_inclusive=False, limit=None):
+    """Scheduled requests with their lookups joined in, in date order"""
+    now = datetime.utcnow()
+    statement = _in_range(select(
+        MaintenanceRequest.id,
+        MaintenanceRequest.reference,
+        MaintenanceRequest.name,
+        MaintenanceRequest.scheduled_date,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.request_type,
+        MaintenanceRequest.stage_id,
+        MaintenanceRequest.requester_name,
+        MaintenanceRequest.duration_hours,
+        func.coalesce(_overdue(now), false()).label('is_overdue'),
+        MaintenanceStage.color.label('stage_color'),
+        Equipment.name.label('equipment_name'),
+        MaintenanceTeam.name.label('team_name')
+    ).outerjoin(
+        MaintenanceStage, MaintenanceStage.id == MaintenanceRequest.stage_id
+    ).outerjoin(
+        Equipment, Equipment.id == MaintenanceRequest.equipment_id
+    ).outerjoin(
+        MaintenanceTeam, MaintenanceTeam.id == MaintenanceRequest.team_id
+    ), start, end, team_id, end_inclusive).order_by(MaintenanceRequest.scheduled_date, MaintenanceRequest.id)
+    if limit:
+        statement = statement.limit(limit)
+    return db.session.execute(statement).all()
+
+
+def event_dict(row):
+    """Compact event projection"""
+    return {
+        'id': row.id,
+        'reference': row.reference,
+        'name': row.name,
+        'start': row.scheduled_date.isoformat(),
+        'priority': row.priority,
+        'request_type': row.request_type,
+        'stage_id': row.stage_id,
+        'color': row.stage_color or DEFAULT_EVENT_COLOR,
+        'equipment_name': row.equipment_name,
+        'team_name': row.team_name,
+        'requester_name': row.requester_name,
+        'duration_hours': row.duration_hours,
+        'is_overdue': bool(row.is_overdue),
+        'virtual': False
+    }
+
+
+def virtual_event_dict(occurrence):
+    """Event projection of a schedule occurrence that has no request yet"""
+    return {
+        'id': occurrence['id'],
+        'reference': None,
+        'name': occurrence['name'],
+        'start': occurrence['scheduled_date'].isoformat(),
+        'priority': occurrence['priority'],
+        'request_type': 'preventive',
+        'stage_id': None,
+        'color': DEFAULT_EVENT_COLOR,
+        'equipment_name': occurrence['equipment_name'],
+        'team_name': occurrence['team_name'],
+        'requester_name': None,
+        'duration_hours': occurrence['duration_hours'],
+        'is_overdue': False,
+        'virtual': True,
+        'schedule_id': occurrence['schedule_id']
+    }
+
+
+def day_counts(start, end, team_id=None, pending=None):
+    """Per-day totals in [start, end): count, overdue and count by priority
+
+    Pending schedule occurrences are counted in as well (`pending`, when
+    already computed by schedule_day_counts).
+    """
+    now = datetime.utcnow()
+    day = func.date(MaintenanceRequest.scheduled_date).label('day')
+    rows = db.session.execute(_in_range(select(
+        day,
+        MaintenanceRequest.priority,
+        func.count(MaintenanceRequest.id).label('count'),
+        func.sum(case((_overdue(now), 1), else_=0)).label('overdue')
+    ), start, end, team_id).group_by(day, MaintenanceRequest.priority).order_by(day)).all()
+
+    days = {}
+    for row in rows:
+        key = row.day if isinstance(row.day, str) else row.day.isoformat()
+        entry = days.setdefault(key, {'date': key, 'count': 0, 'overdue': 0, 'priorities': {}})
+        entry['count'] += row.count
+        entry['overdue'] += int(row.overdue or 0)
+        entry['priorities'][row.priority or 'normal'] = row.count
+    if pending is None:
+        pending = schedule_day_counts(start, end, team_id)
+    for (date, priority), count in pending.items():
+        key = date.isoformat()
+        entry = days.setdefault(key, {'date': key, 'count': 0, 'overdue': 0, 'priorities': {}})
+        entry['count'] += count
+        entry['priorities'][priority] = entry['priorities'].get(priority, 0) + count
+    return sorted(days.values(), key=lambda d: d['date'])
+
+
+def calendar_range(start, end, mode='auto', team_id=None):
+    """Events or per-day counts scheduled in [start, end)
+
+    mode 'auto' returns events for short, quiet ranges and counts otherwise;
+    the response's `mode` says which one was chosen.
+    """
+    if mode == 'auto' and (end - start).days > CALENDAR_EVENT_RANGE_DAYS:
+        mode = 'counts'
+
+    pending = None
+    if mode != 'counts':
+        rows = calendar_rows(start, end, team_id, limit=CALENDAR_MAX_EVENTS + 1 if mode == 'auto' else None)
+        # Counting pending occurrences is cheap; only build them when they are returned
+        pending = schedule_day_counts(start, end, team_id) if mode == 'auto' else None
+        if mode == 'events' or len(rows) + sum(pending.values()) <= CALENDAR_MAX_EVENTS:
+            virtual = expand_schedules(start, end, team_id)
+            events = [event_dict(row) for row in rows] + [virtual_event_dict(o) for o in virtual]
+            events.sort(key=lambda e: e['start'])
+            return {
+                'mode': 'events',
+                'start': start.date().isoformat(),
+                'end': end.date().isoformat(),
+                'total': len(events),
+                'events': events
+            }
+
+    days = day_counts(start, end, team_id, pending)
+    return {
+        'mode': 'counts',
+        'start': start.date().isoformat(),
+        'end': end.date().isoformat(),
+        'total': sum(d['count'] for d in days),
+        'days': days
+    }
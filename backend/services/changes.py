@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental Change Feed (delta sync)
+
+Every flush that inserts, updates or deletes a request, equipment, technician
+or team takes the next value of the global change_sequence counter and
+stamps it on the written rows (change_seq, indexed) or on a tombstone for
+deleted rows. Team member edits re-stamp their team, shift edits their
+technician. A client keeps the opaque token of its last sync and asks for
+rows with a larger sequence number; the counter row stays locked until
+commit, so a row can never become visible with a number below a token
+already handed out.
+
+A full snapshot is paged by id, feed after feed. Its tokens carry the
+counter value the snapshot started at and the last row sent, so rows
+written while a client pages through it arrive in the deltas that follow.
+
+Denormalized counter columns (services/counters.py) change without a new
+sequence number, so rows are shipped without them; clients count the
+synced rows instead.
+"""
+import base64
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event as sa_event, inspect, select, update
+from sqlalchemy.orm import Session
+from backend.models import (db, Equipment, MaintenanceTeam, TeamMember, MaintenanceRequest,
+                            Technician, TechnicianShift, ChangeSequence, ChangeTombstone)
+from backend.services.counters import COUNTERS
+
+CHANGE_FEEDS = {
+    'requests': MaintenanceRequest,
+    'equipment': Equipment,
+    'technicians': Technician,
+    'teams': MaintenanceTeam
+}
+_FEED_OF = {model: name for name, model in CHANGE_FEEDS.items()}
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
+TOKEN_PREFIX = 'gg1:'
+
+# (model, column key) of counters, left out of feed rows
+_COUNTER_COLUMNS = {(counter.parent, counter.column.key) for counter in COUNTERS.values()}
+
+
+# ==================== SEQUENCE ====================
+def next_change_seq(session):
+    """Bump the counter and return the new value (holds its row lock until commit)"""
+    table = ChangeSequence.__table__
+    conn = session.connection()
+    bumped = conn.execute(update(table).where(table.c.id == 1).values(value=table.c.value + 1))
+    if bumped.rowcount == 0:
+        conn.execute(table.insert().values(id=1, value=1, reset_seq=0))
+    return conn.execute(select(table.c.value).where(table.c.id == 1)).scalar()
+
+
+def change_counter():
+    """(value, reset_seq) of the change counter"""
+    row = db.session.execute(
+        select(ChangeSequence.value, ChangeSequence.reset_seq).where(ChangeSequence.id == 1)
+    ).first()
+    return (row.value, row.reset_seq) if row else (0, 0)
+
+
+def reset_change_feed():
+    """Force every client to resync from scratch (after bulk deletes or re-seeding)"""
+    value = next_change_seq(db.session)
+    db.session.execute(update(ChangeSequence).where(ChangeSequence.id == 1).values(reset_seq=value))
+
+
+@sa_event.listens_for(Session, 'before_flush')
+def _stamp_changes(session, flush_context, instances):
+    """Stamp change_seq on written feed rows and record tombstones for deletes"""
+    changed, deleted, team_ids, technician_ids = [], [], set(), set()
+
+    for obj in session.new:
+        if type(obj) in _FEED_OF:
+            changed.append(obj)
+        elif isinstance(obj, TeamMember):
+            team_ids.add(obj.team_id)
+        elif isinstance(obj, TechnicianShift):
+            technician_ids.add(obj.technician_id)
+    for obj in session.dirty:
+        if type(obj) in _FEED_OF:
+            if session.is_modified(obj, include_collections=False):
+                changed.append(obj)
+        elif isinstance(obj, TeamMember) and session.is_modified(obj, include_collections=False):
+            history = inspect(obj).attrs.team_id.history
+            team_ids.update(history.added or (obj.team_id,))
+            team_ids.update(history.deleted or ())
+        elif isinstance(obj, TechnicianShift) and session.is_modified(obj, include_collections=False):
+            history = inspect(obj).attrs.technician_id.history
+            technician_ids.update(history.added or (obj.technician_id,))
+            technician_ids.update(history.deleted or ())
+    for obj in session.deleted:
+        if type(obj) in _FEED_OF:
+            deleted.append(obj)
+        elif isinstance(obj, TeamMember):
+            team_ids.add(obj.team_id)
+        elif isinstance(obj, TechnicianShift):
+            technician_ids.add(obj.technician_id)
+
+    team_ids.discard(None)
+    technician_ids.discard(None)
+    if not (changed or deleted or team_ids or technician_ids):
+        return
+
+    seq = next_change_seq(session)
+    for obj in changed:
+        obj.change_seq = seq
+    with session.no_autoflush:
+        for model, ids in ((MaintenanceTeam, team_ids), (Technician, technician_ids)):
+            for obj_id in ids:
+                obj = session.get(model, obj_id)
+                if obj is not None and obj not in session.deleted:
+                    obj.change_seq = seq
+    for obj in deleted:
+        session.add(ChangeTombstone(entity=_FEED_OF[type(obj)], entity_id=obj.id, change_seq=seq))
+
+
+# ==================== TOKENS ====================
+def encode_token(seq, cursor=None):
+    """Token for sequence number `seq`; `cursor` is (feed, last id) inside a snapshot"""
+    raw = f'{TOKEN_PREFIX}{seq}' if cursor is None else f'{TOKEN_PREFIX}{seq}:{cursor[0]}:{cursor[1]}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """(sequence number, snapshot cursor or None) inside a token
+
+    Raises ValueError if it is not one of ours.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid change token')
+    parts = raw[len(TOKEN_PREFIX):].split(':') if raw.startswith(TOKEN_PREFIX) else []
+    if len(parts) not in (1, 3) or not parts[0].isdigit():
+        raise ValueError('Invalid change token')
+    if len(parts) == 1:
+        return int(parts[0]), None
+    if parts[1] not in CHANGE_FEEDS or not parts[2].isdigit():
+        raise ValueError('Invalid change token')
+    return int(parts[0]), (parts[1], int(parts[2]))
+
+
+# ==================== FEED ====================
+def _row_dict(obj):
+    """Column values only: clients join ids locally, so renames never go stale"""
+    data = {}
+    mapper = inspect(obj).mapper
+    for attr in mapper.column_attrs:
+        if (mapper.class_, attr.key) in _COUNTER_COLUMNS:
+            continue
+        value = getattr(obj, attr.key)
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = float(value)
+        data[attr.key] = value
+    return data
+
+
+def _serialize(name, rows):
+    items = [_row_dict(row) for row in rows]
+    if name == 'teams' and items:
+        members = {}
+        for member in TeamMember.query.filter(TeamMember.team_id.in_([t['id'] for t in items])) \
+                .order_by(TeamMember.id):
+            members.setdefault(member.team_id, []).append(_row_dict(member))
+        for item in items:
+            item['members'] = members.get(item['id'], [])
+    return items
+
+
+def _cutoff(since, upto, limit):
+    """Highest sequence number that keeps a page near `limit` rows"""
+    seqs = []
+    for model in CHANGE_FEEDS.values():
+        seqs.extend(s for s, in db.session.query(model.change_seq).filter(
+            model.change_seq > since, model.change_seq <= upto
+        ).order_by(model.change_seq).limit(limit + 1))
+    seqs.extend(s for s, in db.session.query(ChangeTombstone.change_seq).filter(
+        ChangeTombstone.change_seq > since, ChangeTombstone.change_seq <= upto
+    ).order_by(ChangeTombstone.change_seq).limit(limit + 1))
+    if len(seqs) <= limit:
+        return upto
+    seqs.sort()
+    # Rows sharing the cutoff number were written together and ship together
+    return seqs[limit - 1]
+
+
+def _snapshot_page(cursor, limit):
+    """Up to `limit` rows after `cursor` in (feed, id) order, and the cursor
+    to continue from (None once every feed is sent)"""
+    names = list(CHANGE_FEEDS)
+    feed, last_id = cursor or (names[0], 0)
+    changes = {name: [] for name in CHANGE_FEEDS}
+    remaining = limit
+    for name in names[names.index(feed):]:
+        if not remaining:
+            return changes, (name, last_id)
+        model = CHANGE_FEEDS[name]
+        rows = model.query.filter(model.id > last_id).order_by(model.id).limit(remaining + 1).all()
+        if len(rows) > remaining:
+            changes[name] = _serialize(name, rows[:remaining])
+            return changes, (name, rows[remaining - 1].id)
+        changes[name] = _serialize(name, rows)
+        remaining -= len(rows)
+        last_id = 0
+    return changes, None
+
+
+def changes_since(token=None, limit=CHANGES_PAGE_SIZE):
+    """Rows written and deleted after `token`, or a page of a full snapshot
+
+    A full snapshot starts without a token, for tokens older than the last
+    reset/prune, and for tokens ahead of the counter (a restored or
+    recreated database); its first page has full=true. Raises ValueError
+    for malformed tokens.
+    """
+    value, reset_seq = change_counter()
+    since, cursor = decode_token(token) if token else (None, None)
+    full = since is None or since < reset_seq or since > value
+
+    changes, deleted = {}, {name: [] for name in CHANGE_FEEDS}
+    if full or cursor:
+        # Rows written after the snapshot started follow as deltas from `upto`
+        upto = value if full else since
+        changes, cursor = _snapshot_page(None if full else cursor, limit)
+    else:
+        upto = _cutoff(since, value, limit)
+        for name, model in CHANGE_FEEDS.items():
+            changes[name] = _serialize(name, model.query.filter(
+                model.change_seq > since, model.change_seq <= upto
+            ).order_by(model.change_seq, model.id))
+        for tombstone in ChangeTombstone.query.filter(
+            ChangeTombstone.change_seq > since, ChangeTombstone.change_seq <= upto
+        ).order_by(ChangeTombstone.change_seq):
+            deleted[tombstone.entity].append(tombstone.entity_id)
+
+    return {
+        'token': encode_token(upto, cursor),
+        'full': full,
+        'has_more': cursor is not None or upto < value,
+        'changes': changes,
+        'deleted': deleted
+    }
+
+
+def prune_tombstones(max_age_days=30):
+    """Delete old tombstones; clients synced before them get a full snapshot"""
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    newest_pruned = db.session.query(db.func.max(ChangeTombstone.change_seq)).filter(
+        ChangeTombstone.deleted_at < cutoff).scalar()
+    if newest_pruned is None:
+        return 0
+    deleted = ChangeTombstone.query.filter(ChangeTombstone.change_seq <= newest_pruned) \
+        .delete(synchronize_session=False)
+    counter = db.session.get(ChangeSequence, 1)
+    counter.reset_seq = max(counter.reset_seq, newest_pruned)
+    db.session.commit()
+    return deleted
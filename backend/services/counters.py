@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Denormalized Counters
+
+Counts that serializers used to take with .count() on dynamic relationships
+are stored on the parent row (COUNTERS): equipment per category, requests
+per stage, members and open requests per team, requests and open requests
+per equipment.
+
+ORM writes keep them current: before_flush reads the current parents of
+changed and deleted children from the database, after_flush compares them
+with the flushed values and applies the difference as increments
+(SET n = n + k), so concurrent writers never overwrite each other's counts.
+Set-based writers (bulk operations, stage flag edits) collect the parents
+they touch with counted_parents() and recount them. Counter updates do not
+re-stamp change_seq, so the /api/changes feed leaves these columns out.
+
+recount() recomputes every counter from the child rows; verify_counters()
+compares a random sample with fresh COUNTs and reports drift
+(`flask --app app counters recount|verify`).
+"""
+from sqlalchemy import event as sa_event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from backend.models import db, Equipment, EquipmentCategory, MaintenanceRequest, MaintenanceStage, MaintenanceTeam, \
+    TeamMember
+
+
+class Counter:
+    """parent.<column> = children whose foreign key points at the parent (open ones only if open_only)"""
+
+    def __init__(self, column, foreign_key, open_only=False):
+        self.column = column
+        self.foreign_key = foreign_key
+        self.open_only = open_only
+        self.parent = column.class_
+        self.child = foreign_key.class_
+
+    def counted(self):
+        """Correlated COUNT of the parent row's children"""
+        statement = select(func.count()).select_from(self.child).where(self.foreign_key == self.parent.id)
+        if self.open_only:
+            statement = statement.where(self.child.is_open.is_(True))
+        return statement.correlate(self.parent).scalar_subquery()
+
+    def parent_of(self, values):
+        """Parent id a child with these column values counts towards (None when it does not count)"""
+        if self.open_only and not values.get('is_open'):
+            return None
+        return values.get(self.foreign_key.key)
+
+
+COUNTERS = {
+    'equipment_category.equipment_count': Counter(EquipmentCategory.equipment_count, Equipment.category_id),
+    'maintenance_stage.request_count': Counter(MaintenanceStage.request_count, MaintenanceRequest.stage_id),
+    'maintenance_team.member_count': Counter(MaintenanceTeam.member_count, TeamMember.team_id),
+    'maintenance_team.open_requests_count': Counter(MaintenanceTeam.open_requests_count, MaintenanceRequest.team_id,
+                                                    open_only=True),
+    'equipment.request_count': Counter(Equipment.request_count, MaintenanceRequest.equipment_id),
+    'equipment.open_request_count': Counter(Equipment.open_request_count, MaintenanceRequest.equipment_id,
+                                            open_only=True)
+}
+
+_watched = None
+
+
+def _watched_attributes():
+    """{child model: (columns the counters read, attributes whose change can move a child)}
+
+    Relationships are watched next to their foreign keys (the key is only
+    synced during the flush), and a request's stage next to is_open (the
+    open-state hook may run after this one).
+    """
+    global _watched
+    if _watched is None:
+        watched = {}
+        for counter in COUNTERS.values():
+            columns, attributes = watched.setdefault(counter.child, (set(), set()))
+            columns.add(counter.foreign_key.key)
+            if counter.open_only:
+                columns.add('is_open')
+                attributes.update(('stage', 'stage_id'))
+        for child, (columns, attributes) in watched.items():
+            attributes.update(columns)
+            for relationship in inspect(child).relationships:
+                if {c.key for c in relationship.local_columns} & columns:
+                    attributes.add(relationship.key)
+        _watched = {child: (sorted(columns), attributes) for child, (columns, attributes) in watched.items()}
+    return _watched
+
+
+# ==================== FLUSH HOOKS ====================
+@sa_event.listens_for(Session, 'before_flush')
+def _read_previous_parents(session, flush_context, instances):
+    """Load the stored counted columns of children about to change or go away"""
+    watched = _watched_attributes()
+    ids = {}
+    for obj in session.dirty:
+        if type(obj) in watched and obj not in session.deleted:
+            state = inspect(obj)
+            if state.identity and any(state.attrs[key].history.has_changes() for key in watched[type(obj)][1]):
+                ids.setdefault(type(obj), set()).add(state.identity[0])
+    for obj in session.deleted:
+        if type(obj) in watched:
+            ids.setdefault(type(obj), set()).add(inspect(obj).identity[0])
+
+    previous = session.info.setdefault('counted_previous', {})
+    with session.no_autoflush:
+        for child, child_ids in ids.items():
+            columns = [getattr(child, key) for key in watched[child][0]]
+            for row in session.execute(select(child.id, *columns).where(child.id.in_(child_ids))):
+                previous[(child, row.id)] = row._asdict()
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _apply_counter_deltas(session, flush_context):
+    """Increment and decrement parents by the children that moved in this flush"""
+    previous = session.info.pop('counted_previous', {})
+    watched = _watched_attributes()
+    deltas = {}
+
+    def move(child, old, new):
+        for name, counter in COUNTERS.items():
+            if counter.child is not child:
+                continue
+            old_parent = counter.parent_of(old) if old else None
+            new_parent = counter.parent_of(new) if new else None
+            if old_parent != new_parent:
+                if old_parent is not None:
+                    deltas[(name, old_parent)] = deltas.get((name, old_parent), 0) - 1
+                if new_parent is not None:
+                    deltas[(name, new_parent)] = deltas.get((name, new_parent), 0) + 1
+
+    with session.no_autoflush:
+        for obj in session.new:
+            if type(obj) in watched:
+                move(type(obj), None, {key: getattr(obj, key) for key in watched[type(obj)][0]})
+        for obj in session.dirty:
+            old = previous.get((type(obj), obj.id)) if type(obj) in watched else None
+            if old is not None and obj not in session.deleted:
+                move(type(obj), old, {key: getattr(obj, key) for key in watched[type(obj)][0]})
+        for obj in session.deleted:
+            if type(obj) in watched:
+                move(type(obj), previous.get((type(obj), obj.id)), None)
+
+    increments = {}
+    for (name, parent_id), delta in deltas.items():
+        if delta:
+            increments.setdefault((name, delta), []).append(parent_id)
+    stale = session.info.setdefault('counted_stale', {})
+    for (name, delta), parent_ids in increments.items():
+        counter = COUNTERS[name]
+        table = counter.parent.__table__
+        session.connection().execute(update(table).where(table.c.id.in_(parent_ids)).values(
+            {counter.column.key: table.c[counter.column.key] + delta}))
+        for parent_id in parent_ids:
+            stale.setdefault((counter.parent, parent_id), set()).add(counter.column.key)
+
+
+@sa_event.listens_for(Session, 'after_flush_postexec')
+def _expire_stale_counters(session, flush_context):
+    """Loaded parents reload the incremented columns on next access"""
+    for (model, parent_id), keys in session.info.pop('counted_stale', {}).items():
+        obj = session.identity_map.get(session.identity_key(model, parent_id))
+        if obj is not None:
+            session.expire(obj, list(keys))
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('counted_previous', None)
+    session.info.pop('counted_stale', None)
+
+
+# ==================== SET-BASED WRITES ====================
+def counted_parents(child, *criteria):
+    """{counter name: parent ids} currently counting the `child` rows matching `criteria`
+
+    Set-based writers call it before and after their UPDATE and pass both to
+    recount_parents().
+    """
+    parents = {}
+    for name, counter in COUNTERS.items():
+        if counter.child is child:
+            parents[name] = set(db.session.execute(select(counter.foreign_key).where(
+                *criteria, counter.foreign_key.isnot(None)).distinct()).scalars())
+    return parents
+
+
+def recount_parents(*parents):
+    """Recount the parents collected by counted_parents(); returns rows corrected"""
+    merged = {}
+    for found in parents:
+        for name, parent_ids in found.items():
+            merged.setdefault(name, set()).update(parent_ids)
+    return sum(recount([name], parent_ids).get(name, 0) for name, parent_ids in merged.items() if parent_ids)
+
+
+# ==================== MAINTENANCE ====================
+def recount(names=None, parent_ids=None):
+    """Recompute counters from the child rows; returns {name: rows corrected}
+
+    `names` defaults to every counter, `parent_ids` to every parent row.
+    Raises ValueError for an unknown counter name.
+    """
+    names = list(names or COUNTERS)
+    unknown = [name for name in names if name not in COUNTERS]
+    if unknown:
+        raise ValueError(f"Unknown counters: {', '.join(unknown)} (one of: {', '.join(COUNTERS)})")
+
+    corrected = {}
+    for name in names:
+        counter = COUNTERS[name]
+        statement = update(counter.parent).where(counter.column != counter.counted()).values(
+            {counter.column.key: counter.counted()})
+        if parent_ids is not None:
+            statement = statement.where(counter.parent.id.in_(list(parent_ids)))
+        corrected[name] = db.session.execute(
+            statement, execution_options={'synchronize_session': 'fetch'}).rowcount
+    return corrected
+
+
+def verify_counters(sample=200, names=None):
+    """Compare stored counters of up to `sample` random rows (every row when 0) with fresh COUNTs
+
+    Returns {name: {'checked': rows, 'drifted': [{'id', 'stored', 'actual'}]}}.
+    """
+    report = {}
+    for name in names or COUNTERS:
+        counter = COUNTERS[name]
+        ids = select(counter.parent.id)
+        if sample:
+            ids = ids.order_by(func.random()).limit(sample)
+        parent_ids = db.session.execute(ids).scalars().all()
+        rows = db.session.execute(select(
+            counter.parent.id, counter.column.label('stored'), counter.counted().label('actual')
+        ).where(counter.parent.id.in_(parent_ids)).order_by(counter.parent.id)).all() if parent_ids else []
+        report[name] = {
+            'checked': len(rows),
+            'drifted': [{'id': row.id, 'stored': row.stored, 'actual': row.actual}
+                        for row in rows if row.stored != row.actual]
+        }
+    return report
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Datetime Parsing
+
+Stored datetimes are naive UTC. API inputs may carry a UTC offset or a
+trailing Z; parse_datetime() converts those to naive UTC so they compare
+with stored values.
+"""
+from datetime import datetime, timezone
+
+
+def parse_datetime(value, field):
+    """Naive UTC datetime from an ISO date or datetime string
+
+    Raises ValueError with a user message.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        raise ValueError(f'{field} must be an ISO datetime')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Live Request Events (Server-Sent Events)
+
+Request writes append a RequestEvent row to the request_events outbox inside
+their own transaction. After the commit the event is handed straight to the
+streams of this process; every process also runs one poller thread (only
+while somebody is listening) that picks up events committed by other
+workers. Events are de-duplicated by id, and the poller looks back
+EVENT_LOOKBACK_SECONDS so rows committed out of id order are not missed.
+"""
+import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import has_request_context, request
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+from backend.models import db, MaintenanceStage, RequestEvent
+from backend.signals import requests_written
+from backend.services.kanban import request_card
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+REPLAY_LIMIT = 500
+
+
+class EventBroker:
+    """In-process fan-out of committed request events to stream subscribers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._seen = {}  # event id -> monotonic time it was published
+        self._poller = None
+
+    def publish(self, event):
+        """Deliver an event dict to every subscriber once"""
+        with self._lock:
+            if not self._subscribers or event['id'] in self._seen:
+                return
+            self._seen[event['id']] = time.monotonic()
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass  # a stalled client; it resyncs on reconnect
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def mark_seen(self, event_ids):
+        now = time.monotonic()
+        with self._lock:
+            for event_id in event_ids:
+                self._seen.setdefault(event_id, now)
+
+    def forget_older_than(self, seconds):
+        cutoff = time.monotonic() - seconds
+        with self._lock:
+            self._seen = {k: v for k, v in self._seen.items() if v >= cutoff}
+
+    @contextmanager
+    def subscribe(self, app):
+        """Register a queue receiving published events; starts the poller"""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            start_poller = self._poller is None or not self._poller.is_alive()
+            if start_poller:
+                self._poller = threading.Thread(target=self._poll, args=(app,),
+                                                name='request-events-poller', daemon=True)
+        if start_poller:
+            self._poller.start()
+        try:
+            yield subscriber
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def _poll(self, app):
+        """Publish events committed by other processes while anyone listens"""
+        interval = app.config.get('EVENT_POLL_INTERVAL', 1.0)
+        lookback = app.config.get('EVENT_LOOKBACK_SECONDS', 30)
+
+        with app.app_context():
+            # Events from before the first subscriber are not replayed
+            self.mark_seen(event_id for event_id, in db.session.query(RequestEvent.id).filter(
+                RequestEvent.created_at >= datetime.utcnow() - timedelta(seconds=lookback)))
+            db.session.remove()
+
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None
+                    return
+            try:
+                with app.app_context():
+                    recent = RequestEvent.query.filter(
+                        RequestEvent.created_at >= datetime.utcnow() - timedelta(seconds=lookback)
+                    ).order_by(RequestEvent.id).all()
+                    for row in recent:
+                        self.publish(row.to_dict())
+                    db.session.remove()
+                self.forget_older_than(lookback * 2)
+            except Exception:
+                app.logger.exception('Request event poller failed')
+
+
+event_broker = EventBroker()
+
+
+# ==================== OUTBOX WRITER ====================
+def _is_open(stage):
+    return stage is not None and not stage.is_done and not stage.is_scrap
+
+
+def _is_overdue(deadline, stage, now):
+    return bool(deadline and _is_open(stage) and deadline < now)
+
+
+@requests_written.connect
+def _record_request_events(app, action, requests, before, **extra):
+    """Append outbox rows for a request write (runs inside its transaction)"""
+    stages = {s.id: s for s in MaintenanceStage.query.all()}
+    origin = None
+    if has_request_context():
+        origin = request.headers.get('X-Client-Id', '')[:64] or None
+    now = datetime.utcnow()
+    rows = []
+
+    for req in requests:
+        previous = before.get(req.id)
+        stage = stages.get(req.stage_id)
+        previous_stage = stages.get(previous['stage_id']) if previous else None
+        rows.append(RequestEvent(
+            action=action,
+            request_id=req.id,
+            stage_id=req.stage_id,
+            previous_stage_id=previous['stage_id'] if previous else None,
+            origin=origin,
+            payload=json.dumps({
+                'card': request_card(req, stage),
+                'open': _is_open(stage),
+                'overdue': _is_overdue(req.deadline, stage, now),
+                'previous_open': _is_open(previous_stage),
+                'previous_overdue': _is_overdue(previous['deadline'], previous_stage, now)
+                if previous else False
+            })
+        ))
+
+    if action == 'delete':
+        for request_id, previous in before.items():
+            previous_stage = stages.get(previous['stage_id'])
+            rows.append(RequestEvent(
+                action=action,
+                request_id=request_id,
+                stage_id=None,
+                previous_stage_id=previous['stage_id'],
+                origin=origin,
+                payload=json.dumps({
+                    'card': None,
+                    'open': False,
+                    'overdue': False,
+                    'previous_open': _is_open(previous_stage),
+                    'previous_overdue': _is_overdue(previous['deadline'], previous_stage, now)
+                })
+            ))
+
+    if rows:
+        db.session.add_all(rows)
+        db.session.flush()
+        # Serialized now: the session cannot load expired rows after commit
+        db.session.info.setdefault('request_events', []).extend(row.to_dict() for row in rows)
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _publish_committed_events(session):
+    for event in session.info.pop('request_events', ()):
+        event_broker.publish(event)
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back_events(session):
+    session.info.pop('request_events', None)
+
+
+# ==================== STREAM HELPERS ====================
+def replay_events(after_id):
+    """Committed events after `after_id` (for reconnecting clients)"""
+    rows = RequestEvent.query.filter(RequestEvent.id > after_id) \
+        .order_by(RequestEvent.id).limit(REPLAY_LIMIT).all()
+    return [row.to_dict() for row in rows]
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: request\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+def prune_events(max_age_hours=24):
+    """Delete outbox rows older than max_age_hours; returns count"""
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    deleted = RequestEvent.query.filter(RequestEvent.created_at < cutoff).delete()
+    db.session.commit()
+    return deleted
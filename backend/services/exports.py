@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Background Report Exports
+
+POST /api/reports/exports records a ReportExport row and hands its id to a
+process pool. The worker streams rows from the database, writes the file to
+EXPORT_DIR and reports progress on the row. Files expire after
+EXPORT_TTL_HOURS and are purged by `flask exports cleanup` (and lazily by the
+API).
+
+XLSX output needs openpyxl and PDF output needs reportlab.
+"""
+import csv
+import json
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from flask import Flask, current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import aliased
+from backend.models import (db, Equipment, EquipmentCategory, MaintenanceTeam,
+                            MaintenanceRequest, ReportExport)
+from backend.services.facts import monthly_totals_between
+
+EXPORT_FORMATS = ('csv', 'xlsx', 'pdf')
+PROGRESS_EVERY = 500  # rows between progress commits
+EXPORT_PAGE_SIZE = 1000  # rows fetched per query while streaming
+
+
+# ==================== REPORT DEFINITIONS ====================
+def _year_bounds(params):
+    year = int(params['year'])
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def _maintenance_cost_rows(params):
+    """Completed requests of the year with their cost, streamed in chunks"""
+    start, end = _year_bounds(params)
+    category = aliased(EquipmentCategory)
+    query = db.session.query(
+        MaintenanceRequest.reference,
+        MaintenanceRequest.name,
+        Equipment.code,
+        category.name,
+        MaintenanceTeam.name,
+        MaintenanceRequest.request_type,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.request_date,
+        MaintenanceRequest.completed_date,
+        MaintenanceRequest.duration_hours,
+        MaintenanceRequest.maintenance_cost
+    ).outerjoin(
+        Equipment, Equipment.id == MaintenanceRequest.equipment_id
+    ).outerjoin(
+        category, category.id == Equipment.category_id
+    ).outerjoin(
+        MaintenanceTeam, MaintenanceTeam.id == MaintenanceRequest.team_id
+    ).filter(
+        MaintenanceRequest.completed_date >= datetime.combine(start, datetime.min.time()),
+        MaintenanceRequest.completed_date < datetime.combine(end, datetime.min.time())
+    ).order_by(MaintenanceRequest.completed_date, MaintenanceRequest.id)
+
+    total = query.order_by(None).count()
+
+    def rows():
+        # Keyset pages instead of one long cursor: no read transaction stays
+        # open across the progress commits (SQLite would lock up otherwise)
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                page = page.filter(or_(
+                    MaintenanceRequest.completed_date > last[0],
+                    and_(MaintenanceRequest.completed_date == last[0],
+                         MaintenanceRequest.id > last[1])
+                ))
+            batch = page.add_columns(MaintenanceRequest.id).limit(EXPORT_PAGE_SIZE).all()
+            db.session.commit()
+            for (reference, name, code, category_name, team_name, request_type, priority,
+                 request_date, completed_date, duration, cost, _) in batch:
+                yield [
+                    reference, name, code, category_name, team_name, request_type, priority,
+                    request_date.isoformat(sep=' ', timespec='minutes') if request_date else None,
+                    completed_date.isoformat(sep=' ', timespec='minutes') if completed_date else None,
+                    float(duration) if duration is not None else None,
+                    float(cost) if cost is not None else None
+                ]
+            if len(batch) < EXPORT_PAGE_SIZE:
+                return
+            last = (batch[-1][8], batch[-1][-1])
+    return total, rows()
+
+
+def _team_workload_rows(params):
+    """Monthly created/completed/overdue/cost/hours per team (from the rollup)"""
+    start, end = _year_bounds(params)
+    team_names = dict(db.session.query(MaintenanceTeam.id, MaintenanceTeam.name).all())
+    totals = monthly_totals_between(start, end, group_by='team_id')
+
+    def rows():
+        for bucket in totals:
+            yield [
+                bucket['month'].strftime('%Y-%m'),
+                team_names.get(bucket['team_id'], 'Unassigned'),
+                bucket['created'],
+                bucket['completed'],
+                bucket['overdue'],
+                round(bucket['duration'], 2),
+                round(bucket['cost'], 2)
+            ]
+    return len(totals), rows()
+
+
+EXPORT_REPORTS = {
+    'maintenance_costs': {
+        'title': 'Maintenance Costs',
+        'columns': ['Reference', 'Request', 'Equipment', 'Category', 'Team', 'Type',
+                    'Priority', 'Requested', 'Completed', 'Hours', 'Cost'],
+        'rows': _maintenance_cost_rows
+    },
+    'team_workload': {
+        'title': 'Team Workload',
+        'columns': ['Month', 'Team', 'Created', 'Completed', 'Overdue', 'Hours', 'Cost'],
+        'rows': _team_workload_rows
+    }
+}
+
+
+def validate_export(data):
+    """Return (report, format, params) or raise ValueError with a user message"""
+    report = data.get('report')
+    fmt = (data.get('format') or 'csv').lower()
+    if report not in EXPORT_REPORTS:
+        raise ValueError(f"Unknown report '{report}'. Choose one of: {', '.join(EXPORT_REPORTS)}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Choose one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        year = int(data.get('year') or datetime.utcnow().year)
+    except (TypeError, ValueError):
+        raise ValueError('year must be an integer')
+    if not 2000 <= year <= 2100:
+        raise ValueError('year is out of range')
+    if fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ValueError('XLSX export requires the openpyxl package')
+    if fmt == 'pdf':
+        try:
+            import reportlab  # noqa: F401
+        except ImportError:
+            raise ValueError('PDF export requires the reportlab package')
+    return report, fmt, {'year': year}
+
+
+# ==================== RENDERERS ====================
+def _write_csv(path, title, columns, rows, on_row):
+    with open(path, 'w', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            on_row()
+
+
+def _write_xlsx(path, title, columns, rows, on_row):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)  # streams rows to disk
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
+        on_row()
+    workbook.save(path)
+
+
+def _write_pdf(path, title, columns, rows, on_row):
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfgen import canvas
+
+    width, height = landscape(A4)
+    margin, line_height = 30, 13
+    col_width = (width - 2 * margin) / len(columns)
+    pdf = canvas.Canvas(path, pagesize=(width, height))
+
+    def header():
+        pdf.setFont('Helvetica-Bold', 12)
+        pdf.drawString(margin, height - margin, f'GearGuard - {title}')
+        pdf.setFont('Helvetica-Bold', 8)
+        for i, column in enumerate(columns):
+            pdf.drawString(margin + i * col_width, height - margin - 2 * line_height, column)
+        pdf.setFont('Helvetica', 8)
+        return height - margin - 3 * line_height
+
+    def fit(value):
+        text = '' if value is None else str(value)
+        max_chars = int(col_width / 4.2)
+        return text if len(text) <= max_chars else text[:max_chars - 1] + '…'
+
+    y = header()
+    for row in rows:
+        if y < margin:
+            pdf.showPage()
+            y = header()
+        for i, value in enumerate(row):
+            pdf.drawString(margin + i * col_width, y, fit(value))
+        y -= line_height
+        on_row()
+    pdf.save()
+
+
+RENDERERS = {'csv': _write_csv, 'xlsx': _write_xlsx, 'pdf': _write_pdf}
+
+
+def render_export(job, export_dir):
+    """Render a job's file, updating progress on the row; runs inside an app context"""
+    definition = EXPORT_REPORTS[job.report]
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    total, rows = definition['rows'](job.params_dict)
+    os.makedirs(export_dir, exist_ok=True)
+    final_path = os.path.join(export_dir, f'export-{job.id}.{job.format}')
+    part_path = final_path + '.part'
+    written = 0
+
+    def on_row():
+        nonlocal written
+        written += 1
+        if written % PROGRESS_EVERY == 0:
+            job.rows_written = written
+            job.progress = min(99, int(written * 100 / total)) if total else 99
+            db.session.commit()
+
+    RENDERERS[job.format](part_path, definition['title'], definition['columns'], rows, on_row)
+    os.replace(part_path, final_path)
+
+    ttl_hours = current_app.config.get('EXPORT_TTL_HOURS', 24)
+    job.status = 'done'
+    job.progress = 100
+    job.rows_written = written
+    job.file_path = final_path
+    job.file_size = os.path.getsize(final_path)
+    job.finished_at = datetime.utcnow()
+    job.expires_at = job.finished_at + timedelta(hours=ttl_hours)
+    db.session.commit()
+
+
+# ==================== WORKER POOL ====================
+_pool = None
+_worker_app = None
+
+
+def _get_worker_app(settings):
+    """Minimal app for pool processes: config + database, no blueprints"""
+    global _worker_app
+    if _worker_app is None:
+        _worker_app = Flask('gearguard-export-worker')
+        _worker_app.config.update(settings)
+        db.init_app(_worker_app)
+    return _worker_app
+
+
+def run_export_job(job_id, settings):
+    """Process pool entry point"""
+    app = _get_worker_app(settings)
+    with app.app_context():
+        job = db.session.get(ReportExport, job_id)
+        if job is None or job.status != 'queued':
+            return
+        try:
+            render_export(job, settings['EXPORT_DIR'])
+        except Exception as exc:
+            db.session.rollback()
+            job = db.session.get(ReportExport, job_id)
+            job.status = 'failed'
+            job.error = f'{type(exc).__name__}: {exc}'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            raise
+
+
+def export_dir():
+    return current_app.config.get('EXPORT_DIR') or os.path.join(current_app.instance_path, 'exports')
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: workers must not inherit the web server's threads and DB connections
+        _pool = ProcessPoolExecutor(
+            max_workers=current_app.config.get('EXPORT_WORKERS', 2),
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pool
+
+
+def submit_export(job):
+    """Queue a committed ReportExport row on the worker pool"""
+    settings = {
+        # Resolved URL: a relative sqlite path would resolve against the worker's cwd
+        'SQLALCHEMY_DATABASE_URI': db.engine.url.render_as_string(hide_password=False),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'EXPORT_DIR': export_dir(),
+        'EXPORT_TTL_HOURS': current_app.config.get('EXPORT_TTL_HOURS', 24)
+    }
+    _get_pool().submit(run_export_job, job.id, settings)
+
+
+def create_export(report, fmt, params, user_id=None):
+    job = ReportExport(report=report, format=fmt, params=json.dumps(params), requested_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+    submit_export(job)
+    return job
+
+
+def purge_expired_exports(now=None):
+    """Delete expired export files and mark their jobs expired; returns count"""
+    now = now or datetime.utcnow()
+    expired = ReportExport.query.filter(
+        ReportExport.status == 'done',
+        ReportExport.expires_at <= now
+    ).all()
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        job.status = 'expired'
+        job.file_path = None
+    if expired:
+        db.session.commit()
+    return len(expired)
+
+
+def fail_orphaned_exports(max_age_hours=6):
+    """Mark queued/running jobs older than max_age_hours failed (e.g. after a restart)"""
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    orphaned = ReportExport.query.filter(
+        ReportExport.status.in_(['queued', 'running']),
+        ReportExport.created_at < cutoff
+    ).all()
+    for job in orphaned:
+        job.status = 'failed'
+        job.error = 'Export worker did not finish the job'
+        job.finished_at = datetime.utcnow()
+    if orphaned:
+        db.session.commit()
+    return len(orphaned)
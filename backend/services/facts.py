@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Daily Fact Rollups
+
+Maintains request_daily_facts so trend and cost reports read a few thousand
+pre-aggregated rows instead of scanning maintenance_request for every month.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from backend.models import db, Equipment, MaintenanceRequest, RequestDailyFact
+from backend.signals import requests_written, request_snapshot
+
+FACT_DIMENSIONS = ('team_id', 'category_id', 'priority', 'request_type')
+
+
+def _as_date(value):
+    """SQLite returns date() as text, PostgreSQL as a date"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _grouped(day_column, start, end, *measures, extra_filter=None):
+    """Group requests by day of `day_column` and the fact dimensions"""
+    day = func.date(day_column)
+    query = db.session.query(
+        day,
+        MaintenanceRequest.team_id,
+        Equipment.category_id,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.request_type,
+        *measures
+    ).outerjoin(
+        Equipment, Equipment.id == MaintenanceRequest.equipment_id
+    ).filter(
+        day_column >= datetime.combine(start, datetime.min.time()),
+        day_column < datetime.combine(end, datetime.min.time())
+    )
+    if extra_filter is not None:
+        query = query.filter(extra_filter)
+    return query.group_by(
+        day,
+        MaintenanceRequest.team_id,
+        Equipment.category_id,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.request_type
+    ).all()
+
+
+def aggregate_facts(start, end):
+    """Compute fact rows for days in [start, end) straight from requests"""
+    rows = {}
+
+    def row_for(key):
+        if key not in rows:
+            rows[key] = {
+                'day': key[0],
+                'team_id': key[1],
+                'category_id': key[2],
+                'priority': key[3],
+                'request_type': key[4],
+                'created': 0,
+                'completed': 0,
+                'overdue': 0,
+                'cost_sum': 0,
+                'duration_sum': 0
+            }
+        return rows[key]
+
+    for day, *dims, count in _grouped(MaintenanceRequest.created_at, start, end,
+                                      func.count(MaintenanceRequest.id)):
+        row_for((_as_date(day), *dims))['created'] = count
+
+    for day, *dims, count, cost, duration in _grouped(
+            MaintenanceRequest.completed_date, start, end,
+            func.count(MaintenanceRequest.id),
+            func.coalesce(func.sum(MaintenanceRequest.maintenance_cost), 0),
+            func.coalesce(func.sum(MaintenanceRequest.duration_hours), 0)):
+        row = row_for((_as_date(day), *dims))
+        row['completed'] = count
+        row['cost_sum'] = cost
+        row['duration_sum'] = duration
+
+    # Overdue: deadline passed before completion (or before now if still open)
+    now = datetime.utcnow()
+    missed = db.or_(
+        MaintenanceRequest.completed_date > MaintenanceRequest.deadline,
+        db.and_(MaintenanceRequest.completed_date.is_(None), MaintenanceRequest.deadline < now)
+    )
+    for day, *dims, count in _grouped(MaintenanceRequest.deadline, start, end,
+                                      func.count(MaintenanceRequest.id),
+                                      extra_filter=missed):
+        row_for((_as_date(day), *dims))['overdue'] = count
+
+    return list(rows.values())
+
+
+def rebuild_facts(start, end):
+    """Replace the fact rows for days in [start, end); returns rows written"""
+    RequestDailyFact.query.filter(
+        RequestDailyFact.day >= start,
+        RequestDailyFact.day < end
+    ).delete(synchronize_session=False)
+
+    rows = aggregate_facts(start, end)
+    if rows:
+        now = datetime.utcnow()
+        for row in rows:
+            row['refreshed_at'] = now
+        db.session.execute(db.insert(RequestDailyFact), rows)
+    return len(rows)
+
+
+def rebuild_all_facts():
+    """Rebuild the whole rollup, covering every date any request refers to"""
+    bounds = db.session.query(
+        func.min(MaintenanceRequest.created_at), func.max(MaintenanceRequest.created_at),
+        func.min(MaintenanceRequest.completed_date), func.max(MaintenanceRequest.completed_date),
+        func.min(MaintenanceRequest.deadline), func.max(MaintenanceRequest.deadline)
+    ).one()
+    dates = [_as_datetime(value).date() for value in bounds if value]
+    RequestDailyFact.query.delete(synchronize_session=False)
+    if not dates:
+        return 0
+    end = max(max(dates), datetime.utcnow().date()) + timedelta(days=1)
+    return rebuild_facts(min(dates), end)
+
+
+def refresh_fact_days(days):
+    """Recompute the fact rows for the given days, merging adjacent days"""
+    days = sorted({d for d in days if d})
+    written = 0
+    span_start = prev = None
+    for day in days:
+        if span_start is None:
+            span_start = prev = day
+        elif day == prev + timedelta(days=1):
+            prev = day
+        else:
+            written += rebuild_facts(span_start, prev + timedelta(days=1))
+            span_start = prev = day
+    if span_start is not None:
+        written += rebuild_facts(span_start, prev + timedelta(days=1))
+    return written
+
+
+def _fact_days(snapshot):
+    """Days whose fact rows depend on this request"""
+    return {
+        value.date()
+        for value in (snapshot['created_at'], snapshot['completed_date'], snapshot['deadline'])
+        if value
+    }
+
+
+@requests_written.connect
+def _refresh_request_facts(app, action, requests, before, **extra):
+    """Incrementally refresh facts touched by a request write"""
+    days = set()
+    for snapshot in before.values():
+        days |= _fact_days(snapshot)
+    for req in requests:
+        days |= _fact_days(request_snapshot(req))
+    refresh_fact_days(days)
+
+
+# ==================== READERS ====================
+def month_starts(count, today=None):
+    """First day of each of the last `count` months, oldest first"""
+    today = today or datetime.utcnow().date()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        months.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(months))
+
+
+def next_month(day):
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def months_between(start, end):
+    """First day of every month overlapping [start, end)"""
+    month = date(start.year, start.month, 1)
+    months = []
+    while month < end:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def monthly_totals_between(start, end, group_by=None, **filters):
+    """Per-month measures for days in [start, end), optionally split by one dimension
+
+    Returns dicts with 'month', the measures and, when grouping, the
+    `group_by` dimension value. `filters` may restrict any fact dimension.
+    """
+    dimension = getattr(RequestDailyFact, group_by) if group_by else None
+    columns = [RequestDailyFact.day] + ([dimension] if dimension is not None else [])
+
+    query = db.session.query(
+        *columns,
+        func.sum(RequestDailyFact.created),
+        func.sum(RequestDailyFact.completed),
+        func.sum(RequestDailyFact.overdue),
+        func.sum(RequestDailyFact.cost_sum),
+        func.sum(RequestDailyFact.duration_sum)
+    ).filter(
+        RequestDailyFact.day >= start,
+        RequestDailyFact.day < end
+    )
+    for name in FACT_DIMENSIONS:
+        if filters.get(name) is not None:
+            query = query.filter(getattr(RequestDailyFact, name) == filters[name])
+
+    buckets = {}
+    for row in query.group_by(*columns):
+        day = _as_date(row[0])
+        group = row[1] if dimension is not None else None
+        created, completed, overdue, cost, duration = row[-5:]
+        bucket = buckets.setdefault((date(day.year, day.month, 1), group), {
+            'created': 0, 'completed': 0, 'overdue': 0, 'cost': 0.0, 'duration': 0.0
+        })
+        bucket['created'] += created or 0
+        bucket['completed'] += completed or 0
+        bucket['overdue'] += overdue or 0
+        bucket['cost'] += float(cost or 0)
+        bucket['duration'] += float(duration or 0)
+
+    if dimension is None:
+        empty = {'created': 0, 'completed': 0, 'overdue': 0, 'cost': 0.0, 'duration': 0.0}
+        return [dict(month=month, **buckets.get((month, None), empty))
+                for month in months_between(start, end)]
+    return [dict(month=month, **{group_by: group}, **bucket)
+            for (month, group), bucket in sorted(buckets.items(), key=lambda item: (item[0][0], str(item[0][1])))]
+
+
+def monthly_totals(months, **filters):
+    """Per-month created/completed/overdue/cost/duration over the last N months
+
+    `filters` may restrict any fact dimension (team_id, category_id, priority,
+    request_type). Reads at most one grouped row per day in the range.
+    """
+    starts = month_starts(months)
+    return monthly_totals_between(starts[0], next_month(starts[-1]), **filters)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Maintenance History Queries
+
+History is every closed request (done or scrap stage), newest completion
+first. Filters run in SQL on the is_open flag and the (is_open,
+completed_date, id) index, pages use a keyset cursor on (completed_date, id)
+and the totals for the whole filtered set come from one aggregate query on
+the first page. Scrapped requests that were never completed have no date:
+they follow the dated ones (newest id first) and drop out of date ranges.
+"""
+from datetime import datetime
+from sqlalchemy import and_, case, distinct, false, func, or_, select
+from backend.models import db, Equipment, MaintenanceTeam, MaintenanceStage, MaintenanceRequest
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+HISTORY_STATUSES = ('completed', 'scrapped')
+UNDATED = 'none'
+
+
+def _row_columns():
+    return (
+        MaintenanceRequest.id,
+        MaintenanceRequest.reference,
+        MaintenanceRequest.name,
+        MaintenanceRequest.request_type,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.stage_id,
+        MaintenanceRequest.equipment_id,
+        MaintenanceRequest.team_id,
+        MaintenanceRequest.requester_name,
+        MaintenanceRequest.request_date,
+        MaintenanceRequest.completed_date,
+        MaintenanceRequest.duration_hours,
+        MaintenanceRequest.maintenance_cost,
+        Equipment.name.label('equipment_name'),
+        MaintenanceTeam.name.label('team_name'),
+        MaintenanceStage.name.label('stage_name'),
+        MaintenanceStage.is_scrap
+    )
+
+
+def _filtered(statement, filters):
+    """Closed requests matching the history filters
+
+    filters: date_from / date_to (datetimes, completion in [from, to)),
+    team_id, equipment_id, category_id, request_type, status.
+    """
+    statement = statement.where(MaintenanceRequest.is_open == false())
+    if filters.get('date_from'):
+        statement = statement.where(MaintenanceRequest.completed_date >= filters['date_from'])
+    if filters.get('date_to'):
+        statement = statement.where(MaintenanceRequest.completed_date < filters['date_to'])
+    if filters.get('team_id'):
+        statement = statement.where(MaintenanceRequest.team_id == filters['team_id'])
+    if filters.get('equipment_id'):
+        statement = statement.where(MaintenanceRequest.equipment_id == filters['equipment_id'])
+    if filters.get('category_id'):
+        statement = statement.where(MaintenanceRequest.equipment_id.in_(
+            select(Equipment.id).where(Equipment.category_id == filters['category_id'])
+        ))
+    if filters.get('request_type'):
+        statement = statement.where(MaintenanceRequest.request_type == filters['request_type'])
+    if filters.get('status'):
+        flag = MaintenanceStage.is_scrap if filters['status'] == 'scrapped' else MaintenanceStage.is_done
+        statement = statement.where(MaintenanceRequest.stage_id.in_(
+            select(MaintenanceStage.id).where(flag.is_(True))
+        ))
+    return statement
+
+
+def encode_cursor(completed_date, request_id):
+    return f'{completed_date.isoformat() if completed_date else UNDATED}_{request_id}'
+
+
+def decode_cursor(cursor):
+    """Return (completed_date or None, id) or raise ValueError"""
+    completed, _, request_id = cursor.rpartition('_')
+    return (None if completed == UNDATED else datetime.fromisoformat(completed)), int(request_id)
+
+
+def history_row(row):
+    """Compact projection used by the history timeline"""
+    return {
+        'id': row.id,
+        'reference': row.reference,
+        'name': row.name,
+        'request_type': row.request_type,
+        'priority': row.priority,
+        'status': 'scrapped' if row.is_scrap else 'completed',
+        'stage_id': row.stage_id,
+        'stage_name': row.stage_name,
+        'equipment_id': row.equipment_id,
+        'equipment_name': row.equipment_name,
+        'team_id': row.team_id,
+        'team_name': row.team_name,
+        'requester_name': row.requester_name,
+        'request_date': row.request_date.isoformat() if row.request_date else None,
+        'completed_date': row.completed_date.isoformat() if row.completed_date else None,
+        'duration_hours': row.duration_hours,
+        'maintenance_cost': float(row.maintenance_cost) if row.maintenance_cost is not None else None
+    }
+
+
+def _page_rows(filters, cursor, limit):
+    """Up to limit + 1 rows after `cursor`: dated rows first, then undated ones"""
+    base = _filtered(select(*_row_columns()), filters).outerjoin(
+        Equipment, Equipment.id == MaintenanceRequest.equipment_id
+    ).outerjoin(
+        MaintenanceTeam, MaintenanceTeam.id == MaintenanceRequest.team_id
+    ).outerjoin(
+        MaintenanceStage, MaintenanceStage.id == MaintenanceRequest.stage_id
+    )
+    completed_at, request_id = decode_cursor(cursor) if cursor else (None, None)
+
+    rows = []
+    if not cursor or completed_at is not None:
+        dated = base.where(MaintenanceRequest.completed_date.isnot(None))
+        if cursor:
+            dated = dated.where(or_(
+                MaintenanceRequest.completed_date < completed_at,
+                and_(MaintenanceRequest.completed_date == completed_at, MaintenanceRequest.id < request_id)
+            ))
+        rows = db.session.execute(dated.order_by(
+            MaintenanceRequest.completed_date.desc(), MaintenanceRequest.id.desc()
+        ).limit(limit + 1)).all()
+
+    if len(rows) <= limit and not (filters.get('date_from') or filters.get('date_to')):
+        undated = base.where(MaintenanceRequest.completed_date.is_(None))
+        if cursor and completed_at is None:
+            undated = undated.where(MaintenanceRequest.id < request_id)
+        rows += db.session.execute(
+            undated.order_by(MaintenanceRequest.id.desc()).limit(limit + 1 - len(rows))
+        ).all()
+    return rows
+
+
+def history_totals(filters):
+    """Aggregates over the whole filtered history"""
+    scrap_stage_ids = select(MaintenanceStage.id).where(MaintenanceStage.is_scrap.is_(True))
+    row = db.session.execute(_filtered(select(
+        func.count(MaintenanceRequest.id).label('total'),
+        func.sum(case((MaintenanceRequest.stage_id.in_(scrap_stage_ids), 1), else_=0)).label('scrapped'),
+        func.sum(MaintenanceRequest.duration_hours).label('hours'),
+        func.sum(MaintenanceRequest.maintenance_cost).label('cost'),
+        func.count(distinct(MaintenanceRequest.equipment_id)).label('equipment')
+    ), filters)).one()
+    scrapped = int(row.scrapped or 0)
+    return {
+        'total': row.total,
+        'completed': row.total - scrapped,
+        'scrapped': scrapped,
+        'total_hours': round(float(row.hours or 0), 2),
+        'total_cost': round(float(row.cost or 0), 2),
+        'equipment_serviced': row.equipment
+    }
+
+
+def history_page(filters, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One page of history; the first page (no cursor) also carries totals"""
+    rows = _page_rows(filters, cursor, limit)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'items': [history_row(row) for row in rows],
+        'next_cursor': encode_cursor(rows[-1].completed_date, rows[-1].id) if has_more else None,
+        'totals': history_totals(filters) if not cursor else None
+    }
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Kanban Board Queries
+
+The board loads per-stage counts (one GROUP BY) plus the newest N cards of
+every expanded stage (one ROW_NUMBER() query) instead of every request ever
+created. Folded stages (Completed, Scrapped) return their count only until
+the user expands them. More cards are fetched per stage with a keyset cursor
+on (created_at, id), newest first.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import func, or_, and_, select
+from backend.models import db, Equipment, MaintenanceTeam, MaintenanceStage, MaintenanceRequest
+
+KANBAN_PAGE_SIZE = 20
+KANBAN_MAX_PAGE_SIZE = 100
+
+
+def _card_columns():
+    return (
+        MaintenanceRequest.id,
+        MaintenanceRequest.reference,
+        MaintenanceRequest.name,
+        MaintenanceRequest.stage_id,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.request_type,
+        MaintenanceRequest.requester_name,
+        MaintenanceRequest.scheduled_date,
+        MaintenanceRequest.deadline,
+        MaintenanceRequest.created_at,
+        Equipment.name.label('equipment_name'),
+        MaintenanceTeam.name.label('team_name')
+    )
+
+
+def _filtered(statement, search=None, priority=None):
+    """Join card lookups and apply the board filters"""
+    statement = statement.outerjoin(
+        Equipment, Equipment.id == MaintenanceRequest.equipment_id
+    ).outerjoin(
+        MaintenanceTeam, MaintenanceTeam.id == MaintenanceRequest.team_id
+    )
+    if priority:
+        statement = statement.where(MaintenanceRequest.priority == priority)
+    if search:
+        pattern = f'%{search}%'
+        statement = statement.where(or_(
+            MaintenanceRequest.name.ilike(pattern),
+            MaintenanceRequest.reference.ilike(pattern),
+            MaintenanceRequest.description.ilike(pattern),
+            Equipment.name.ilike(pattern)
+        ))
+    return statement
+
+
+def encode_cursor(created_at, request_id):
+    return f'{created_at.isoformat()}_{request_id}'
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) or raise ValueError"""
+    created, _, request_id = cursor.rpartition('_')
+    return datetime.fromisoformat(created), int(request_id)
+
+
+def card_dict(row, stage=None, now=None):
+    """Compact card projection used by the board"""
+    now = now or datetime.utcnow()
+    closed = stage is not None and (stage.is_done or stage.is_scrap)
+    return {
+        'id': row.id,
+        'reference': row.reference,
+        'name': row.name,
+        'stage_id': row.stage_id,
+        'priority': row.priority,
+        'request_type': row.request_type,
+        'equipment_name': row.equipment_name,
+        'team_name': row.team_name,
+        'requester_name': row.requester_name,
+        'scheduled_date': row.scheduled_date.isoformat() if row.scheduled_date else None,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'stage_name': stage.name if stage is not None else None,
+        'is_overdue': bool(row.deadline and not closed and row.deadline < now)
+    }
+
+
+def request_card(req, stage=None):
+    """Card projection of a loaded MaintenanceRequest (same shape as the board)"""
+    row = SimpleNamespace(
+        id=req.id, reference=req.reference, name=req.name, stage_id=req.stage_id,
+        priority=req.priority, request_type=req.request_type,
+        requester_name=req.requester_name, scheduled_date=req.scheduled_date,
+        deadline=req.deadline, created_at=req.created_at,
+        equipment_name=req.equipment.name if req.equipment else None,
+        team_name=req.team.name if req.team else None
+    )
+    return card_dict(row, stage if stage is not None else req.stage)
+
+
+def _page(rows, limit, stage, now):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'cards': [card_dict(row, stage, now) for row in rows],
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    }
+
+
+def kanban_board(limit=KANBAN_PAGE_SIZE, search=None, priority=None, expand=()):
+    """Stages with counts; cards for unfolded (or explicitly expanded) stages"""
+    stages = MaintenanceStage.query.order_by(MaintenanceStage.sequence).all()
+    now = datetime.utcnow()
+
+    count_query = _filtered(
+        select(MaintenanceRequest.stage_id, func.count(MaintenanceRequest.id)),
+        search, priority
+    ).group_by(MaintenanceRequest.stage_id)
+    counts = dict(db.session.execute(count_query).all())
+
+    loaded = [s.id for s in stages if (not s.fold or s.id in expand) and counts.get(s.id)]
+    pages = {stage_id: [] for stage_id in loaded}
+    if loaded:
+        rank = func.row_number().over(
+            partition_by=MaintenanceRequest.stage_id,
+            order_by=(MaintenanceRequest.created_at.desc(), MaintenanceRequest.id.desc())
+        ).label('rank')
+        ranked = _filtered(
+            select(*_card_columns(), rank), search, priority
+        ).where(MaintenanceRequest.stage_id.in_(loaded)).subquery()
+        top = select(ranked).where(ranked.c.rank <= limit + 1).order_by(ranked.c.stage_id, ranked.c.rank)
+        for row in db.session.execute(top):
+            pages[row.stage_id].append(row)
+
+    board = []
+    for stage in stages:
+        column = {
+            'id': stage.id,
+            'name': stage.name,
+            'sequence': stage.sequence,
+            'color': stage.color,
+            'is_done': stage.is_done,
+            'is_scrap': stage.is_scrap,
+            'fold': stage.fold,
+            'count': counts.get(stage.id, 0),
+            'loaded': not stage.fold or stage.id in expand,
+            'cards': [],
+            'next_cursor': None
+        }
+        if stage.id in pages:
+            column.update(_page(pages[stage.id], limit, stage, now))
+        board.append(column)
+    return board
+
+
+def stage_cards(stage, cursor=None, limit=KANBAN_PAGE_SIZE, search=None, priority=None):
+    """Next page of a stage's cards after `cursor` (see decode_cursor)"""
+    statement = _filtered(select(*_card_columns()), search, priority).where(
+        MaintenanceRequest.stage_id == stage.id
+    )
+    if cursor:
+        created_at, request_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            MaintenanceRequest.created_at < created_at,
+            and_(MaintenanceRequest.created_at == created_at, MaintenanceRequest.id < request_id)
+        ))
+    statement = statement.order_by(
+        MaintenanceRequest.created_at.desc(), MaintenanceRequest.id.desc()
+    ).limit(limit + 1)
+    rows = db.session.execute(statement).all()
+    return _page(rows, limit, stage, datetime.utcnow())
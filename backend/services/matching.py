@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Technician Matching
+
+Ranks technicians for a request by skill match against the equipment
+category's required_skills, team, availability and open-request load.
+
+Technician attributes live in an in-memory index: skills as bitsets over
+SKILL_TYPES, team, availability code and the number of open requests
+assigned to each technician, in numpy arrays so a ranking is a handful of
+vector operations. It also counts open requests per team, which
+auto-assignment (services/auto_assign.py) balances on.
+
+The index follows the /api/changes sequence: each use compares the change
+counter with the value it last synced to and, when writes happened (in any
+worker), re-reads only the technicians and requests stamped since then, plus
+tombstones for deletes. A counter reset (re-seed, tombstone prune) rebuilds
+it.
+"""
+import threading
+from datetime import timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from backend.models import db, MaintenanceRequest, MaintenanceTeam, Technician, ChangeTombstone, SKILL_TYPES
+from backend.services.changes import change_counter
+from backend.services.shifts import on_shift
+
+SKILL_BITS = {skill: 1 << i for i, skill in enumerate(SKILL_TYPES)}
+GENERAL_BIT = SKILL_BITS['General']
+GENERAL_CREDIT = 0.3          # skill score of a generalist without a required skill
+AVAILABILITY_CODES = {'available': 0, 'busy': 1, 'off_duty': 2}
+AVAILABILITY_SCORES = np.array([1.0, 0.4, 0.0])
+MATCH_WEIGHTS = {'skill': 0.4, 'team': 0.25, 'availability': 0.15, 'load': 0.2}
+CANDIDATES_DEFAULT_LIMIT = 10
+CANDIDATES_MAX_LIMIT = 100
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(1 << len(SKILL_TYPES))], dtype=np.float64)
+
+
+def parse_skills(value):
+    """Comma-separated SKILL_TYPES from a list or string; ValueError on unknown skills"""
+    if value is None:
+        return None
+    skills = value if isinstance(value, list) else str(value).split(',')
+    skills = [str(s).strip() for s in skills if str(s).strip()]
+    unknown = [s for s in skills if s not in SKILL_BITS]
+    if unknown:
+        raise ValueError(f"Unknown skills: {', '.join(unknown)}")
+    return ','.join(dict.fromkeys(skills)) or None
+
+
+def skill_mask(skills):
+    """Bitset of a comma-separated skill string (unknown names are ignored)"""
+    mask = 0
+    for skill in (skills or '').split(','):
+        mask |= SKILL_BITS.get(skill.strip(), 0)
+    return mask
+
+
+def score_technicians(arrays, required, team_id=None):
+    """Match score of every technician in `arrays`: (scores, skill match, same team)"""
+    masks = arrays['masks']
+    if required:
+        skill = _POPCOUNT[masks & required] / _POPCOUNT[required]
+        skill = np.where((skill == 0) & ((masks & GENERAL_BIT) != 0), GENERAL_CREDIT, skill)
+    else:
+        skill = np.ones(len(masks))
+    same_team = (arrays['teams'] == team_id) if team_id else np.zeros(len(masks), dtype=bool)
+    load = 1.0 / (1.0 + arrays['loads'])
+    scores = (MATCH_WEIGHTS['skill'] * skill + MATCH_WEIGHTS['team'] * same_team +
+              MATCH_WEIGHTS['availability'] * AVAILABILITY_SCORES[arrays['availability']] +
+              MATCH_WEIGHTS['load'] * load)
+    return scores, skill, same_team
+
+
+class TechnicianIndex:
+    """Active technicians and open loads per technician and team, synced from the change feed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._synced = None           # (change counter value, reset_seq)
+        self._technicians = {}        # id -> (name, team_id, skill, availability code)
+        self._open = {}               # open request id -> (team_id, technician_id)
+        self._loads = {}              # technician id -> open requests
+        self._team_loads = {}         # team id -> open requests
+        self._arrays = None
+
+    # -------------------- sync --------------------
+    def sync(self):
+        """Catch up with writes since the last sync; returns the arrays
+
+        The returned dict is a snapshot (never changed in place): technician
+        arrays plus `team_loads`.
+        """
+        counter = change_counter()
+        with self._lock:
+            if self._synced is None or counter[1] != self._synced[1] or counter[0] < self._synced[0]:
+                self._rebuild()
+            elif counter[0] > self._synced[0]:
+                self._apply_changes(self._synced[0], counter[0])
+            self._synced = counter
+            if self._arrays is None:
+                self._build_arrays()
+            return self._arrays
+
+    def invalidate(self):
+        with self._lock:
+            self._synced = None
+
+    def _rebuild(self):
+        self._technicians = {
+            row.id: (row.name, row.team_id, row.skill, AVAILABILITY_CODES.get(row.availability_status, 0))
+            for row in db.session.execute(select(
+                Technician.id, Technician.name, Technician.team_id, Technician.skill,
+                Technician.availability_status
+            ).where(Technician.is_active.is_(True)))
+        }
+        self._open, self._loads, self._team_loads = {}, {}, {}
+        for row in db.session.execute(select(
+            MaintenanceRequest.id, MaintenanceRequest.team_id, MaintenanceRequest.technician_id
+        ).where(MaintenanceRequest.is_open.is_(True))):
+            self._add_open(row, set())
+        self._arrays = None
+
+    def _add_open(self, row, touched):
+        self._open[row.id] = (row.team_id, row.technician_id)
+        if row.team_id is not None:
+            self._team_loads[row.team_id] = self._team_loads.get(row.team_id, 0) + 1
+        if row.technician_id is not None:
+            self._loads[row.technician_id] = self._loads.get(row.technician_id, 0) + 1
+            touched.add(row.technician_id)
+
+    def _remove_open(self, request_id, touched):
+        team_id, technician_id = self._open.pop(request_id, (None, None))
+        if team_id is not None:
+            self._team_loads[team_id] -= 1
+        if technician_id is not None:
+            self._loads[technician_id] -= 1
+            touched.add(technician_id)
+
+    def _apply_changes(self, since, upto):
+        technicians_changed, touched = False, set()
+        for row in db.session.execute(select(
+            Technician.id, Technician.name, Technician.team_id, Technician.skill,
+            Technician.availability_status, Technician.is_active
+        ).where(Technician.change_seq > since, Technician.change_seq <= upto)):
+            technicians_changed = True
+            if row.is_active:
+                self._technicians[row.id] = (row.name, row.team_id, row.skill,
+                                             AVAILABILITY_CODES.get(row.availability_status, 0))
+            else:
+                self._technicians.pop(row.id, None)
+
+        requests_changed = False
+        for row in db.session.execute(select(
+            MaintenanceRequest.id, MaintenanceRequest.team_id, MaintenanceRequest.technician_id,
+            MaintenanceRequest.is_open
+        ).where(MaintenanceRequest.change_seq > since, MaintenanceRequest.change_seq <= upto)):
+            requests_changed = True
+            self._remove_open(row.id, touched)
+            if row.is_open:
+                self._add_open(row, touched)
+
+        for entity, entity_id in db.session.execute(select(ChangeTombstone.entity, ChangeTombstone.entity_id).where(
+            ChangeTombstone.change_seq > since, ChangeTombstone.change_seq <= upto,
+            ChangeTombstone.entity.in_(('requests', 'technicians'))
+        )):
+            if entity == 'requests':
+                requests_changed = True
+                self._remove_open(entity_id, touched)
+            else:
+                technicians_changed |= self._technicians.pop(entity_id, None) is not None
+
+        if technicians_changed:
+            self._arrays = None
+        elif touched and self._arrays is not None:
+            # Copy on write: rankings running in other threads keep a consistent array
+            loads = self._arrays['loads'].copy()
+            positions = self._arrays['positions']
+            for technician_id in touched:
+                if technician_id in positions:
+                    loads[positions[technician_id]] = self._loads[technician_id]
+            self._arrays = dict(self._arrays, loads=loads)
+        if requests_changed and self._arrays is not None:
+            self._arrays = dict(self._arrays, team_loads=dict(self._team_loads))
+
+    def _build_arrays(self):
+        ids = sorted(self._technicians)
+        rows = [self._technicians[i] for i in ids]
+        self._arrays = {
+            'ids': np.array(ids, dtype=np.int64),
+            'positions': {technician_id: position for position, technician_id in enumerate(ids)},
+            'names': [r[0] for r in rows],
+            'skills': [r[2] for r in rows],
+            'teams': np.array([r[1] if r[1] is not None else -1 for r in rows], dtype=np.int64),
+            'masks': np.array([skill_mask(r[2]) for r in rows], dtype=np.int64),
+            'availability': np.array([r[3] for r in rows], dtype=np.int64),
+            'loads': np.array([self._loads.get(i, 0) for i in ids], dtype=np.float64),
+            'team_loads': dict(self._team_loads)
+        }
+
+    # -------------------- ranking --------------------
+    def rank(self, required, team_id=None, limit=CANDIDATES_DEFAULT_LIMIT, include_off_duty=False):
+        """Top `limit` technicians for a skill bitset and team: (arrays, positions, scores, parts)"""
+        arrays = self.sync()
+        scores, skill, same_team = score_technicians(arrays, required, team_id)
+        eligible = np.flatnonzero(arrays['availability'] != AVAILABILITY_CODES['off_duty']) \
+            if not include_off_duty else np.arange(len(scores))
+
+        if len(eligible) > limit:
+            eligible = eligible[np.argpartition(-scores[eligible], limit - 1)[:limit]]
+        # Best score first; ties go to the lighter load, then the lower id
+        order = np.lexsort((arrays['ids'][eligible], arrays['loads'][eligible], -scores[eligible]))
+        positions = eligible[order]
+        return arrays, positions, scores, {'skill': skill, 'same_team': same_team}
+
+
+technician_index = TechnicianIndex()
+
+
+def request_candidates(req, limit=CANDIDATES_DEFAULT_LIMIT, include_off_duty=False):
+    """Ranked technicians for a request (team: its own, else its equipment's default)
+
+    For a scheduled request, on_shift tells whether each candidate's shifts
+    cover the whole slot (None when the request has no date).
+    """
+    category = req.equipment.category if req.equipment else None
+    required = skill_mask(category.required_skills) if category else 0
+    team_id = req.team_id or (req.equipment.default_team_id if req.equipment else None)
+
+    arrays, positions, scores, parts = technician_index.rank(required, team_id, limit, include_off_duty)
+    team_ids = {int(arrays['teams'][p]) for p in positions}
+    team_names = dict(db.session.query(MaintenanceTeam.id, MaintenanceTeam.name).filter(
+        MaintenanceTeam.id.in_(team_ids))) if team_ids else {}
+    availability = {code: status for status, code in AVAILABILITY_CODES.items()}
+    working = None
+    if req.scheduled_date:
+        hours = float(req.duration_hours or current_app.config.get('SCHEDULER_DEFAULT_DURATION_HOURS', 2))
+        working = on_shift([int(arrays['ids'][p]) for p in positions], req.scheduled_date,
+                           req.scheduled_date + timedelta(hours=hours))
+
+    return {
+        'request_id': req.id,
+        'team_id': team_id,
+        'required_skills': category.skill_list if category else [],
+        'ranked': len(arrays['ids']),
+        'candidates': [{
+            'technician_id': int(arrays['ids'][p]),
+            'name': arrays['names'][p],
+            'skill': arrays['skills'][p],
+            'team_id': int(arrays['teams'][p]) if arrays['teams'][p] >= 0 else None,
+            'team_name': team_names.get(int(arrays['teams'][p])),
+            'availability_status': availability[int(arrays['availability'][p])],
+            'open_requests': int(arrays['loads'][p]),
+            'skill_match': round(float(parts['skill'][p]), 3),
+            'same_team': bool(parts['same_team'][p]),
+            'on_shift': int(arrays['ids'][p]) in working if working is not None else None,
+            'score': round(float(scores[p]), 4)
+        } for p in positions]
+    }
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Denormalized Open State (maintenance_request.is_open)
+
+A request is open while its stage is neither done nor scrap. The flag is
+copied onto the request so open/overdue lookups use the composite is_open
+indexes instead of joining maintenance_stage. Set-based writers (bulk
+operations, stage flag edits) update it explicitly; ORM writes are covered
+by the before_flush hook below. Stage flag edits also recount the open
+request counters of the affected teams and equipment.
+"""
+from sqlalchemy import event as sa_event, inspect, update
+from sqlalchemy.orm import Session
+from backend.models import db, MaintenanceRequest, MaintenanceStage
+from backend.services.changes import next_change_seq
+from backend.services.counters import counted_parents, recount_parents
+
+
+@sa_event.listens_for(Session, 'before_flush')
+def _sync_open_flags(session, flush_context, instances):
+    """Recompute is_open for new requests and requests whose stage changed"""
+    for req in list(session.new) + list(session.dirty):
+        if not isinstance(req, MaintenanceRequest) or req in session.deleted:
+            continue
+        attrs = inspect(req).attrs
+        stage_changed = attrs.stage.history.has_changes()
+        if req in session.dirty and not (stage_changed or attrs.stage_id.history.has_changes()):
+            continue
+        with session.no_autoflush:
+            stage = req.stage if stage_changed else (
+                session.get(MaintenanceStage, req.stage_id) if req.stage_id else None)
+        req.is_open = stage is not None and stage.is_open
+
+
+def resync_stage_requests(stage):
+    """Set is_open on every request in `stage` after its flags were edited
+
+    Returns the number of requests whose flag changed.
+    """
+    is_open = stage.is_open
+    changed = db.session.execute(
+        update(MaintenanceRequest).where(
+            MaintenanceRequest.stage_id == stage.id,
+            MaintenanceRequest.is_open != is_open
+        ).values(is_open=is_open, change_seq=next_change_seq(db.session)),
+        execution_options={'synchronize_session': 'fetch'}
+    ).rowcount
+    if changed:
+        recount_parents(counted_parents(MaintenanceRequest, MaintenanceRequest.stage_id == stage.id))
+    return changed
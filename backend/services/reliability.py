@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Reliability Analytics (MTBF / MTTR)
+
+Failures are corrective maintenance requests. For every asset:
+    MTBF = mean time between consecutive failures (request_date to request_date)
+    MTTR = mean repair time (completed_date - request_date, completed failures)
+
+All failures are loaded once as NumPy arrays, sorted by (equipment, date) and
+reduced with diffs and bincounts, so a large fleet costs a few array passes
+instead of a Python loop per asset. Category and department figures pool the
+underlying gaps and repairs rather than averaging per-asset means.
+"""
+from datetime import datetime
+import numpy as np
+from sqlalchemy import String, type_coerce
+from backend.models import db, Equipment, EquipmentCategory, MaintenanceRequest
+
+RELIABILITY_GROUPS = ('equipment', 'category', 'department')
+RELIABILITY_SORTS = ('failures', 'mtbf', 'mttr')
+
+
+def _load_failures(since=None):
+    """Return (equipment_ids, requested, completed) arrays for corrective requests
+
+    Dates are datetime64[s]; completed is NaT for open failures. Datetimes are
+    fetched without ORM conversion (raw ISO text on SQLite) and parsed by NumPy.
+    """
+    query = db.session.query(
+        MaintenanceRequest.equipment_id,
+        type_coerce(MaintenanceRequest.request_date, String),
+        type_coerce(MaintenanceRequest.completed_date, String)
+    ).filter(
+        MaintenanceRequest.request_type == 'corrective',
+        MaintenanceRequest.equipment_id.isnot(None),
+        MaintenanceRequest.request_date.isnot(None)
+    )
+    if since:
+        query = query.filter(MaintenanceRequest.request_date >= since)
+    rows = query.all()
+    if not rows:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[s]'),
+                np.empty(0, dtype='datetime64[s]'))
+
+    equipment_ids, requested, completed = zip(*rows)
+    return (np.array(equipment_ids, dtype=np.int64),
+            np.array(requested, dtype='datetime64[s]'),
+            np.array(completed, dtype='datetime64[s]'))
+
+
+def _group_labels(group_by):
+    """Return (equipment_ids, group_codes, labels) with equipment_ids sorted
+
+    group_codes[i] is the group of equipment_ids[i]; labels[code] is the
+    (id, name) pair reported for that group.
+    """
+    if group_by == 'equipment':
+        rows = db.session.query(Equipment.id, Equipment.code, Equipment.name) \
+            .order_by(Equipment.id).all()
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        labels = [(r[0], f'{r[1]} - {r[2]}') for r in rows]
+        return ids, np.arange(len(rows)), labels
+
+    if group_by == 'category':
+        rows = db.session.query(Equipment.id, Equipment.category_id).order_by(Equipment.id).all()
+        names = dict(db.session.query(EquipmentCategory.id, EquipmentCategory.name).all())
+        keys = [r[1] or 0 for r in rows]
+    else:
+        rows = db.session.query(Equipment.id, Equipment.department).order_by(Equipment.id).all()
+        keys = [r[1] or '' for r in rows]
+
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    unique_keys, codes = np.unique(np.array(keys, dtype=object), return_inverse=True) if rows \
+        else (np.empty(0), np.empty(0, dtype=np.int64))
+    if group_by == 'category':
+        labels = [(k or None, names.get(k, 'Uncategorized')) for k in unique_keys]
+    else:
+        labels = [(k or None, k or 'Unassigned') for k in unique_keys]
+    return ids, codes, labels
+
+
+def _hours(delta):
+    return delta.astype('timedelta64[s]').astype(np.float64) / 3600.0
+
+
+def reliability_report(group_by='equipment', since=None, sort='failures', limit=50):
+    """MTBF/MTTR per equipment, category or department
+
+    Returns {'fleet': {...}, 'total': n, 'items': [...]} with the `limit`
+    groups ranked by `sort`: most failures, shortest MTBF or longest MTTR.
+    """
+    equipment, requested, completed = _load_failures(since)
+    group_ids, group_codes, labels = _group_labels(group_by)
+    n_groups = len(labels)
+
+    # Map each failure to its group (drop rows whose equipment has vanished)
+    slot = np.searchsorted(group_ids, equipment)
+    known = slot < len(group_ids)
+    known[known] = group_ids[slot[known]] == equipment[known]
+    group = group_codes[slot[known]]
+    equipment, requested, completed = equipment[known], requested[known], completed[known]
+
+    # Failure counts
+    failures = np.bincount(group, minlength=n_groups)
+
+    # Time between failures: diffs of request dates within each asset
+    order = np.lexsort((requested, equipment))
+    sorted_equipment = equipment[order]
+    sorted_requested = requested[order]
+    same_asset = sorted_equipment[1:] == sorted_equipment[:-1]
+    gaps = _hours(np.diff(sorted_requested))[same_asset]
+    gap_group = group[order][1:][same_asset]
+    gap_sum = np.bincount(gap_group, weights=gaps, minlength=n_groups)
+    gap_count = np.bincount(gap_group, minlength=n_groups)
+
+    # Time to repair for completed failures (clock skew clipped to zero)
+    repaired = ~np.isnat(completed)
+    repair_hours = np.clip(_hours(completed[repaired] - requested[repaired]), 0, None)
+    repair_group = group[repaired]
+    repair_sum = np.bincount(repair_group, weights=repair_hours, minlength=n_groups)
+    repair_count = np.bincount(repair_group, minlength=n_groups)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mtbf = np.where(gap_count > 0, gap_sum / gap_count, np.nan)
+        mttr = np.where(repair_count > 0, repair_sum / repair_count, np.nan)
+        availability = mtbf / (mtbf + mttr)
+
+    # Rank groups that had at least one failure
+    candidates = np.flatnonzero(failures)
+    if sort == 'mtbf':
+        keys = (np.nan_to_num(mtbf[candidates], nan=np.inf),)
+    elif sort == 'mttr':
+        keys = (-np.nan_to_num(mttr[candidates], nan=-np.inf),)
+    else:
+        keys = (-failures[candidates],)
+    ranked = candidates[np.lexsort((candidates,) + keys)][:limit]
+
+    def value(array, index, digits=2):
+        return None if np.isnan(array[index]) else round(float(array[index]), digits)
+
+    items = [{
+        'id': labels[i][0],
+        'name': labels[i][1],
+        'failures': int(failures[i]),
+        'repairs': int(repair_count[i]),
+        'mtbf_hours': value(mtbf, i),
+        'mttr_hours': value(mttr, i),
+        'availability': value(availability, i, 4)
+    } for i in ranked]
+
+    total_gaps = gap_count.sum()
+    total_repairs = repair_count.sum()
+    fleet_mtbf = gap_sum.sum() / total_gaps if total_gaps else None
+    fleet_mttr = repair_sum.sum() / total_repairs if total_repairs else None
+    fleet = {
+        'failures': int(failures.sum()),
+        'repairs': int(total_repairs),
+        'mtbf_hours': round(float(fleet_mtbf), 2) if fleet_mtbf is not None else None,
+        'mttr_hours': round(float(fleet_mttr), 2) if fleet_mttr is not None else None,
+        'availability': round(float(fleet_mtbf / (fleet_mtbf + fleet_mttr)), 4)
+        if fleet_mtbf is not None and fleet_mttr is not None and fleet_mtbf + fleet_mttr else None
+    }
+
+    return {
+        'group_by': group_by,
+        'since': since.isoformat() if isinstance(since, datetime) else since,
+        'generated_at': datetime.utcnow().isoformat(),
+        'fleet': fleet,
+        'total': int(len(candidates)),
+        'items': items
+    }
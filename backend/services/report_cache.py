@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Report Result Cache
+
+Caches /api/reports/* responses per (endpoint, query args, role). Entries are
+fresh for REPORT_CACHE_TTL seconds or until a write bumps one of their tags
+('requests', 'equipment', 'teams'). Stale entries keep being served while a
+single thread recomputes them (stale-while-revalidate).
+
+Write signals fire before the transaction commits, so they only note the tags
+on the session; the generations are bumped once it commits. A report computed
+in between reads pre-commit data and is therefore stored under a generation
+that the commit makes stale. At most REPORT_CACHE_MAX_ENTRIES entries are
+kept, least recently used first out.
+
+The cache lives in process memory, so every gunicorn worker has its own copy;
+writes handled by another worker reach it through the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, make_response, request, session
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+from backend.models import db
+from backend.signals import requests_written, equipment_written, teams_written
+
+
+class _Entry:
+    __slots__ = ('body', 'status', 'mimetype', 'stored_at', 'generations')
+
+    def __init__(self, body, status, mimetype, stored_at, generations):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.stored_at = stored_at
+        self.generations = generations
+
+
+class ReportCache:
+    """Tag-invalidated TTL cache with per-key recompute locks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._generations = {}
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'recomputes': 0,
+            'invalidations': 0,
+            'evictions': 0
+        }
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry, max_entries):
+        """Keep `entry`, evicting least recently used entries (and their locks) past max_entries"""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted, None)
+                self._stats['evictions'] += 1
+
+    def _release(self, key, key_lock):
+        """Release a recompute lock, dropping it when nothing was cached under `key`"""
+        key_lock.release()
+        with self._lock:
+            if key not in self._entries and self._key_locks.get(key) is key_lock:
+                del self._key_locks[key]
+
+    def _current_generations(self, tags):
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def invalidate(self, *tags):
+        """Mark every entry depending on any of `tags` as stale"""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['entries'] = len(self._entries)
+        lookups = data['hits'] + data['stale_hits'] + data['misses']
+        data['hit_ratio'] = round((data['hits'] + data['stale_hits']) / lookups, 4) if lookups else 0.0
+        return data
+
+    def _is_fresh(self, entry, tags, ttl, now):
+        return (now - entry.stored_at < ttl
+                and entry.generations == self._current_generations(tags))
+
+    def get_or_compute(self, key, tags, compute, ttl, stale_ttl, max_entries=500):
+        """Return (entry, state) where state is 'hit', 'stale' or 'miss'
+
+        `compute` returns an _Entry or None (uncacheable response).
+        """
+        now = time.monotonic()
+        entry = self._get(key)
+        if entry is not None and self._is_fresh(entry, tags, ttl, now):
+            self._count('hits')
+            return entry, 'hit'
+
+        key_lock = self._key_lock(key)
+        servable = entry is not None and now - entry.stored_at < stale_ttl
+        if servable and not key_lock.acquire(blocking=False):
+            # Someone else is already recomputing: serve the previous result
+            self._count('stale_hits')
+            return entry, 'stale'
+        if not servable:
+            key_lock.acquire()
+
+        try:
+            # Another thread may have refreshed the entry while we waited
+            entry = self._get(key)
+            if entry is not None and self._is_fresh(entry, tags, ttl, time.monotonic()):
+                self._count('hits')
+                return entry, 'hit'
+
+            self._count('misses')
+            generations = self._current_generations(tags)
+            fresh = compute(generations)
+            if fresh is not None:
+                self._count('recomputes')
+                self._store(key, fresh, max_entries)
+            return fresh, 'miss'
+        finally:
+            self._release(key, key_lock)
+
+
+report_cache = ReportCache()
+
+
+def cached_report(*tags):
+    """Decorator caching a report view's JSON response per args and role
+
+    Place it below the auth decorators so permission checks always run.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = (
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+                session.get('user_role')
+            )
+
+            uncached = {}
+
+            def compute(generations):
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    uncached['response'] = response
+                    return None
+                return _Entry(response.get_data(), response.status_code,
+                              response.mimetype, time.monotonic(), generations)
+
+            entry, state = report_cache.get_or_compute(
+                key, tags, compute,
+                current_app.config.get('REPORT_CACHE_TTL', 60),
+                current_app.config.get('REPORT_CACHE_STALE_TTL', 600),
+                current_app.config.get('REPORT_CACHE_MAX_ENTRIES', 500)
+            )
+            if entry is None:
+                return uncached['response']
+
+            response = current_app.response_class(entry.body, status=entry.status,
+                                                   mimetype=entry.mimetype)
+            response.headers['X-Report-Cache'] = state
+            return response
+        return decorated_function
+    return decorator
+
+
+# ==================== INVALIDATION ====================
+def invalidate_on_commit(*tags):
+    """Invalidate `tags` once the current transaction commits (dropped on rollback)"""
+    db.session.info.setdefault('report_cache_tags', set()).update(tags)
+
+
+@requests_written.connect
+def _invalidate_on_request_write(app, **extra):
+    invalidate_on_commit('requests')
+
+
+@equipment_written.connect
+def _invalidate_on_equipment_write(app, **extra):
+    invalidate_on_commit('equipment')
+
+
+@teams_written.connect
+def _invalidate_on_team_write(app, **extra):
+    invalidate_on_commit('teams')
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop('report_cache_tags', None)
+    if tags:
+        report_cache.invalidate(*sorted(tags))
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back_tags(session):
+    session.info.pop('report_cache_tags', None)
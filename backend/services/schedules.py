@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Preventive Maintenance Schedules (lazy recurrence)
+
+A schedule only describes its occurrences: every N days, every N operating
+hours (projected at the expected hours_per_day), or an RRULE. Calendars
+expand the active schedules for just the visible range; fixed-interval
+occurrences are computed arithmetically from the range start and RRULEs are
+parsed once per schedule version and keep their own occurrence cache, so a
+year of thousands of schedules never walks their history.
+
+Real MaintenanceRequest rows are created by `materialize_schedules()` (cron)
+only SCHEDULE_HORIZON_DAYS ahead, a batch of schedules per transaction.
+Each schedule's generated_until watermark separates the two: occurrences up
+to it exist as requests, later ones are virtual. A new schedule starts
+generating from now, not from a start date in the past.
+"""
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from dateutil.rrule import rrulestr
+from sqlalchemy import false, func, or_, select, update
+from backend.models import (db, Equipment, EquipmentCategory, MaintenanceRequest, MaintenanceSchedule,
+                            MaintenanceStage, MaintenanceTeam, SCHEDULE_KINDS)
+from backend.signals import emit_requests_written
+from backend.services.changes import next_change_seq
+from backend.services.dates import parse_datetime
+
+SCHEDULE_HORIZON_DAYS = 14
+SCHEDULE_BATCH_SIZE = 200
+MAX_OCCURRENCES = 1000       # per schedule and expansion (guards hourly rules over long ranges)
+PRIORITIES = ('low', 'normal', 'high', 'urgent')
+
+_TICK = timedelta(microseconds=1)
+_RULE_CACHE_SIZE = 4096
+_rules = {}
+
+
+# ==================== VALIDATION ====================
+def _parse_rule(text, starts_at):
+    return rrulestr(text, dtstart=starts_at, cache=True)
+
+
+def parse_schedule(data, schedule=None):
+    """Validated column values for a new schedule, or changes to `schedule`
+
+    Raises ValueError with a user message.
+    """
+    data = data or {}
+    current = schedule.to_dict() if schedule else {}
+    merged = {**current, **data}
+    values = {}
+
+    name = (merged.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    values['name'] = name[:200]
+    values['description'] = merged.get('description')
+
+    equipment_id, category_id = merged.get('equipment_id'), merged.get('category_id')
+    if bool(equipment_id) == bool(category_id):
+        raise ValueError('Give exactly one of equipment_id or category_id')
+    if equipment_id and not db.session.get(Equipment, equipment_id):
+        raise ValueError(f'Unknown equipment {equipment_id}')
+    if category_id and not db.session.get(EquipmentCategory, category_id):
+        raise ValueError(f'Unknown category {category_id}')
+    values['equipment_id'], values['category_id'] = equipment_id or None, category_id or None
+
+    team_id = merged.get('team_id')
+    if team_id and not db.session.get(MaintenanceTeam, team_id):
+        raise ValueError(f'Unknown team {team_id}')
+    values['team_id'] = team_id or None
+
+    kind = merged.get('kind') or 'interval_days'
+    if kind not in SCHEDULE_KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(SCHEDULE_KINDS)}")
+    values['kind'] = kind
+
+    if not merged.get('starts_at'):
+        raise ValueError('starts_at is required')
+    values['starts_at'] = parse_datetime(merged['starts_at'], 'starts_at')
+    values['ends_at'] = parse_datetime(merged['ends_at'], 'ends_at') if merged.get('ends_at') else None
+    if values['ends_at'] and values['ends_at'] <= values['starts_at']:
+        raise ValueError('ends_at must be after starts_at')
+
+    values['interval_days'] = values['operating_hours'] = values['rrule'] = None
+    values['hours_per_day'] = merged.get('hours_per_day') or 8.0
+    try:
+        if kind == 'interval_days':
+            values['interval_days'] = int(merged.get('interval_days'))
+            if values['interval_days'] < 1:
+                raise ValueError
+        elif kind == 'operating_hours':
+            values['operating_hours'] = float(merged.get('operating_hours'))
+            values['hours_per_day'] = float(values['hours_per_day'])
+            if values['operating_hours'] <= 0 or not 0 < values['hours_per_day'] <= 24:
+                raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError('interval_days must be a positive integer' if kind == 'interval_days' else
+                         'operating_hours must be positive and hours_per_day between 0 and 24')
+    if kind == 'rrule':
+        text = (merged.get('rrule') or '').strip()
+        try:
+            _parse_rule(text, values['starts_at'])
+        except (TypeError, ValueError, KeyError):
+            raise ValueError('rrule must be an RFC 5545 rule, e.g. FREQ=WEEKLY;BYDAY=MO')
+        values['rrule'] = text[:500]
+
+    priority = merged.get('priority') or 'normal'
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+    values['priority'] = priority
+    values['duration_hours'] = merged.get('duration_hours')
+    values['is_active'] = bool(merged.get('is_active', True))
+    return values
+
+
+# ==================== EXPANSION ====================
+def _rule(schedule):
+    """Parsed RRULE of a schedule version (its occurrence cache is reused)"""
+    key = (schedule.id, schedule.rrule, schedule.starts_at)
+    rule = _rules.get(key)
+    if rule is None:
+        if len(_rules) >= _RULE_CACHE_SIZE:
+            _rules.clear()
+        rule = _rules[key] = _parse_rule(schedule.rrule, schedule.starts_at)
+    return rule
+
+
+def _step(schedule):
+    """Fixed gap between occurrences (None for RRULE schedules)"""
+    if schedule.kind == 'interval_days':
+        return timedelta(days=schedule.interval_days)
+    if schedule.kind == 'operating_hours':
+        return timedelta(days=schedule.operating_hours / (schedule.hours_per_day or 8.0))
+    return None
+
+
+def _pending_after(schedule, now):
+    """Occurrences after this point are not requests yet"""
+    if schedule.generated_until:
+        return schedule.generated_until
+    return max(schedule.starts_at, now) - _TICK
+
+
+def occurrences(schedule, start, end, now=None):
+    """Pending (not yet generated) occurrence datetimes in [start, end)"""
+    after = _pending_after(schedule, now or datetime.utcnow())
+    lower = max(start, after + _TICK)
+    upper = min(end, schedule.ends_at + _TICK) if schedule.ends_at else end
+    if lower >= upper:
+        return []
+
+    step = _step(schedule)
+    if step is None:
+        found = []
+        for when in _rule(schedule).xafter(lower, inc=True):
+            if when >= upper or len(found) >= MAX_OCCURRENCES:
+                break
+            found.append(when)
+        return found
+
+    first = max(0, math.ceil((lower - schedule.starts_at) / step))
+    found = []
+    when = schedule.starts_at + first * step
+    while when < upper and len(found) < MAX_OCCURRENCES:
+        found.append(when)
+        first += 1
+        when = schedule.starts_at + first * step
+    return found
+
+
+def _targets(schedules):
+    """schedule id -> equipment rows (id, name, default_team_id) it applies to"""
+    equipment_ids = {s.equipment_id for s in schedules if s.equipment_id}
+    category_ids = {s.category_id for s in schedules if s.category_id and not s.equipment_id}
+    if not (equipment_ids or category_ids):
+        return {}
+    rows = db.session.execute(select(
+        Equipment.id, Equipment.name, Equipment.category_id, Equipment.default_team_id
+    ).where(
+        func.coalesce(Equipment.is_scrapped, false()) == false(),
+        or_(Equipment.id.in_(equipment_ids), Equipment.category_id.in_(category_ids))
+    ).order_by(Equipment.id)).all()
+
+    by_id = {row.id: row for row in rows}
+    by_category = {}
+    for row in rows:
+        by_category.setdefault(row.category_id, []).append(row)
+    return {
+        s.id: ([by_id[s.equipment_id]] if s.equipment_id in by_id else []) if s.equipment_id
+        else by_category.get(s.category_id, [])
+        for s in schedules
+    }
+
+
+def _pending(start, end, team_id, now):
+    """(schedule, matching equipment rows, dates) for every active schedule with
+    pending occurrences in [start, end)"""
+    schedules = MaintenanceSchedule.query.filter(
+        MaintenanceSchedule.is_active.is_(True),
+        MaintenanceSchedule.starts_at < end,
+        or_(MaintenanceSchedule.ends_at.is_(None), MaintenanceSchedule.ends_at >= start),
+        or_(MaintenanceSchedule.generated_until.is_(None), MaintenanceSchedule.generated_until < end)
+    ).all()
+    if not schedules:
+        return
+
+    targets = _targets(schedules)
+    for schedule in schedules:
+        equipment = [
+            row for row in targets.get(schedule.id, [])
+            if not team_id or (schedule.team_id or row.default_team_id) == team_id
+        ]
+        if not equipment:
+            continue
+        dates = occurrences(schedule, start, end, now)
+        if dates:
+            yield schedule, equipment, dates
+
+
+def expand_schedules(start, end, team_id=None, now=None):
+    """Virtual occurrences of every active schedule in [start, end), in date order"""
+    team_names = None
+    found = []
+    for schedule, equipment, dates in _pending(start, end, team_id, now or datetime.utcnow()):
+        if team_names is None:
+            team_names = dict(db.session.query(MaintenanceTeam.id, MaintenanceTeam.name))
+        duration = float(schedule.duration_hours) if schedule.duration_hours else None
+        for row in equipment:
+            team = schedule.team_id or row.default_team_id
+            for when in dates:
+                found.append({
+                    'id': f'schedule-{schedule.id}-{row.id}-{when:%Y%m%d%H%M}',
+                    'schedule_id': schedule.id,
+                    'name': schedule.name,
+                    'scheduled_date': when,
+                    'priority': schedule.priority,
+                    'equipment_id': row.id,
+                    'equipment_name': row.name,
+                    'team_id': team,
+                    'team_name': team_names.get(team),
+                    'duration_hours': duration
+                })
+    found.sort(key=lambda o: (o['scheduled_date'], o['id']))
+    return found
+
+
+def schedule_day_counts(start, end, team_id=None, now=None):
+    """Virtual occurrences in [start, end) counted per (date, priority)
+
+    For zoomed-out calendars: no per-occurrence rows are built.
+    """
+    counts = Counter()
+    for schedule, equipment, dates in _pending(start, end, team_id, now or datetime.utcnow()):
+        for when in dates:
+            counts[when.date(), schedule.priority] += len(equipment)
+    return counts
+
+
+# ==================== MATERIALIZATION ====================
+def materialize_schedules(horizon_days=SCHEDULE_HORIZON_DAYS, batch_size=SCHEDULE_BATCH_SIZE, now=None):
+    """Create requests for occurrences up to now + horizon_days; returns the count
+
+    Works through the due schedules batch_size at a time. Each batch's
+    requests and watermarks are written, announced and committed together.
+    """
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(days=horizon_days)
+    default_stage = MaintenanceStage.query.order_by(MaintenanceStage.sequence).first()
+    next_number = int(MaintenanceRequest.generate_reference().split('-')[1])
+    created, last_id = 0, 0
+
+    while True:
+        schedules = MaintenanceSchedule.query.filter(
+            MaintenanceSchedule.is_active.is_(True),
+            MaintenanceSchedule.starts_at <= horizon,
+            or_(MaintenanceSchedule.generated_until.is_(None), MaintenanceSchedule.generated_until < horizon),
+            MaintenanceSchedule.id > last_id
+        ).order_by(MaintenanceSchedule.id).limit(batch_size).all()
+        if not schedules:
+            break
+        last_id = schedules[-1].id
+
+        targets = _targets(schedules)
+        requests = []
+        for schedule in schedules:
+            for when in occurrences(schedule, schedule.starts_at, horizon + _TICK, now):
+                for row in targets.get(schedule.id, []):
+                    requests.append(MaintenanceRequest(
+                        reference=f'MR-{next_number:05d}',
+                        name=schedule.name,
+                        description=schedule.description,
+                        equipment_id=row.id,
+                        team_id=schedule.team_id or row.default_team_id,
+                        stage_id=default_stage.id if default_stage else None,
+                        schedule_id=schedule.id,
+                        request_type='preventive',
+                        priority=schedule.priority,
+                        requester_name='Preventive schedule',
+                        request_date=now,
+                        scheduled_date=when
+                    ))
+                    next_number += 1
+            schedule.generated_until = horizon
+
+        if requests:
+            db.session.add_all(requests)
+            # Receivers read each request's equipment and team: load them in
+            # two queries so the lazy loads hit the identity map
+            Equipment.query.filter(Equipment.id.in_({r.equipment_id for r in requests})).all()
+            MaintenanceTeam.query.filter(MaintenanceTeam.id.in_({r.team_id for r in requests if r.team_id})).all()
+            emit_requests_written('create', requests)
+        db.session.commit()
+        created += len(requests)
+    return created
+
+
+def detach_schedule_requests(schedule):
+    """Keep generated requests when their schedule is deleted"""
+    db.session.execute(
+        update(MaintenanceRequest).where(MaintenanceRequest.schedule_id == schedule.id).values(
+            schedule_id=None, change_seq=next_change_seq(db.session)),
+        execution_options={'synchronize_session': False}
+    )
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+Technician Shifts and Availability
+
+Technicians work in shift records and are away in leave records, either
+single intervals or recurring ones (RRULE, daily or coarser). Availability
+for [start, end) is the union of shift occurrences minus leave; a
+technician without any shift is never "on shift".
+
+Records live in memory in one interval tree per team, keyed on each
+record's span (first start to the end of its last occurrence, open-ended
+when it repeats forever). A range query walks only the subtrees that can
+overlap, O(log n + k), and then expands the k matching records inside the
+range, so years of one-off shifts and leave never slow a lookup down. The
+index follows the /api/changes sequence like the technician matching index:
+shift writes re-stamp their technician, so only technicians stamped since
+the last sync are reloaded and only their teams' trees are rebuilt.
+"""
+import threading
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from dateutil.rrule import rrulestr, HOURLY
+from flask import current_app
+from sqlalchemy import select
+from backend.models import db, ChangeTombstone, MaintenanceRequest, Technician, TechnicianShift, SHIFT_KINDS
+from backend.services.changes import change_counter
+from backend.services.dates import parse_datetime
+
+AVAILABILITY_MAX_DAYS = 92
+SHIFT_MAX_HOURS = 24 * 31
+
+_OPEN_ENDED = datetime.max
+_RULE_CACHE_SIZE = 4096
+_rules = {}
+
+ShiftRecord = namedtuple('ShiftRecord', 'id technician_id kind starts_at ends_at rrule until span_end')
+
+
+# ==================== VALIDATION ====================
+def _parse_rule(text, starts_at):
+    return rrulestr(text, dtstart=starts_at, cache=True)
+
+
+def parse_shift(data, shift=None):
+    """Validated column values for a new shift, or changes to `shift`
+
+    Raises ValueError with a user message.
+    """
+    merged = {**(shift.to_dict() if shift else {}), **(data or {})}
+    values = {}
+
+    kind = merged.get('kind') or 'shift'
+    if kind not in SHIFT_KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(SHIFT_KINDS)}")
+    values['kind'] = kind
+
+    if not merged.get('starts_at') or not merged.get('ends_at'):
+        raise ValueError('starts_at and ends_at are required')
+    values['starts_at'] = parse_datetime(merged['starts_at'], 'starts_at')
+    values['ends_at'] = parse_datetime(merged['ends_at'], 'ends_at')
+    if values['ends_at'] <= values['starts_at']:
+        raise ValueError('ends_at must be after starts_at')
+    if values['ends_at'] - values['starts_at'] > timedelta(hours=SHIFT_MAX_HOURS):
+        raise ValueError(f'A shift or leave occurrence cannot exceed {SHIFT_MAX_HOURS // 24} days')
+
+    text = (merged.get('rrule') or '').strip()
+    values['rrule'] = None
+    if text:
+        try:
+            rule = _parse_rule(text, values['starts_at'])
+        except (TypeError, ValueError, KeyError):
+            raise ValueError('rrule must be an RFC 5545 rule, e.g. FREQ=WEEKLY;BYDAY=MO,TU,WE')
+        if getattr(rule, '_freq', None) is not None and rule._freq >= HOURLY:
+            raise ValueError('rrule must repeat daily or less often')
+        values['rrule'] = text[:500]
+    values['until'] = parse_datetime(merged['until'], 'until') if merged.get('until') else None
+    if values['until'] and values['until'] <= values['starts_at']:
+        raise ValueError('until must be after starts_at')
+    values['note'] = (merged.get('note') or '')[:200] or None
+    return values
+
+
+def parse_range(args, default_days=7):
+    """(start, end) datetimes from `start`/`end` query args (dates or datetimes)
+
+    Raises ValueError with a user message.
+    """
+    today = datetime.combine(datetime.utcnow().date(), time())
+    start = parse_datetime(args['start'], 'start') if args.get('start') else today
+    end = parse_datetime(args['end'], 'end') if args.get('end') else start + timedelta(days=default_days)
+    if end <= start:
+        raise ValueError('end must be after start')
+    if end - start > timedelta(days=AVAILABILITY_MAX_DAYS):
+        raise ValueError(f'The range cannot exceed {AVAILABILITY_MAX_DAYS} days')
+    return start, end
+
+
+# ==================== INTERVALS ====================
+class IntervalTree:
+    """Static interval tree over (start, end, item) tuples
+
+    A balanced binary tree laid out over the intervals sorted by start; each
+    node keeps the latest end in its subtree, so overlap queries skip every
+    subtree that ends before the range. Built in O(n log n).
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda i: i[0])
+        self._starts = [i[0] for i in intervals]
+        self._ends = [i[1] for i in intervals]
+        self._items = [i[2] for i in intervals]
+        self._max_end = [None] * len(intervals)
+        self._build(0, len(intervals))
+
+    def __len__(self):
+        return len(self._items)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return datetime.min
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self._ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self._max_end[mid]
+
+    def overlapping(self, start, end):
+        """Items whose interval overlaps [start, end)"""
+        found, stack = [], [(0, len(self._items))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] <= start:
+                continue
+            stack.append((lo, mid))
+            if self._starts[mid] < end:
+                if self._ends[mid] > start:
+                    found.append(self._items[mid])
+                stack.append((mid + 1, hi))
+        return found
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(intervals, removed):
+    """Merged `intervals` minus merged `removed`"""
+    result, i = [], 0
+    for start, end in intervals:
+        while i < len(removed) and removed[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(removed) and removed[j][0] < end:
+            if removed[j][0] > start:
+                result.append((start, removed[j][0]))
+            start = max(start, removed[j][1])
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def _clip(intervals, start, end):
+    return [(max(s, start), min(e, end)) for s, e in intervals if s < end and e > start]
+
+
+def _hours_by_day(intervals, day_starts):
+    """Hours of `intervals` falling on each day of `day_starts` (consecutive midnights)"""
+    hours = [0.0] * len(day_starts)
+    for start, end in intervals:
+        day = max((start - day_starts[0]).days, 0)
+        while day < len(day_starts) and day_starts[day] < end:
+            day_end = day_starts[day] + timedelta(days=1)
+            overlap = min(end, day_end) - max(start, day_starts[day])
+            if overlap > timedelta(0):
+                hours[day] += overlap.total_seconds() / 3600
+            day += 1
+    return hours
+
+
+# ==================== INDEX ====================
+def _span_end(row):
+    if not row.rrule:
+        return row.ends_at
+    if row.until:
+        return row.until + (row.ends_at - row.starts_at)
+    return _OPEN_ENDED
+
+
+def _record(row):
+    return ShiftRecord(row.id, row.technician_id, row.kind, row.starts_at, row.ends_at,
+                       row.rrule, row.until, _span_end(row))
+
+
+def _rule(record):
+    """Parsed RRULE of a record version (its occurrence cache is reused)"""
+    key = (record.id, record.rrule, record.starts_at)
+    rule = _rules.get(key)
+    if rule is None:
+        if len(_rules) >= _RULE_CACHE_SIZE:
+            _rules.clear()
+        rule = _rules[key] = _parse_rule(record.rrule, record.starts_at)
+    return rule
+
+
+def _occurrences(record, start, end):
+    """(start, end) occurrences of a record overlapping [start, end)"""
+    if not record.rrule:
+        return [(record.starts_at, record.ends_at)]
+    duration = record.ends_at - record.starts_at
+    return [(s, s + duration) for s in _rule(record).between(start - duration, end)
+            if not record.until or s < record.until]
+
+
+class ShiftIndex:
+    """Shift and leave records of active technicians, one interval tree per team"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._synced = None           # (change counter value, reset_seq)
+        self._technicians = {}        # id -> (name, team_id)
+        self._records = {}            # technician id -> [ShiftRecord]
+        self._trees = {}              # team id (None: no team) -> IntervalTree
+        self._stale = set()           # teams whose tree must be rebuilt
+
+    # -------------------- sync --------------------
+    def sync(self):
+        """Catch up with writes since the last sync; returns {team_id: IntervalTree}"""
+        counter = change_counter()
+        with self._lock:
+            if self._synced is None or counter[1] != self._synced[1] or counter[0] < self._synced[0]:
+                self._rebuild()
+            elif counter[0] > self._synced[0]:
+                self._apply_changes(self._synced[0], counter[0])
+            self._synced = counter
+            if self._stale:
+                trees = dict(self._trees)
+                for team_id in self._stale:
+                    intervals = [(r.starts_at, r.span_end, r)
+                                 for technician_id, (_, team) in self._technicians.items() if team == team_id
+                                 for r in self._records.get(technician_id, ())]
+                    if intervals:
+                        trees[team_id] = IntervalTree(intervals)
+                    else:
+                        trees.pop(team_id, None)
+                self._trees, self._stale = trees, set()
+            return self._trees
+
+    def invalidate(self):
+        with self._lock:
+            self._synced = None
+
+    def technician(self, technician_id):
+        """(name, team_id) of an active technician, or None"""
+        return self._technicians.get(technician_id)
+
+    def _load_records(self, technician_ids=None):
+        statement = select(
+            TechnicianShift.id, TechnicianShift.technician_id, TechnicianShift.kind, TechnicianShift.starts_at,
+            TechnicianShift.ends_at, TechnicianShift.rrule, TechnicianShift.until
+        ).join(Technician, Technician.id == TechnicianShift.technician_id).where(Technician.is_active.is_(True))
+        if technician_ids is not None:
+            statement = statement.where(TechnicianShift.technician_id.in_(technician_ids))
+        records = {}
+        for row in db.session.execute(statement):
+            records.setdefault(row.technician_id, []).append(_record(row))
+        return records
+
+    def _rebuild(self):
+        self._technicians = {
+            row.id: (row.name, row.team_id)
+            for row in db.session.execute(select(Technician.id, Technician.name, Technician.team_id)
+                                          .where(Technician.is_active.is_(True)))
+        }
+        self._records = self._load_records()
+        self._trees = {}
+        self._stale = {team_id for _, team_id in self._technicians.values()}
+
+    def _drop(self, technician_id):
+        previous = self._technicians.pop(technician_id, None)
+        if previous is not None:
+            self._stale.add(previous[1])
+        self._records.pop(technician_id, None)
+
+    def _apply_changes(self, since, upto):
+        active = []
+        for row in db.session.execute(select(
+            Technician.id, Technician.name, Technician.team_id, Technician.is_active
+        ).where(Technician.change_seq > since, Technician.change_seq <= upto)):
+            self._drop(row.id)
+            if row.is_active:
+                self._technicians[row.id] = (row.name, row.team_id)
+                self._stale.add(row.team_id)
+                active.append(row.id)
+        if active:
+            self._records.update(self._load_records(active))
+
+        for technician_id, in db.session.execute(select(ChangeTombstone.entity_id).where(
+            ChangeTombstone.change_seq > since, ChangeTombstone.change_seq <= upto,
+            ChangeTombstone.entity == 'technicians'
+        )):
+            self._drop(technician_id)
+
+
+shift_index = ShiftIndex()
+
+
+# ==================== QUERIES ====================
+def working_intervals(start, end, team_id=None, technician_ids=None):
+    """{technician_id: merged working intervals inside [start, end)}: shifts minus leave"""
+    trees = shift_index.sync()
+    if team_id is None:
+        selected = list(trees.values())
+    else:
+        selected = [trees[team_id]] if team_id in trees else []
+
+    occurrences = {}
+    for tree in selected:
+        for record in tree.overlapping(start, end):
+            if technician_ids is not None and record.technician_id not in technician_ids:
+                continue
+            kinds = occurrences.setdefault(record.technician_id, {'shift': [], 'leave': []})
+            kinds[record.kind].extend(_occurrences(record, start, end))
+
+    working = {}
+    for technician_id, kinds in occurrences.items():
+        intervals = _subtract(_merge(_clip(kinds['shift'], start, end)), _merge(kinds['leave']))
+        if intervals:
+            working[technician_id] = intervals
+    return working
+
+
+def on_shift(technician_ids, start, end):
+    """Ids of `technician_ids` working the whole of [start, end)"""
+    working = working_intervals(start, end, technician_ids=set(technician_ids))
+    return {technician_id for technician_id, intervals in working.items()
+            if intervals[0][0] <= start and intervals[0][1] >= end}
+
+
+def available_technicians(start, end, team_id=None):
+    """Technicians working the whole of [start, end), by name"""
+    available = []
+    for technician_id, intervals in working_intervals(start, end, team_id).items():
+        if intervals[0][0] <= start and intervals[0][1] >= end:
+            name, team = shift_index.technician(technician_id) or (None, None)
+            available.append({'technician_id': technician_id, 'name': name, 'team_id': team})
+    return sorted(available, key=lambda t: (t['name'] or '', t['technician_id']))
+
+
+def capacity_by_day(start, end, team_id=None):
+    """Per day of [start, end): technicians on shift, shift, booked and free hours
+
+    Booked time is open requests scheduled on a technician (duration_hours,
+    else SCHEDULER_DEFAULT_DURATION_HOURS) that falls inside their shifts.
+    """
+    first_day = datetime.combine(start.date(), time())
+    day_starts = []
+    while first_day + timedelta(days=len(day_starts)) < end:
+        day_starts.append(first_day + timedelta(days=len(day_starts)))
+    working = working_intervals(start, end, team_id)
+
+    default_hours = float(current_app.config.get('SCHEDULER_DEFAULT_DURATION_HOURS', 2))
+    bookings = {}
+    if working:
+        for row in db.session.execute(select(
+            MaintenanceRequest.technician_id, MaintenanceRequest.scheduled_date, MaintenanceRequest.duration_hours
+        ).where(
+            MaintenanceRequest.technician_id.in_(list(working)), MaintenanceRequest.is_open.is_(True),
+            MaintenanceRequest.scheduled_date >= start - timedelta(hours=SHIFT_MAX_HOURS),
+            MaintenanceRequest.scheduled_date < end
+        )):
+            hours = float(row.duration_hours) if row.duration_hours else default_hours
+            bookings.setdefault(row.technician_id, []).append(
+                (row.scheduled_date, row.scheduled_date + timedelta(hours=hours)))
+
+    on_shift_count = [0] * len(day_starts)
+    shift_hours = [0.0] * len(day_starts)
+    free_hours = [0.0] * len(day_starts)
+    for technician_id, intervals in working.items():
+        for day, hours in enumerate(_hours_by_day(intervals, day_starts)):
+            if hours:
+                on_shift_count[day] += 1
+                shift_hours[day] += hours
+        free = _subtract(intervals, _merge(bookings.get(technician_id, ())))
+        for day, hours in enumerate(_hours_by_day(free, day_starts)):
+            free_hours[day] += hours
+
+    return [{
+        'date': day.date().isoformat(),
+        'on_shift': on_shift_count[i],
+        'shift_hours': round(shift_hours[i], 2),
+        'booked_hours': round(shift_hours[i] - free_hours[i], 2),
+        'free_hours': round(free_hours[i], 2)
+    } for i, day in enumerate(day_starts)]
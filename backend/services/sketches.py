@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+Quantile Sketches for Request Times
+
+Percentile SLAs (p50/p90/p95 resolution time per team and priority) read
+request_time_sketches: one merging t-digest per metric x month x team x
+priority. Digests merge losslessly enough for any roll-up, so a p95 over a
+team's last year merges twelve small digests instead of sorting every request.
+
+Metrics:
+    resolution - hours from request_date to completed_date, by completion month
+    response   - hours from creation to the first stage change, by creation
+                 month (requests whose transitions go back to their creation)
+
+Completing a request adds its time to the digest of its cell; the stage
+transition receiver adds a request's response time when it records the first
+move. Digests cannot forget values, so edits to completed requests (reopen,
+re-date, re-team) and deletes recompute the affected cells from
+maintenance_request and request_stage_transition instead.
+"""
+import json
+import math
+from datetime import date, datetime
+from sqlalchemy import func, select
+from backend.models import db, MaintenanceRequest, RequestStageTransition, RequestTimeSketch
+from backend.signals import requests_written, request_snapshot
+
+SKETCH_METRICS = ('resolution', 'response')
+SKETCH_DIMENSIONS = ('team_id', 'priority', 'month')
+DIGEST_COMPRESSION = 100
+
+
+class TDigest:
+    """Merging t-digest (Dunning) with the arcsine scale function
+
+    Centroids are (mean, weight) pairs; about DIGEST_COMPRESSION of them are
+    kept, more densely near the tails so high percentiles stay accurate.
+    """
+
+    def __init__(self, compression=DIGEST_COMPRESSION, centroids=(), minimum=None, maximum=None):
+        self.compression = compression
+        self.centroids = [tuple(c) for c in centroids]
+        self.minimum = minimum
+        self.maximum = maximum
+        self._buffer = []
+
+    @property
+    def count(self):
+        return sum(w for _, w in self.centroids) + sum(w for _, w in self._buffer)
+
+    def add(self, value, weight=1):
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        """Fold another digest into this one"""
+        if other.minimum is None:
+            return self
+        self._buffer.extend(other.centroids)
+        self._buffer.extend(other._buffer)
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        if len(self._buffer) >= 5 * self.compression:
+            self.compress()
+        return self
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _q(self, k):
+        return (math.sin(min(k, self.compression / 4) * 2 * math.pi / self.compression) + 1) / 2
+
+    def compress(self):
+        if not self._buffer:
+            return
+        items = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in items)
+
+        merged = []
+        mean, weight = items[0]
+        so_far = 0
+        q_limit = self._q(self._k(0) + 1)
+        for item_mean, item_weight in items[1:]:
+            if (so_far + weight + item_weight) / total <= q_limit:
+                weight += item_weight
+                mean += (item_mean - mean) * item_weight / weight
+            else:
+                merged.append((mean, weight))
+                so_far += weight
+                q_limit = self._q(self._k(so_far / total) + 1)
+                mean, weight = item_mean, item_weight
+        merged.append((mean, weight))
+        self.centroids = merged
+
+    def quantile(self, q):
+        """Estimated value at quantile q (0..1), None when empty"""
+        self.compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        centroids = self.centroids
+        total = sum(w for _, w in centroids)
+        target = q * total
+
+        first_mean, first_weight = centroids[0]
+        if target < first_weight / 2:
+            return self.minimum + (first_mean - self.minimum) * target / (first_weight / 2)
+
+        so_far = 0
+        for (left_mean, left_weight), (right_mean, right_weight) in zip(centroids, centroids[1:]):
+            left_center = so_far + left_weight / 2
+            right_center = so_far + left_weight + right_weight / 2
+            if target <= right_center:
+                share = (target - left_center) / (right_center - left_center)
+                return left_mean + (right_mean - left_mean) * share
+            so_far += left_weight
+
+        last_mean, last_weight = centroids[-1]
+        share = (target - (total - last_weight / 2)) / (last_weight / 2)
+        return last_mean + (self.maximum - last_mean) * min(share, 1.0)
+
+    def to_json(self):
+        self.compress()
+        return json.dumps({
+            'c': [[round(m, 4), w] for m, w in self.centroids],
+            'min': self.minimum,
+            'max': self.maximum
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, payload):
+        data = json.loads(payload) if payload else {}
+        return cls(centroids=data.get('c', ()), minimum=data.get('min'), maximum=data.get('max'))
+
+
+# ==================== WRITERS ====================
+def _month(value):
+    return date(value.year, value.month, 1)
+
+
+def resolution_cell(snapshot):
+    """((metric, month, team_id, priority), hours) or None for open requests"""
+    completed, requested = snapshot['completed_date'], snapshot['request_date']
+    if not completed or not requested:
+        return None
+    hours = max((completed - requested).total_seconds() / 3600, 0.0)
+    return ('resolution', _month(completed), snapshot['team_id'], snapshot['priority']), hours
+
+
+def response_cell(snapshot):
+    """Response cell of a request (its creation month, team and priority)"""
+    if not snapshot['created_at']:
+        return None
+    return 'response', _month(snapshot['created_at']), snapshot['team_id'], snapshot['priority']
+
+
+def _insert_cell(cell):
+    """Insert an empty digest for `cell` unless a concurrent writer already has"""
+    metric, month, team_id, priority = cell
+    values = dict(metric=metric, month=month, team_id=team_id, priority=priority,
+                  count=0, total=0, payload=TDigest().to_json())
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        db.session.add(RequestTimeSketch(**values))
+        db.session.flush()
+        return
+    db.session.execute(insert(RequestTimeSketch).values(**values).on_conflict_do_nothing())
+
+
+def _sketch_row(cell, create=False):
+    metric, month, team_id, priority = cell
+    query = RequestTimeSketch.query.filter_by(
+        metric=metric, month=month, team_id=team_id, priority=priority
+    ).with_for_update()
+    row = query.first()
+    if row is None and create:
+        # Two first writers of a cell: one inserts, both then lock the same row
+        _insert_cell(cell)
+        row = query.first()
+    return row
+
+
+def add_to_sketches(values_by_cell):
+    """Add {cell: [hours, ...]} to the stored digests"""
+    for cell, values in values_by_cell.items():
+        row = _sketch_row(cell, create=True)
+        digest = TDigest.from_json(row.payload)
+        for value in values:
+            digest.add(value)
+        row.count = (row.count or 0) + len(values)
+        row.total = (row.total or 0) + sum(values)
+        row.payload = digest.to_json()
+
+
+def _store(cell, values):
+    """Replace a cell's digest with one built from `values` (drop it when empty)"""
+    if not values:
+        row = _sketch_row(cell)
+        if row is not None:
+            db.session.delete(row)
+        return
+    row = _sketch_row(cell, create=True)
+    digest = TDigest()
+    for value in values:
+        digest.add(value)
+    row.count = len(values)
+    row.total = sum(values)
+    row.payload = digest.to_json()
+
+
+def _completed_requests():
+    return db.session.query(
+        MaintenanceRequest.team_id,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.request_date,
+        MaintenanceRequest.completed_date
+    ).filter(
+        MaintenanceRequest.completed_date.isnot(None),
+        MaintenanceRequest.request_date.isnot(None)
+    )
+
+
+def _responded_requests():
+    """(team_id, priority, created_at, created, first_moved) of requests whose
+    history starts at creation and that have left their first stage"""
+    t = RequestStageTransition
+    # Correlated per request, so a cell rebuild reads only its requests' transitions
+    created = select(func.min(t.at)).where(
+        t.request_id == MaintenanceRequest.id, t.action == 'create').scalar_subquery()
+    first_moved = select(func.min(t.at)).where(
+        t.request_id == MaintenanceRequest.id, t.from_stage_id.isnot(None)).scalar_subquery()
+    return db.session.query(
+        MaintenanceRequest.team_id,
+        MaintenanceRequest.priority,
+        MaintenanceRequest.created_at,
+        created,
+        first_moved
+    ).filter(created.isnot(None), first_moved.isnot(None))
+
+
+def _values_by_cell(rows):
+    values = {}
+    for team_id, priority, request_date, completed_date in rows:
+        cell, hours = resolution_cell({'team_id': team_id, 'priority': priority,
+                                       'request_date': request_date,
+                                       'completed_date': completed_date})
+        values.setdefault(cell, []).append(hours)
+    return values
+
+
+def _response_values_by_cell(rows):
+    values = {}
+    for team_id, priority, created_at, created, first_moved in rows:
+        cell = response_cell({'team_id': team_id, 'priority': priority, 'created_at': created_at})
+        if cell is not None:
+            values.setdefault(cell, []).append(max((first_moved - created).total_seconds() / 3600, 0.0))
+    return values
+
+
+def rebuild_cells(cells):
+    """Recompute the given cells from maintenance_request (and its stage transitions)"""
+    from backend.services.facts import next_month
+    for cell in cells:
+        metric, month, team_id, priority = cell
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(next_month(month), datetime.min.time())
+        if metric == 'response':
+            rows = _responded_requests().filter(
+                MaintenanceRequest.created_at >= start,
+                MaintenanceRequest.created_at < end,
+                MaintenanceRequest.team_id == team_id,
+                MaintenanceRequest.priority == priority
+            )
+            _store(cell, _response_values_by_cell(rows).get(cell, []))
+            continue
+        rows = _completed_requests().filter(
+            MaintenanceRequest.completed_date >= start,
+            MaintenanceRequest.completed_date < end,
+            MaintenanceRequest.team_id == team_id,
+            MaintenanceRequest.priority == priority
+        )
+        _store(cell, _values_by_cell(rows).get(cell, []))
+
+
+def rebuild_all_sketches():
+    """Recompute every digest; returns the number of rows written"""
+    RequestTimeSketch.query.delete()
+    values = _values_by_cell(_completed_requests())
+    values.update(_response_values_by_cell(_responded_requests()))
+    for (metric, month, team_id, priority), cell_values in values.items():
+        digest = TDigest()
+        for value in cell_values:
+            digest.add(value)
+        db.session.add(RequestTimeSketch(
+            metric=metric, month=month, team_id=team_id, priority=priority,
+            count=len(cell_values), total=sum(cell_values), payload=digest.to_json()
+        ))
+    return len(values)
+
+
+@requests_written.connect
+def _update_request_sketches(app, action, requests, before, **extra):
+    """Add newly completed requests; recompute cells whose values changed"""
+    additions = {}
+    stale = set()
+    current = {req.id: resolution_cell(request_snapshot(req)) for req in requests}
+
+    for request_id, snapshot in before.items():
+        old = resolution_cell(snapshot)
+        if old is not None and current.get(request_id) != old:
+            stale.add(old[0])
+            if current.get(request_id):
+                stale.add(current[request_id][0])
+
+    for request_id, entry in current.items():
+        previous = before.get(request_id)
+        if entry is not None and (previous is None or resolution_cell(previous) is None):
+            additions.setdefault(entry[0], []).append(entry[1])
+
+    for cell in stale:
+        additions.pop(cell, None)
+    add_to_sketches(additions)
+    rebuild_cells(stale)
+
+
+def update_response_sketches(requests, before, first_moves):
+    """Add first-move response times; recompute response cells requests left
+
+    Called by the stage transition receiver once it has stored this write's
+    transitions. `first_moves` maps request ids to hours since creation.
+    """
+    additions = {}
+    stale = set()
+    current = {req.id: response_cell(request_snapshot(req)) for req in requests}
+
+    for request_id, snapshot in before.items():
+        old = response_cell(snapshot)
+        if old is not None and current.get(request_id) != old:
+            stale.add(old)
+            if current.get(request_id):
+                stale.add(current[request_id])
+
+    for request_id, hours in first_moves.items():
+        if current.get(request_id) is not None:
+            additions.setdefault(current[request_id], []).append(hours)
+
+    for cell in stale:
+        additions.pop(cell, None)
+    add_to_sketches(additions)
+    rebuild_cells(stale)
+
+
+# ==================== READERS ====================
+def quantile_label(q):
+    return 'p' + f'{q * 100:.10g}'.replace('.', '_')
+
+
+def sketch_percentiles(start, end, group_by=(), quantiles=(0.5, 0.9, 0.95),
+                       metric='resolution', team_id=None, priority=None):
+    """Merge digests for months in [start, end) per `group_by` dimensions
+
+    Returns dicts with the group dimensions, count, mean_hours and one
+    p<NN> key per requested quantile, largest groups first.
+    """
+    query = RequestTimeSketch.query.filter(
+        RequestTimeSketch.metric == metric,
+        RequestTimeSketch.month >= start,
+        RequestTimeSketch.month < end
+    )
+    if team_id is not None:
+        query = query.filter(RequestTimeSketch.team_id == team_id)
+    if priority is not None:
+        query = query.filter(RequestTimeSketch.priority == priority)
+
+    groups = {}
+    for row in query:
+        key = tuple(getattr(row, name) for name in group_by)
+        group = groups.setdefault(key, {'digest': TDigest(), 'count': 0, 'total': 0.0})
+        group['digest'].merge(TDigest.from_json(row.payload))
+        group['count'] += row.count
+        group['total'] += row.total
+
+    results = []
+    for key, group in groups.items():
+        item = dict(zip(group_by, key))
+        if 'month' in item:
+            item['month'] = item['month'].isoformat()
+        item['count'] = group['count']
+        item['mean_hours'] = round(group['total'] / group['count'], 2) if group['count'] else None
+        for q in quantiles:
+            value = group['digest'].quantile(q)
+            item[quantile_label(q)] = round(value, 2) if value is not None else None
+        results.append(item)
+    results.sort(key=lambda item: (-item['count'], [str(item[name]) for name in group_by]))
+    return results
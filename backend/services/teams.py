@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Team Serialization
+
+Serializes any number of teams in a fixed number of queries: members come
+from one IN query, open-request counts from one grouped COUNT on the
+(is_open, team_id) index, or from the open_requests_count counter column
+when TEAM_OPEN_COUNTS is 'column'.
+"""
+from flask import current_app
+from sqlalchemy import func, select
+from backend.models import db, MaintenanceRequest, MaintenanceTeam, TeamMember
+
+
+def team_open_counts(team_ids, source=None):
+    """{team_id: open requests} for `team_ids`"""
+    if not team_ids:
+        return {}
+    source = source or current_app.config.get('TEAM_OPEN_COUNTS', 'query')
+    if source == 'column':
+        counts = dict(db.session.execute(select(MaintenanceTeam.id, MaintenanceTeam.open_requests_count).where(
+            MaintenanceTeam.id.in_(team_ids))).all())
+        return {team_id: counts.get(team_id, 0) for team_id in team_ids}
+    counts = dict(db.session.execute(select(MaintenanceRequest.team_id, func.count()).where(
+        MaintenanceRequest.is_open.is_(True), MaintenanceRequest.team_id.in_(team_ids)
+    ).group_by(MaintenanceRequest.team_id)).all())
+    return {team_id: counts.get(team_id, 0) for team_id in team_ids}
+
+
+def serialize_teams(teams, open_counts=True):
+    """Team dicts with members (and open_requests unless open_counts is False)"""
+    team_ids = [team.id for team in teams]
+    members = {team_id: [] for team_id in team_ids}
+    if team_ids:
+        for member in TeamMember.query.filter(TeamMember.team_id.in_(team_ids)).order_by(TeamMember.id):
+            members[member.team_id].append(member)
+    counts = team_open_counts(team_ids) if open_counts else {}
+
+    result = []
+    for team in teams:
+        data = team.to_dict(members=members[team.id])
+        if open_counts:
+            data['open_requests'] = counts[team.id]
+        result.append(data)
+    return result
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Technician Directory Queries
+
+The technicians page loads from one overview: headline stats and facet
+counts (availability, skill, team) come from a single GROUP BY over active
+technicians, with the text search folded in as a CASE column so stats stay
+unfiltered while facets follow it. Each facet counts the technicians that
+match every other selected filter, so picking a team still shows how many
+of them have each skill. The list is keyset-paginated on (name, id) along
+the (is_active, name) index with teams joined in, so serializing a page
+never loads teams one by one.
+"""
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.orm import joinedload
+from backend.models import db, MaintenanceTeam, Technician, SKILL_TYPES, AVAILABILITY_STATUSES
+
+TECHNICIANS_PAGE_SIZE = 48
+TECHNICIANS_MAX_PAGE_SIZE = 200
+FACETS = ('availability', 'skill', 'team_id')
+
+
+def parse_technician_filters(args):
+    """search, skill, availability, team_id from query args; ValueError on bad values"""
+    availability = args.get('availability') or None
+    if availability and availability not in dict(AVAILABILITY_STATUSES):
+        raise ValueError(f'Unknown availability: {availability}')
+    team_id = args.get('team_id') or None
+    if team_id is not None:
+        try:
+            team_id = int(team_id)
+        except ValueError:
+            raise ValueError('team_id must be an integer')
+    return {
+        'search': (args.get('search') or '').strip() or None,
+        'skill': args.get('skill') or None,
+        'availability': availability,
+        'team_id': team_id
+    }
+
+
+def _search_clause(search):
+    pattern = f'%{search}%'
+    return or_(Technician.name.ilike(pattern), Technician.company_name.ilike(pattern),
+               Technician.skill.ilike(pattern))
+
+
+def _filtered(statement, filters):
+    statement = statement.where(Technician.is_active.is_(True))
+    if filters.get('search'):
+        statement = statement.where(_search_clause(filters['search']))
+    if filters.get('skill'):
+        statement = statement.where(Technician.skill == filters['skill'])
+    if filters.get('availability'):
+        statement = statement.where(Technician.availability_status == filters['availability'])
+    if filters.get('team_id'):
+        statement = statement.where(Technician.team_id == filters['team_id'])
+    return statement
+
+
+def technician_facets(filters):
+    """Unfiltered stats, per-facet counts and the filtered total from one GROUP BY"""
+    groups = [Technician.availability_status, Technician.skill, Technician.team_id]
+    if filters.get('search'):
+        groups.append(case((_search_clause(filters['search']), 1), else_=0).label('matches'))
+    rows = db.session.execute(select(*groups, func.count().label('count')).where(
+        Technician.is_active.is_(True)).group_by(*groups)).all()
+
+    stats = {'total': 0, 'available': 0, 'busy': 0, 'off_duty': 0}
+    facets = {facet: {} for facet in FACETS}
+    total = 0
+    for row in rows:
+        stats['total'] += row.count
+        if row.availability_status in stats:
+            stats[row.availability_status] += row.count
+        if filters.get('search') and not row.matches:
+            continue
+        values = {'availability': row.availability_status, 'skill': row.skill, 'team_id': row.team_id}
+        mismatched = [f for f in FACETS if filters.get(f) and values[f] != filters[f]]
+        if not mismatched:
+            total += row.count
+        for facet in FACETS:
+            # A facet ignores its own selection, so the other options keep their counts
+            if not mismatched or mismatched == [facet]:
+                facets[facet][values[facet]] = facets[facet].get(values[facet], 0) + row.count
+    return stats, facets, total
+
+
+def encode_cursor(name, technician_id):
+    return f'{name}_{technician_id}'
+
+
+def decode_cursor(cursor):
+    """Return (name, id) or raise ValueError"""
+    name, _, technician_id = cursor.rpartition('_')
+    return name, int(technician_id)
+
+
+def technician_page(filters, cursor=None, limit=TECHNICIANS_PAGE_SIZE):
+    """(technicians, next_cursor) in name order, teams loaded in the same query"""
+    statement = _filtered(select(Technician), filters).options(joinedload(Technician.team))
+    if cursor:
+        name, technician_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            Technician.name > name, and_(Technician.name == name, Technician.id > technician_id)
+        ))
+    technicians = db.session.execute(
+        statement.order_by(Technician.name, Technician.id).limit(limit + 1)
+    ).scalars().all()
+    has_more = len(technicians) > limit
+    technicians = technicians[:limit]
+    return technicians, encode_cursor(technicians[-1].name, technicians[-1].id) if has_more else None
+
+
+def technician_overview(filters, cursor=None, limit=TECHNICIANS_PAGE_SIZE):
+    """Page of technicians; the first page (no cursor) also carries stats, facets and teams"""
+    technicians, next_cursor = technician_page(filters, cursor, limit)
+    data = {
+        'technicians': [t.to_dict() for t in technicians],
+        'next_cursor': next_cursor
+    }
+    if not cursor:
+        stats, facets, total = technician_facets(filters)
+        teams = db.session.execute(select(MaintenanceTeam.id, MaintenanceTeam.name).where(
+            MaintenanceTeam.is_active.is_(True)).order_by(MaintenanceTeam.name)).all()
+        data.update({
+            'total': total,
+            'stats': stats,
+            'facets': {
+                'availability': [{'value': value, 'label': label, 'count': facets['availability'].get(value, 0)}
+                                 for value, label in AVAILABILITY_STATUSES],
+                'skill': [{'value': skill, 'count': facets['skill'].get(skill, 0)}
+                          for skill in list(SKILL_TYPES) + sorted(set(facets['skill']) - set(SKILL_TYPES))],
+                'team': [{'id': team.id, 'name': team.name, 'count': facets['team_id'].get(team.id, 0)}
+                         for team in teams],
+                'unassigned': facets['team_id'].get(None, 0)
+            }
+        })
+    return data
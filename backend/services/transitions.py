@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Request Stage Transitions (time in stage)
+
+Every request write that changes a stage appends a request_stage_transition
+row: create, update, move and bulk all emit requests_written, so one receiver
+covers them. A visit to a stage lasts from its transition to the request's
+next one (or to now while the request is still there); the report ranks
+visit durations per stage with window functions in a single query.
+
+The receiver also feeds the response time sketches: a request's first move
+out of its initial stage is its response, and only this receiver knows which
+transitions existed before the write.
+"""
+from datetime import datetime
+from flask import has_request_context, session
+from sqlalchemy import and_, case, func, insert, literal, null, select
+from backend.models import db, MaintenanceRequest, MaintenanceStage, RequestStageTransition
+from backend.signals import requests_written
+
+
+# ==================== WRITERS ====================
+@requests_written.connect
+def _record_stage_transitions(app, action, requests, before, **extra):
+    """Append a transition for each request whose stage changed"""
+    from backend.services.sketches import update_response_sketches
+    if action == 'delete':
+        # ondelete=CASCADE covers PostgreSQL; SQLite does not enforce foreign keys
+        RequestStageTransition.query.filter(
+            RequestStageTransition.request_id.in_(list(before))
+        ).delete(synchronize_session=False)
+        update_response_sketches(requests, before, {})
+        return
+
+    user_id = session.get('user_id') if has_request_context() else None
+    now = datetime.utcnow()
+    rows = []
+    for req in requests:
+        previous = before.get(req.id)
+        if previous is not None and previous['stage_id'] == req.stage_id:
+            continue
+        rows.append({
+            'request_id': req.id,
+            'from_stage_id': previous['stage_id'] if previous else None,
+            'stage_id': req.stage_id,
+            'user_id': user_id,
+            'action': action,
+            'at': now if previous else (req.created_at or now)
+        })
+    first_moves = _first_moves([row['request_id'] for row in rows if row['from_stage_id'] is not None], now)
+    if rows:
+        db.session.execute(insert(RequestStageTransition), rows)
+    update_response_sketches(requests, before, first_moves)
+
+
+def _first_moves(request_ids, now):
+    """{request id: hours since creation} for requests about to leave their first stage
+
+    Only requests whose history starts with their 'create' transition count;
+    backfilled history does not say when they first moved.
+    """
+    if not request_ids:
+        return {}
+    t = RequestStageTransition
+    rows = db.session.query(
+        t.request_id,
+        func.min(case((t.action == 'create', t.at))).label('created'),
+        func.count(t.from_stage_id).label('moves')
+    ).filter(t.request_id.in_(request_ids)).group_by(t.request_id)
+    return {row.request_id: max((now - row.created).total_seconds() / 3600, 0.0)
+            for row in rows if row.created is not None and not row.moves}
+
+
+def backfill_transitions():
+    """Give requests without history one transition into their current stage
+
+    The entry time is the completion date for closed requests, otherwise the
+    request date. Returns the number of rows written.
+    """
+    has_history = select(RequestStageTransition.id).where(
+        RequestStageTransition.request_id == MaintenanceRequest.id
+    ).exists()
+    entered = case(
+        (and_(MaintenanceRequest.is_open.is_(False), MaintenanceRequest.completed_date.isnot(None)),
+         MaintenanceRequest.completed_date),
+        else_=func.coalesce(MaintenanceRequest.request_date, MaintenanceRequest.created_at)
+    )
+    result = db.session.execute(insert(RequestStageTransition).from_select(
+        ['request_id', 'from_stage_id', 'stage_id', 'user_id', 'action', 'at'],
+        select(MaintenanceRequest.id, null(), MaintenanceRequest.stage_id, null(),
+               literal('backfill'), func.coalesce(entered, func.current_timestamp()))
+        .where(~has_history)
+    ))
+    return result.rowcount
+
+
+# ==================== REPORT ====================
+def _seconds_between(start, end):
+    """Elapsed seconds between two datetime expressions"""
+    if db.engine.dialect.name == 'sqlite':
+        return (func.julianday(end) - func.julianday(start)) * 86400.0
+    return func.extract('epoch', end - start)
+
+
+def _hours(seconds):
+    return round(float(seconds) / 3600.0, 2) if seconds is not None else None
+
+
+def time_in_stage(since=None, team_id=None, now=None):
+    """Visit counts and duration statistics per stage
+
+    since limits the report to visits entered on or after that datetime;
+    team_id to requests of one team. Median and p90 use the nearest-rank
+    method over each stage's visit durations; requests resting in a done or
+    scrap stage count as visits but not as durations.
+    """
+    now = now or datetime.utcnow()
+    t = RequestStageTransition
+
+    visits = select(
+        t.stage_id,
+        t.at,
+        func.lead(t.at).over(partition_by=t.request_id, order_by=(t.at, t.id)).label('left_at')
+    )
+    if team_id:
+        visits = visits.join(MaintenanceRequest, MaintenanceRequest.id == t.request_id) \
+            .where(MaintenanceRequest.team_id == team_id)
+    visits = visits.subquery('visits')
+
+    # The open-ended last visit to a done/scrap stage has no duration
+    closed_stage_ids = select(MaintenanceStage.id).where(
+        (MaintenanceStage.is_done.is_(True)) | (MaintenanceStage.is_scrap.is_(True)))
+    measured = select(
+        visits.c.stage_id,
+        (visits.c.left_at.is_(None)).label('current'),
+        case(
+            (and_(visits.c.left_at.is_(None), visits.c.stage_id.in_(closed_stage_ids)), null()),
+            else_=_seconds_between(visits.c.at, func.coalesce(visits.c.left_at, literal(now)))
+        ).label('seconds')
+    ).select_from(visits)
+    if since:
+        measured = measured.where(visits.c.at >= since)
+    measured = measured.subquery('measured')
+
+    ranked = select(
+        measured.c.stage_id,
+        measured.c.current,
+        measured.c.seconds,
+        # Unmeasured visits sort after every duration, so ranks 1..n are the measured ones
+        func.row_number().over(
+            partition_by=measured.c.stage_id,
+            order_by=(measured.c.seconds.is_(None), measured.c.seconds)
+        ).label('rank'),
+        func.count(measured.c.seconds).over(partition_by=measured.c.stage_id).label('n')
+    ).subquery('ranked')
+
+    def at_rank(rank):
+        return func.max(case((ranked.c.rank == rank, ranked.c.seconds)))
+
+    rows = db.session.execute(select(
+        ranked.c.stage_id,
+        func.count().label('visits'),
+        func.sum(case((ranked.c.current, 1), else_=0)).label('in_stage_now'),
+        func.avg(ranked.c.seconds).label('avg'),
+        at_rank((ranked.c.n + 1) // 2).label('median'),
+        at_rank((ranked.c.n * 9 + 9) // 10).label('p90'),
+        func.max(ranked.c.seconds).label('max')
+    ).group_by(ranked.c.stage_id)).all()
+    by_stage = {row.stage_id: row for row in rows}
+
+    stages = []
+    for stage in MaintenanceStage.query.order_by(MaintenanceStage.sequence):
+        row = by_stage.get(stage.id)
+        stages.append({
+            'stage_id': stage.id,
+            'stage_name': stage.name,
+            'is_open': stage.is_open,
+            'visits': row.visits if row else 0,
+            'in_stage_now': int(row.in_stage_now or 0) if row else 0,
+            'avg_hours': _hours(row.avg) if row else None,
+            'median_hours': _hours(row.median) if row else None,
+            'p90_hours': _hours(row.p90) if row else None,
+            'max_hours': _hours(row.max) if row else None
+        })
+
+    return {
+        'since': since.date().isoformat() if since else None,
+        'team_id': team_id,
+        'generated_at': now.isoformat(),
+        'stages': stages
+    }
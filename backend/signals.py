@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+GearGuard - Write Signals
+
+Routes emit these after flushing a write and before committing it, so
+receivers (rollups, caches, feeds) update inside the same transaction.
+"""
+from blinker import Namespace
+from flask import current_app
+from backend.models import db
+
+_signals = Namespace()
+
+# Sent with action=<create|update|move|assign|delete>, requests=[...] (current
+# rows, empty for deletes) and before={id: snapshot} (state prior to the write)
+requests_written = _signals.signal('requests-written')
+
+# Sent with action=<create|update|delete|scrap> and equipment=[...] / teams=[...]
+equipment_written = _signals.signal('equipment-written')
+teams_written = _signals.signal('teams-written')
+
+
+def request_snapshot(req):
+    """Plain-dict copy of the request fields that derived data depends on"""
+    return {
+        'id': req.id,
+        'reference': req.reference,
+        'equipment_id': req.equipment_id,
+        'category_id': req.equipment.category_id if req.equipment else None,
+        'team_id': req.team_id,
+        'technician_id': req.technician_id,
+        'stage_id': req.stage_id,
+        'request_type': req.request_type,
+        'priority': req.priority,
+        'created_at': req.created_at,
+        'request_date': req.request_date,
+        'scheduled_date': req.scheduled_date,
+        'deadline': req.deadline,
+        'completed_date': req.completed_date,
+        'duration_hours': req.duration_hours,
+        'maintenance_cost': req.maintenance_cost
+    }
+
+
+def emit_requests_written(action, requests=(), before=None):
+    """Flush pending changes and notify receivers about written requests"""
+    db.session.flush()
+    requests_written.send(
+        current_app._get_current_object(),
+        action=action,
+        requests=list(requests),
+        before=before or {}
+    )
+
+
+def emit_equipment_written(action, equipment=()):
+    """Flush pending changes and notify receivers about written equipment"""
+    db.session.flush()
+    equipment_written.send(current_app._get_current_object(), action=action, equipment=list(equipment))
+
+
+def emit_teams_written(action, teams=()):
+    """Flush pending changes and notify receivers about written teams (and members)"""
+    db.session.flush()
+    teams_written.send(current_app._get_current_object(), action=action, teams=list(teams))
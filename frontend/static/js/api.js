@@ -464,13 +464,15 @@ const GearGuardAPI = {
       }
     },
     
-    async assign(id, teamId) {
+    // technicianId is optional; without a teamId the technician's team is used
+    async assign(id, teamId, technicianId) {
       try {
+        const body = technicianId === undefined ? { team_id: teamId } : { team_id: teamId, technician_id: technicianId };
         const response = await fetch(`${API_BASE}/requests/${id}/assign`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           credentials: 'include',
-          body: JSON.stringify({ team_id: teamId })
+          body: JSON.stringify(body)
         });
         if (!response.ok) throw new Error('Failed to assign request');
         return await response.json();
@@ -478,6 +480,211 @@ const GearGuardAPI = {
         console.error('Assign request error:', error);
         throw error;
       }
+    },
+    
+    // Technicians ranked for a request; params: limit, include_off_duty
+    async candidates(id, params = {}) {
+      try {
+        const query = new URLSearchParams(params);
+        const response = await fetch(`${API_BASE}/requests/${id}/candidates?${query}`, { credentials: 'include' });
+        if (!response.ok) throw new Error('Failed to fetch candidates');
+        return await response.json();
+      } catch (error) {
+        console.error('Request candidates error:', error);
+        return null;
+      }
+    },
+    
+    // operations: [{ op: 'move_stage'|'assign_team'|'set_priority'|'set_deadline', ids: [...], value }]
+    async bulk(operations) {
+      try {
+        const response = await fetch(`${API_BASE}/requests/bulk`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json', 'X-Client-Id': GearGuardAPI.stream.clientId },
+          credentials: 'include',
+          body: JSON.stringify({ operations })
+        });
+        if (!response.ok) {
+          const error = await response.json();
+          throw new Error(error.error || 'Failed to apply bulk update');
+        }
+        return await response.json();
+      } catch (error) {
+        console.error('Bulk update error:', error);
+        throw error;
+      }
+    }
+  },
+  
+  // ==================== KANBAN ====================
+  kanban: {
+    async getBoard(params = {}) {
+      try {
+        const query = new URLSearchParams(params);
+        const response = await fetch(`${API_BASE}/kanban?${query}`);
+        if (!response.ok) throw new Error('Failed to fetch kanban board');
+        return await response.json();
+      } catch (error) {
+        console.error('Kanban board error:', error);
+        return null;
+      }
+    },
+
+    async getStageCards(stageId, params = {}) {
+      try {
+        const query = new URLSearchParams(params);
+        const response = await fetch(`${API_BASE}/kanban/stages/${stageId}/cards?${query}`);
+        if (!response.ok) throw new Error('Failed to fetch stage cards');
+        return await response.json();
+      } catch (error) {
+        console.error('Kanban stage cards error:', error);
+        return null;
+      }
+    }
+  },
+
+  // ==================== HISTORY ====================
+  history: {
+    // One page of closed requests; pass the previous page's next_cursor as `cursor`
+    async getPage(params = {}) {
+      try {
+        const query = new URLSearchParams(params);
+        const response = await fetch(`${API_BASE}/history?${query}`);
+        if (!response.ok) throw new Error('Failed to fetch history');
+        return await response.json();
+      } catch (error) {
+        console.error('History page error:', error);
+        return null;
+      }
+    }
+  },
+
+  // ==================== LIVE STREAM ====================
+  stream: {
+    // Sent as X-Client-Id on writes so a tab can skip its own events
+    clientId: (window.crypto && crypto.randomUUID)
+      ? crypto.randomUUID()
+      : `tab-${Date.now()}-${Math.random().toString(16).slice(2)}`,
+    
+    // Subscribe to request change events; handler(event) runs once per event id.
+    // EventSource reconnects by itself and resumes from the last event id.
+    requests(handler) {
+      if (!window.EventSource) return null;
+      const seen = new Set();
+      const source = new EventSource(`${API_BASE}/stream/requests`);
+      source.addEventListener('request', (message) => {
+        const event = JSON.parse(message.data);
+        if (seen.has(event.id)) return;
+        seen.add(event.id);
+        if (seen.size > 1000) seen.delete(seen.values().next().value);
+        try {
+          handler(event);
+        } catch (error) {
+          console.error('Request event error:', error);
+        }
+      });
+      return source;
+    }
+  },
+  
+  // ==================== DELTA SYNC ====================
+  // Local copy of requests, equipment, technicians and teams kept current with
+  // /api/changes: the first pull downloads a snapshot, later pulls only the
+  // rows written or deleted since the stored token. Rows hold column values
+  // (ids, not names); use sync.lookup() to join them.
+  sync: {
+    STORAGE_KEY: 'gearguard.sync.v1',
+    ENTITIES: ['requests', 'equipment', 'technicians', 'teams'],
+    state: null,
+    pending: null,
+    
+    emptyState() {
+      const state = { token: null };
+      this.ENTITIES.forEach(entity => { state[entity] = {}; });
+      return state;
+    },
+    
+    load() {
+      if (this.state) return this.state;
+      try {
+        const saved = JSON.parse(localStorage.getItem(this.STORAGE_KEY));
+        this.state = saved && this.ENTITIES.every(entity => saved[entity]) ? saved : this.emptyState();
+      } catch (error) {
+        this.state = this.emptyState();
+      }
+      return this.state;
+    },
+    
+    save() {
+      try {
+        localStorage.setItem(this.STORAGE_KEY, JSON.stringify(this.state));
+      } catch (error) {
+        // Quota exceeded: keep the in-memory copy, next page load starts over
+        localStorage.removeItem(this.STORAGE_KEY);
+      }
+    },
+    
+    // Apply one /api/changes response to the local copy
+    apply(delta) {
+      const state = delta.full ? this.emptyState() : this.load();
+      this.ENTITIES.forEach(entity => {
+        (delta.deleted[entity] || []).forEach(id => { delete state[entity][id]; });
+        (delta.changes[entity] || []).forEach(row => { state[entity][row.id] = row; });
+      });
+      state.token = delta.token;
+      this.state = state;
+    },
+    
+    // Bring the local copy up to date; concurrent callers share one pull.
+    // Returns the entities that changed.
+    pull() {
+      if (this.pending) return this.pending;
+      this.pending = (async () => {
+        const changed = new Set();
+        try {
+          let delta;
+          do {
+            const params = new URLSearchParams();
+            if (this.load().token) params.set('since', this.state.token);
+            const response = await fetch(`${API_BASE}/changes?${params}`);
+            if (response.status === 400) {
+              // Token not recognised: drop the copy and take a snapshot
+              this.state = this.emptyState();
+              continue;
+            }
+            if (!response.ok) throw new Error('Failed to fetch changes');
+            delta = await response.json();
+            this.ENTITIES.forEach(entity => {
+              if (delta.full || delta.changes[entity].length || delta.deleted[entity].length) {
+                changed.add(entity);
+              }
+            });
+            this.apply(delta);
+          } while (!delta || delta.has_more);
+          this.save();
+        } catch (error) {
+          console.error('Change sync error:', error);
+        } finally {
+          this.pending = null;
+        }
+        return [...changed];
+      })();
+      return this.pending;
+    },
+    
+    // Synced rows of one entity as an array (after pulling pending changes)
+    async getAll(entity) {
+      await this.pull();
+      return Object.values(this.load()[entity]);
+    },
+    
+    lookup(entity, id) {
+      return id == null ? null : (this.load()[entity][id] || null);
+    },
+    
+    clear() {
+      this.state = this.emptyState();
+      localStorage.removeItem(this.STORAGE_KEY);
     }
   },
   
@@ -495,6 +702,238 @@ const GearGuardAPI = {
         console.error('Calendar events error:', error);
         return [];
       }
+    },
+
+    // Compact events or per-day counts for [start, end) (YYYY-MM-DD); mode: auto, events, counts
+    async getRange(start, end, params = {}) {
+      try {
+        const query = new URLSearchParams({ start, end, ...params });
+        const response = await fetch(`${API_BASE}/calendar?${query}`);
+        if (!response.ok) throw new Error('Failed to fetch calendar range');
+        return await response.json();
+      } catch (error) {
+        console.error('Calendar range error:', error);
+        return null;
+      }
+    }
+  },
+  
+  // ==================== SHIFTS & AVAILABILITY ====================
+  shifts: {
+    async getForTechnician(technicianId) {
+      try {
+        const response = await fetch(`${API_BASE}/technicians/${technicianId}/shifts`, { credentials: 'include' });
+        if (!response.ok) throw new Error('Failed to fetch shifts');
+        return await response.json();
+      } catch (error) {
+        console.error('Shifts error:', error);
+        return [];
+      }
+    },
+    
+    // data: kind (shift, leave), starts_at, ends_at, rrule, until, note
+    async create(technicianId, data) {
+      try {
+        const response = await fetch(`${API_BASE}/technicians/${technicianId}/shifts`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          credentials: 'include',
+          body: JSON.stringify(data)
+        });
+        if (!response.ok) {
+          const error = await response.json();
+          throw new Error(error.error || 'Failed to create shift');
+        }
+        return await response.json();
+      } catch (error) {
+        console.error('Create shift error:', error);
+        throw error;
+      }
+    },
+    
+    async update(id, data) {
+      try {
+        const response = await fetch(`${API_BASE}/shifts/${id}`, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/json' },
+          credentials: 'include',
+          body: JSON.stringify(data)
+        });
+        if (!response.ok) {
+          const error = await response.json();
+          throw new Error(error.error || 'Failed to update shift');
+        }
+        return await response.json();
+      } catch (error) {
+        console.error('Update shift error:', error);
+        throw error;
+      }
+    },
+    
+    async delete(id) {
+      try {
+        const response = await fetch(`${API_BASE}/shifts/${id}`, {
+          method: 'DELETE',
+          credentials: 'include'
+        });
+        if (!response.ok) throw new Error('Failed to delete shift');
+        return true;
+      } catch (error) {
+        console.error('Delete shift error:', error);
+        throw error;
+      }
+    },
+    
+    // Technicians on shift for the whole of [start, end) (ISO dates or datetimes)
+    async available(start, end, teamId) {
+      try {
+        const params = new URLSearchParams({ start, end });
+        if (teamId) params.append('team_id', teamId);
+        const response = await fetch(`${API_BASE}/availability?${params}`, { credentials: 'include' });
+        if (!response.ok) throw new Error('Failed to fetch availability');
+        return await response.json();
+      } catch (error) {
+        console.error('Availability error:', error);
+        return null;
+      }
+    },
+    
+    // Free technician-hours per day over [start, end) (YYYY-MM-DD)
+    async capacity(start, end, teamId) {
+      try {
+        const params = new URLSearchParams({ start, end });
+        if (teamId) params.append('team_id', teamId);
+        const response = await fetch(`${API_BASE}/availability/capacity?${params}`, { credentials: 'include' });
+        if (!response.ok) throw new Error('Failed to fetch capacity');
+        return await response.json();
+      } catch (error) {
+        console.error('Capacity error:', error);
+        return null;
+      }
+    }
+  },
+  
+  // ==================== PREVENTIVE SCHEDULES ====================
+  schedules: {
+    async getAll(filters = {}) {
+      try {
+        const params = new URLSearchParams(filters);
+        const response = await fetch(`${API_BASE}/schedules?${params}`, { credentials: 'include' });
+        if (!response.ok) throw new Error('Failed to fetch schedules');
+        return await response.json();
+      } catch (error) {
+        console.error('Schedules error:', error);
+        return [];
+      }
+    },
+    
+    async create(data) {
+      try {
+        const response = await fetch(`${API_BASE}/schedules`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          credentials: 'include',
+          body: JSON.stringify(data)
+        });
+        if (!response.ok) {
+          const error = await response.json();
+          throw new Error(error.error || 'Failed to create schedule');
+        }
+        return await response.json();
+      } catch (error) {
+        console.error('Create schedule error:', error);
+        throw error;
+      }
+    },
+    
+    async update(id, data) {
+      try {
+        const response = await fetch(`${API_BASE}/schedules/${id}`, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/json' },
+          credentials: 'include',
+          body: JSON.stringify(data)
+        });
+        if (!response.ok) {
+          const error = await response.json();
+          throw new Error(error.error || 'Failed to update schedule');
+        }
+        return await response.json();
+      } catch (error) {
+        console.error('Update schedule error:', error);
+        throw error;
+      }
+    },
+    
+    async delete(id) {
+      try {
+        const response = await fetch(`${API_BASE}/schedules/${id}`, {
+          method: 'DELETE',
+          credentials: 'include'
+        });
+        if (!response.ok) throw new Error('Failed to delete schedule');
+        return true;
+      } catch (error) {
+        console.error('Delete schedule error:', error);
+        throw error;
+      }
+    },
+    
+    // Upcoming occurrences in [start, end) (YYYY-MM-DD, default the next 90 days)
+    async occurrences(id, start, end) {
+      try {
+        const params = new URLSearchParams();
+        if (start) params.append('start', start);
+        if (end) params.append('end', end);
+        const response = await fetch(`${API_BASE}/schedules/${id}/occurrences?${params}`, { credentials: 'include' });
+        if (!response.ok) throw new Error('Failed to fetch occurrences');
+        return await response.json();
+      } catch (error) {
+        console.error('Schedule occurrences error:', error);
+        return null;
+      }
+    }
+  },
+  
+  // ==================== AUTO-SCHEDULER ====================
+  scheduler: {
+    // params: start (YYYY-MM-DD), days, team_id, request_ids
+    async preview(params = {}) {
+      try {
+        const response = await fetch(`${API_BASE}/scheduler/preview`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          credentials: 'include',
+          body: JSON.stringify(params)
+        });
+        if (!response.ok) {
+          const error = await response.json();
+          throw new Error(error.error || 'Failed to preview schedule');
+        }
+        return await response.json();
+      } catch (error) {
+        console.error('Schedule preview error:', error);
+        throw error;
+      }
+    },
+    
+    async apply(params = {}) {
+      try {
+        const response = await fetch(`${API_BASE}/scheduler/apply`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          credentials: 'include',
+          body: JSON.stringify(params)
+        });
+        if (!response.ok) {
+          const error = await response.json();
+          throw new Error(error.error || 'Failed to apply schedule');
+        }
+        return await response.json();
+      } catch (error) {
+        console.error('Schedule apply error:', error);
+        throw error;
+      }
     }
   },
   
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Query Plan Test Suite for GearGuard
+Runs the hot API endpoints, captures every SELECT they issue and checks its
+EXPLAIN plan: a filtered query must not fall back to a full table scan.
+Runs with QUERY_STRICT, so an endpoint repeating one statement more than
+QUERY_REPEAT_LIMIT times (an N+1 loop) fails with a 500.
+
+Uses a scratch database that gets seeded (default: a temporary SQLite file;
+set QUERY_PLAN_DATABASE_URL to check PostgreSQL plans instead).
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+_scratch = None
+if os.environ.get('QUERY_PLAN_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['QUERY_PLAN_DATABASE_URL']
+else:
+    _scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    os.environ['DATABASE_URL'] = f'sqlite:///{_scratch.name}'
+
+from sqlalchemy import event
+from app import create_app
+from backend.models import db, MaintenanceRequest, Equipment, MaintenanceTeam, Technician, TechnicianShift
+from backend.seed import seed_database
+
+# Tables that grow with usage; small lookup tables (stages, roles, teams,
+# categories) may be scanned
+HOT_TABLES = {
+    'maintenance_request', 'equipment', 'technician', 'team_member', 'activity_log',
+    'request_daily_facts', 'request_events', 'change_tombstones', 'request_time_sketches',
+    'request_stage_transition'
+}
+
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    RESET = '\033[0m'
+    BOLD = '\033[1m'
+
+def print_test(msg, status='INFO'):
+    """Print formatted test message"""
+    if status == 'PASS':
+        print(f"{Colors.GREEN}✓{Colors.RESET} {msg}")
+    elif status == 'FAIL':
+        print(f"{Colors.RED}✗{Colors.RESET} {msg}")
+    elif status == 'WARN':
+        print(f"{Colors.YELLOW}⚠{Colors.RESET} {msg}")
+    else:
+        print(f"{Colors.BLUE}ℹ{Colors.RESET} {msg}")
+
+def print_section(title):
+    """Print section header"""
+    print(f"\n{Colors.BOLD}{Colors.BLUE}{'='*60}{Colors.RESET}")
+    print(f"{Colors.BOLD}{Colors.BLUE}{title:^60}{Colors.RESET}")
+    print(f"{Colors.BOLD}{Colors.BLUE}{'='*60}{Colors.RESET}\n")
+
+
+class StatementRecorder:
+    """Collects the SELECT statements (with parameters) run on the engine"""
+
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and re.match(r'\s*(SELECT|WITH)\b', statement, re.IGNORECASE):
+            self.statements.append((statement, parameters))
+
+    def take(self):
+        statements, self.statements = self.statements, []
+        return statements
+
+
+def full_scans(conn, statement, parameters):
+    """Hot tables the plan reads in full"""
+    if conn.dialect.name == 'sqlite':
+        plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+        details = [row[-1] for row in plan]
+        # "SCAN t" and "SCAN t USING [COVERING] INDEX i" both read every row
+        return {m.group(1) for d in details for m in [re.match(r'SCAN (\w+)', d)] if m}
+    if conn.dialect.name == 'postgresql':
+        # With sequential scans priced out, a Seq Scan means no usable index
+        conn.exec_driver_sql('SET enable_seqscan = off')
+        plan = conn.exec_driver_sql(f'EXPLAIN {statement}', parameters).all()
+        conn.exec_driver_sql('RESET enable_seqscan')
+        return {m.group(1) for row in plan for m in [re.search(r'Seq Scan on (\w+)', row[0])] if m}
+    raise RuntimeError(f'No plan check for {conn.dialect.name}')
+
+
+def check_endpoint(app, recorder, client, label, method, url, json=None, allow=()):
+    """Call an endpoint; fail if a filtered SELECT scans a hot table
+
+    Statements without WHERE (whole-table counts and listings) read every
+    row by design. `allow` lists hot tables the endpoint may scan anyway.
+    """
+    recorder.take()
+    response = client.open(url, method=method, json=json)
+    statements = recorder.take()
+    if response.status_code >= 400:
+        print_test(f"{label}: {method} {url} returned {response.status_code}", "FAIL")
+        return False
+
+    problems = []
+    with app.app_context(), db.engine.connect() as conn:
+        for statement, parameters in statements:
+            if not re.search(r'\bWHERE\b', statement, re.IGNORECASE):
+                continue
+            scanned = (full_scans(conn, statement, parameters) & HOT_TABLES) - set(allow)
+            if scanned:
+                problems.append((sorted(scanned), ' '.join(statement.split())[:160]))
+
+    if problems:
+        print_test(f"{label}: {len(problems)} full scan(s) in {len(statements)} queries", "FAIL")
+        for tables, statement in problems:
+            print(f"      {', '.join(tables)}: {statement}")
+        return False
+    print_test(f"{label}: {len(statements)} queries, no full scans", "PASS")
+    return True
+
+
+def run_cases(app, recorder, client, cases):
+    results = [check_endpoint(app, recorder, client, *case[:3], **case[3]) for case in cases]
+    return all(results)
+
+
+def test_dashboard(app, recorder, client, ids):
+    """Dashboard and equipment smart buttons"""
+    print_section("DASHBOARD QUERY PLANS")
+    return run_cases(app, recorder, client, [
+        ("Dashboard stats", 'GET', '/api/dashboard/stats', {}),
+        ("Recent requests", 'GET', '/api/dashboard/recent-requests', {}),
+        ("Open requests smart button", 'GET', f"/api/equipment/{ids['equipment']}/open-requests-count", {}),
+    ])
+
+
+def test_request_lists(app, recorder, client, ids):
+    """Request list filters, detail and kanban pages"""
+    print_section("REQUEST QUERY PLANS")
+    return run_cases(app, recorder, client, [
+        ("Requests by stage", 'GET', f"/api/requests?stage_id={ids['stage']}", {}),
+        ("Requests by team", 'GET', f"/api/requests?team_id={ids['team']}", {}),
+        ("Requests by equipment", 'GET', f"/api/requests?equipment_id={ids['equipment']}", {}),
+        ("Requests by priority", 'GET', '/api/requests?priority=urgent', {}),
+        ("Overdue requests", 'GET', '/api/requests?overdue=true', {}),
+        ("Request detail", 'GET', f"/api/requests/{ids['request']}", {}),
+        ("Request candidates", 'GET', f"/api/requests/{ids['request']}/candidates", {}),
+        ("Equipment requests", 'GET', f"/api/equipment/{ids['equipment']}/requests", {}),
+        # The board ranks every card per stage with ROW_NUMBER (index order)
+        ("Kanban board", 'GET', '/api/kanban', {'allow': ['maintenance_request']}),
+        ("Kanban stage page", 'GET', f"/api/kanban/stages/{ids['stage']}/cards", {}),
+        ("Calendar range", 'GET', '/api/calendar/events?start=2024-01-01&end=2024-02-01', {}),
+        ("Calendar month events", 'GET', '/api/calendar?start=2024-01-01&end=2024-02-12', {}),
+        ("Calendar year counts", 'GET', '/api/calendar?start=2024-01-01&end=2025-01-01', {}),
+        ("History page", 'GET', '/api/history', {}),
+        ("History date range", 'GET', '/api/history?date_from=2024-01-01&date_to=2024-12-31', {}),
+        ("History by team", 'GET', f"/api/history?team_id={ids['team']}", {}),
+        ("History by category", 'GET', f"/api/history?category_id={ids['category']}", {}),
+    ])
+
+
+def test_assets(app, recorder, client, ids):
+    """Equipment, team and technician lookups"""
+    print_section("EQUIPMENT / TEAM QUERY PLANS")
+    return run_cases(app, recorder, client, [
+        ("Equipment by status", 'GET', '/api/equipment?status=operational', {}),
+        ("Equipment by category", 'GET', f"/api/equipment?category_id={ids['category']}", {}),
+        ("Equipment by department", 'GET', '/api/equipment?department=Production', {}),
+        ("Team list", 'GET', '/api/teams', {'allow': ['maintenance_team']}),
+        ("Team detail", 'GET', f"/api/teams/{ids['team']}", {}),
+        ("Technicians by team", 'GET', f"/api/technicians?team_id={ids['team']}", {}),
+        ("Technicians by availability", 'GET', '/api/technicians?availability=available', {}),
+        ("Technician overview", 'GET', '/api/technicians/overview', {}),
+        ("Technician overview page", 'GET', '/api/technicians/overview?cursor=M_0', {}),
+        ("Scheduler preview", 'POST', '/api/scheduler/preview', {'json': {'days': 30}}),
+        ("Technician shifts", 'GET', f"/api/technicians/{ids['technician']}/shifts", {}),
+        ("Availability capacity", 'GET', '/api/availability/capacity?start=2024-01-01&end=2024-02-01', {}),
+    ])
+
+
+def test_reports_and_sync(app, recorder, client, ids):
+    """Reports and the change feed"""
+    print_section("REPORT / SYNC QUERY PLANS")
+    token = client.get('/api/changes').get_json()['token']
+    snapshot_token = client.get('/api/changes?limit=50').get_json()['token']
+    return run_cases(app, recorder, client, [
+        ("Requests by team report", 'GET', '/api/reports/requests-by-team', {}),
+        ("Reliability since date", 'GET', '/api/reports/reliability?since=2024-01-01', {}),
+        # Visit lengths need each request's next transition, so the history is read in full
+        ("Time in stage report", 'GET', '/api/reports/time-in-stage?since=2024-01-01',
+         {'allow': ['request_stage_transition']}),
+        ("Change feed delta", 'GET', f'/api/changes?since={token}', {}),
+        ("Change feed snapshot page", 'GET', '/api/changes?limit=50', {}),
+        ("Change feed snapshot next page", 'GET', f'/api/changes?since={snapshot_token}&limit=50', {}),
+    ])
+
+
+def test_writes(app, recorder, client, ids):
+    """Writes and the derived-data refreshes they trigger"""
+    print_section("WRITE PATH QUERY PLANS")
+    return run_cases(app, recorder, client, [
+        ("Update request", 'PUT', f"/api/requests/{ids['request']}", {'json': {'priority': 'high'}}),
+        ("Move request", 'POST', f"/api/requests/{ids['request']}/move-stage",
+         {'json': {'stage_id': ids['stage']}}),
+        ("Bulk triage", 'POST', '/api/requests/bulk', {'json': {'operations': [
+            {'op': 'set_priority', 'ids': [ids['request']], 'value': 'urgent'}]}}),
+    ])
+
+
+def run_all_tests():
+    """Run all tests and return summary"""
+    print(f"\n{Colors.BOLD}{Colors.BLUE}")
+    print("╔═════════════════════════════════════════════════════════════╗")
+    print("║                                                             ║")
+    print("║     GEARGUARD QUERY PLAN TEST SUITE                         ║")
+    print("║                                                             ║")
+    print("╚═════════════════════════════════════════════════════════════╝")
+    print(f"{Colors.RESET}\n")
+
+    # Production settings: no SQL echo, plans as deployed; N+1 loops fail
+    app = create_app('production')
+    app.config['QUERY_STRICT'] = True
+    with app.app_context():
+        seed_database()
+        request_row = MaintenanceRequest.query.filter(MaintenanceRequest.equipment_id.isnot(None)).first()
+        equipment = db.session.get(Equipment, request_row.equipment_id)
+        technician = Technician(name='Plan Technician', skill='HVAC', team_id=MaintenanceTeam.query.first().id)
+        technician.shifts.append(TechnicianShift(starts_at=datetime(2024, 1, 1, 8), ends_at=datetime(2024, 1, 1, 16),
+                                                 rrule='FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR'))
+        db.session.add(technician)
+        db.session.commit()
+        ids = {
+            'request': request_row.id,
+            'equipment': equipment.id,
+            'category': equipment.category_id,
+            'stage': request_row.stage_id,
+            'team': MaintenanceTeam.query.first().id,
+            'technician': technician.id
+        }
+        recorder = StatementRecorder(db.engine)
+
+    client = app.test_client()
+    response = client.post('/auth/login', json={'email': 'admin@gearguard.com', 'password': 'admin123'})
+    if response.status_code != 200:
+        print_test("Admin login failed; is the seed data intact?", "FAIL")
+        return 1
+
+    tests = [
+        ("Dashboard", test_dashboard),
+        ("Request Lists", test_request_lists),
+        ("Equipment & Teams", test_assets),
+        ("Reports & Sync", test_reports_and_sync),
+        ("Write Paths", test_writes),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            passed = test_func(app, recorder, client, ids)
+            results.append((name, passed))
+        except Exception as e:
+            print_test(f"Test '{name}' crashed: {e}", "FAIL")
+            results.append((name, False))
+
+    with app.app_context():
+        db.engine.dispose()
+
+    # Print summary
+    print_section("TEST SUMMARY")
+    passed_count = sum(1 for _, passed in results if passed)
+    total_count = len(results)
+
+    for name, passed in results:
+        status = "PASS" if passed else "FAIL"
+        print_test(f"{name}: {status}", status)
+
+    print(f"\n{Colors.BOLD}")
+    print(f"Total Tests: {total_count}")
+    print(f"{Colors.GREEN}Passed: {passed_count}{Colors.RESET}")
+    print(f"{Colors.RED}Failed: {total_count - passed_count}{Colors.RESET}")
+
+    if passed_count == total_count:
+        print(f"\n{Colors.BOLD}{Colors.GREEN}{'='*60}")
+        print("ALL TESTS PASSED! ✓")
+        print(f"{'='*60}{Colors.RESET}\n")
+        return 0
+    else:
+        print(f"\n{Colors.BOLD}{Colors.RED}{'='*60}")
+        print(f"SOME TESTS FAILED! {total_count - passed_count}/{total_count} failures")
+        print(f"{'='*60}{Colors.RESET}\n")
+        return 1
+
+if __name__ == '__main__':
+    exit_code = run_all_tests()
+    if _scratch is not None:
+        os.unlink(_scratch.name)
+    sys.exit(exit_code)
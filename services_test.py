@@ -0,0 +1,533 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Service Behaviour Test Suite for GearGuard
+Runs the planning and derived-data services in process against a seeded
+scratch SQLite database and checks what they compute, not how fast:
+auto-scheduler bookings, shift availability, schedule recurrence, counter
+columns and change feed paging.
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, time, timedelta
+
+_scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f'sqlite:///{_scratch.name}'
+
+from app import create_app
+from backend.models import db, MaintenanceRequest, MaintenanceStage, MaintenanceTeam, Technician, TechnicianShift
+from backend.seed import seed_database
+
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    RESET = '\033[0m'
+    BOLD = '\033[1m'
+
+def print_test(msg, status='INFO'):
+    """Print formatted test message"""
+    if status == 'PASS':
+        print(f"{Colors.GREEN}✓{Colors.RESET} {msg}")
+    elif status == 'FAIL':
+        print(f"{Colors.RED}✗{Colors.RESET} {msg}")
+    elif status == 'WARN':
+        print(f"{Colors.YELLOW}⚠{Colors.RESET} {msg}")
+    else:
+        print(f"{Colors.BLUE}ℹ{Colors.RESET} {msg}")
+
+def print_section(title):
+    """Print section header"""
+    print(f"\n{Colors.BOLD}{Colors.BLUE}{'='*60}{Colors.RESET}")
+    print(f"{Colors.BOLD}{Colors.BLUE}{title:^60}{Colors.RESET}")
+    print(f"{Colors.BOLD}{Colors.BLUE}{'='*60}{Colors.RESET}\n")
+
+def check(label, ok, detail=''):
+    """Print one check; returns ok"""
+    print_test(f"{label}{': ' + str(detail) if detail and not ok else ''}", "PASS" if ok else "FAIL")
+    return ok
+
+def overlapping_pairs(intervals):
+    """Adjacent (start, end) pairs that overlap once sorted"""
+    intervals = sorted(intervals)
+    return [(a, b) for a, b in zip(intervals, intervals[1:]) if b[0] < a[1]]
+
+
+def test_auto_scheduler(app):
+    """Greedy planner: no double booking, working hours only, existing slots kept"""
+    print_section("AUTO-SCHEDULER TEST")
+    from backend.services.auto_schedule import parse_plan_params, plan_schedule, apply_schedule
+    results = []
+    rng = random.Random(41)
+
+    with app.app_context():
+        config = app.config
+        start_hour = config.get('SCHEDULER_DAY_START_HOUR', 8)
+        day_hours = config.get('SCHEDULER_DAY_HOURS', 8)
+        workdays = set(config.get('SCHEDULER_WORKDAYS', (0, 1, 2, 3, 4)))
+
+        new_stage = MaintenanceStage.query.filter_by(is_done=False, is_scrap=False) \
+            .order_by(MaintenanceStage.sequence).first()
+        team = MaintenanceTeam(name='Planner Test Team')
+        db.session.add(team)
+        db.session.flush()
+        technicians = [Technician(name=f'Planner Tech {i}', team_id=team.id) for i in range(12)]
+        db.session.add_all(technicians)
+        db.session.flush()
+
+        # Existing bookings on the first working days of the window
+        day = datetime.utcnow().date() + timedelta(days=1)
+        while day.weekday() not in workdays:
+            day += timedelta(days=1)
+        opens = datetime.combine(day, time()) + timedelta(hours=start_hour)
+        existing = {}
+        for i, technician in enumerate(technicians[:6]):
+            req = MaintenanceRequest(
+                reference=f'MR-{80000 + i:05d}', name=f'Booked {i}', request_type='preventive',
+                team_id=team.id, technician_id=technician.id, priority='normal', stage_id=new_stage.id,
+                scheduled_date=opens + timedelta(hours=i % 3), duration_hours=3
+            )
+            db.session.add(req)
+            db.session.flush()
+            existing[req.id] = (technician.id, req.scheduled_date)
+
+        for i in range(120):
+            req = MaintenanceRequest(
+                reference=f'MR-{81000 + i:05d}', name=f'Plan {i}', request_type='preventive',
+                team_id=team.id, stage_id=new_stage.id, priority=rng.choice(['low', 'normal', 'high', 'urgent']),
+                duration_hours=rng.choice([0.5, 1, 2, 3, 4, 6, day_hours]),
+                deadline=datetime.combine(day, time()) + timedelta(days=rng.randint(1, 30))
+            )
+            db.session.add(req)
+        too_long = MaintenanceRequest(reference='MR-81999', name='Two day job', request_type='preventive',
+                                      team_id=team.id, stage_id=new_stage.id, duration_hours=day_hours + 4)
+        db.session.add(too_long)
+        db.session.commit()
+
+        plan = plan_schedule(parse_plan_params({'start': day.isoformat(), 'days': 60, 'team_id': team.id}))
+        slots = plan['scheduled']
+        results.append(check(f"All 120 requests planned ({len(slots)})", len(slots) == 120,
+                             plan['unscheduled'][:3]))
+
+        bookings = {}
+        for request_id, (technician_id, start) in existing.items():
+            bookings.setdefault(technician_id, []).append((start, start + timedelta(hours=3)))
+        outside = []
+        for slot in slots:
+            start, end = datetime.fromisoformat(slot['start']), datetime.fromisoformat(slot['end'])
+            bookings.setdefault(slot['technician_id'], []).append((start, end))
+            day_open = datetime.combine(start.date(), time()) + timedelta(hours=start_hour)
+            if start.weekday() not in workdays or start < day_open or end > day_open + timedelta(hours=day_hours):
+                outside.append(slot['reference'])
+        overlaps = {t: pairs for t, intervals in bookings.items() for pairs in [overlapping_pairs(intervals)] if pairs}
+        results.append(check("No technician is booked twice at once", not overlaps, overlaps))
+        results.append(check("Every booking lies inside working hours", not outside, outside[:5]))
+        results.append(check("Already scheduled requests are not re-planned",
+                             not {s['request_id'] for s in slots} & set(existing)))
+
+        long_entry = [u for u in plan['unscheduled'] if u['request_id'] == too_long.id]
+        results.append(check("Request longer than a working day is unscheduled",
+                             bool(long_entry) and 'working day' in long_entry[0]['reason'], plan['unscheduled']))
+
+        apply_schedule(plan)
+        db.session.commit()
+        kept = all((row.technician_id, row.scheduled_date) == existing[row.id]
+                   for row in MaintenanceRequest.query.filter(MaintenanceRequest.id.in_(existing)))
+        results.append(check("Existing bookings keep their technician and slot", kept))
+        stored = {row.id: row for row in MaintenanceRequest.query.filter(
+            MaintenanceRequest.id.in_([s['request_id'] for s in slots]))}
+        results.append(check("Applied plan stores each slot", all(
+            stored[s['request_id']].scheduled_date.isoformat() == s['start']
+            and stored[s['request_id']].technician_id == s['technician_id'] for s in slots)))
+
+    return all(results)
+
+
+def test_shift_availability(app):
+    """Interval tree lookups, leave subtraction, RRULE expansion and daily capacity"""
+    print_section("SHIFT AVAILABILITY TEST")
+    from backend.services.shifts import IntervalTree, _subtract, working_intervals, capacity_by_day
+    results = []
+    rng = random.Random(45)
+    base = datetime(2030, 1, 7)  # a Monday
+
+    def at(hours):
+        return base + timedelta(hours=hours)
+
+    intervals = []
+    for i in range(500):
+        start = rng.randint(0, 5000)
+        intervals.append((at(start), at(start + rng.randint(1, 300)), i))
+    tree = IntervalTree(intervals)
+    mismatches = 0
+    for _ in range(300):
+        start = rng.randint(-100, 5200)
+        end = start + rng.randint(1, 200)
+        expected = {i for s, e, i in intervals if s < at(end) and e > at(start)}
+        mismatches += set(tree.overlapping(at(start), at(end))) != expected
+    results.append(check("Interval tree overlap queries match a linear scan (300 ranges)", mismatches == 0,
+                         f'{mismatches} mismatching ranges'))
+
+    def hours(pairs):
+        return [(at(s), at(e)) for s, e in pairs]
+
+    cases = [
+        ([(0, 10)], [(2, 3), (5, 6)], [(0, 2), (3, 5), (6, 10)]),
+        ([(0, 10)], [(-5, 2), (8, 20)], [(2, 8)]),
+        ([(0, 4), (6, 10)], [(3, 7)], [(0, 3), (7, 10)]),
+        ([(0, 4)], [(4, 6)], [(0, 4)]),
+        ([(0, 4)], [(-1, 5)], []),
+        ([(0, 4), (6, 10)], [], [(0, 4), (6, 10)]),
+    ]
+    wrong = [(a, b) for a, b, expected in cases if _subtract(hours(a), hours(b)) != hours(expected)]
+    results.append(check("Leave subtraction cuts, trims and drops shift intervals", not wrong, wrong))
+
+    with app.app_context():
+        team = MaintenanceTeam(name='Shift Test Team')
+        db.session.add(team)
+        db.session.flush()
+        technician = Technician(name='Shift Tech', team_id=team.id)
+        db.session.add(technician)
+        db.session.flush()
+        # Weekdays 08:00-16:00 until the second Wednesday (exclusive), leave Tuesday 10:00-12:00
+        db.session.add_all([
+            TechnicianShift(technician_id=technician.id, kind='shift', starts_at=at(8), ends_at=at(16),
+                            rrule='FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR', until=at(24 * 9)),
+            TechnicianShift(technician_id=technician.id, kind='leave', starts_at=at(24 + 10), ends_at=at(24 + 12))
+        ])
+        db.session.add(MaintenanceRequest(
+            reference='MR-82000', name='Booked on shift', team_id=team.id, technician_id=technician.id,
+            stage_id=MaintenanceStage.query.filter_by(is_done=False, is_scrap=False).first().id,
+            scheduled_date=at(9), duration_hours=2
+        ))
+        db.session.commit()
+
+        working = working_intervals(base, at(24 * 14), team_id=team.id).get(technician.id, [])
+        expected = [(at(d * 24 + 8), at(d * 24 + 16)) for d in (0, 2, 3, 4, 7, 8)]
+        expected[1:1] = [(at(24 + 8), at(24 + 10)), (at(24 + 12), at(24 + 16))]
+        results.append(check("Weekly RRULE expands weekdays only and stops at until", working == expected,
+                             working))
+
+        days = {d['date']: d for d in capacity_by_day(base, at(24 * 7), team_id=team.id)}
+        monday, tuesday, saturday = (days[(base + timedelta(days=d)).date().isoformat()] for d in (0, 1, 5))
+        results.append(check("Capacity counts booked hours inside the shift",
+                             (monday['on_shift'], monday['shift_hours'], monday['booked_hours'],
+                              monday['free_hours']) == (1, 8.0, 2.0, 6.0), monday))
+        results.append(check("Capacity drops leave hours",
+                             (tuesday['shift_hours'], tuesday['free_hours']) == (6.0, 6.0), tuesday))
+        results.append(check("Capacity is empty on days off",
+                             saturday['on_shift'] == 0 and not saturday['shift_hours'], saturday))
+
+    return all(results)
+
+
+def test_schedule_recurrence(app):
+    """Interval, operating-hours and RRULE expansion; generated_until splits requests from virtual events"""
+    print_section("SCHEDULE RECURRENCE TEST")
+    from backend.models import Equipment, MaintenanceSchedule
+    from backend.services.schedules import occurrences, materialize_schedules, MAX_OCCURRENCES
+    results = []
+    start = datetime(2030, 1, 1, 9)  # a Tuesday
+
+    def schedule(kind, **values):
+        return MaintenanceSchedule(id=-len(results) - 1, name='Recurrence check', kind=kind, starts_at=start,
+                                   is_active=True, **values)
+
+    def day(d):
+        return start + timedelta(days=d)
+
+    weekly = schedule('interval_days', interval_days=7)
+    results.append(check("Interval occurrences are stepped from starts_at, not the range start",
+                         occurrences(weekly, day(9), day(31), now=day(-1)) == [day(14), day(21), day(28)]))
+    weekly.ends_at = day(19)
+    results.append(check("Interval occurrences stop at ends_at",
+                         occurrences(weekly, start, day(31), now=day(-1)) == [start, day(7), day(14)]))
+    weekly.ends_at, weekly.generated_until = None, day(7)
+    results.append(check("Occurrences up to generated_until are not pending",
+                         occurrences(weekly, start, day(22), now=day(-1)) == [day(14), day(21)]))
+    weekly.generated_until = None
+    results.append(check("A schedule without a watermark starts pending from now",
+                         occurrences(weekly, start, day(22), now=day(9)) == [day(14), day(21)]))
+
+    hours = schedule('operating_hours', operating_hours=40, hours_per_day=8)
+    results.append(check("Operating hours are projected at hours_per_day (40h at 8h/day = 5 days)",
+                         occurrences(hours, start, day(20), now=day(-1)) == [start, day(5), day(10), day(15)]))
+
+    monthly = schedule('rrule', rrule='FREQ=MONTHLY;BYDAY=1MO')
+    found = occurrences(monthly, start, day(365), now=day(-1))
+    expected = [day(d) for d in range(365) if day(d).weekday() == 0 and day(d).day <= 7]
+    results.append(check("RRULE expands to the first Monday of each month", found == expected, found))
+    hourly = schedule('rrule', rrule='FREQ=HOURLY')
+    results.append(check("RRULE expansion is capped at MAX_OCCURRENCES",
+                         len(occurrences(hourly, start, day(365), now=day(-1))) == MAX_OCCURRENCES))
+
+    client = app.test_client()
+    client.post('/auth/login', json={'email': 'admin@gearguard.com', 'password': 'admin123'})
+    with app.app_context():
+        # Start tomorrow so the real clock the calendar uses does not matter
+        first = datetime.combine(datetime.utcnow().date() + timedelta(days=1), time(9))
+        target = Equipment.query.filter_by(is_scrapped=False).order_by(Equipment.id).first()
+        category = Equipment.query.filter(Equipment.is_scrapped.is_(False),
+                                          Equipment.category_id.isnot(None)).first().category_id
+        fleet = [e.id for e in Equipment.query.filter_by(category_id=category, is_scrapped=False)]
+        every_other_day = MaintenanceSchedule(name='Every other day', kind='interval_days', interval_days=2,
+                                              category_id=category, starts_at=first)
+        mon_wed_fri = MaintenanceSchedule(name='Mon/Wed/Fri', kind='rrule', rrule='FREQ=WEEKLY;BYDAY=MO,WE,FR',
+                                          equipment_id=target.id, starts_at=first)
+        db.session.add_all([every_other_day, mon_wed_fri])
+        db.session.commit()
+        schedule_ids = {every_other_day.id, mon_wed_fri.id}
+        window = (first - timedelta(days=1), first + timedelta(days=29, hours=12))
+        expected = sorted(
+            [(every_other_day.id, e, first + timedelta(days=d)) for d in range(0, 30, 2) for e in fleet] +
+            [(mon_wed_fri.id, target.id, first + timedelta(days=d)) for d in range(30)
+             if (first + timedelta(days=d)).weekday() in (0, 2, 4)]
+        )
+
+    def calendar_occurrences():
+        """(schedule id, equipment id, datetime) of every calendar event from the two schedules"""
+        events = client.get('/api/calendar/events', query_string={
+            'start': window[0].isoformat(), 'end': window[1].isoformat()}).get_json()
+        with app.app_context():
+            generated = {r.id: (r.schedule_id, r.equipment_id, r.scheduled_date)
+                         for r in MaintenanceRequest.query.filter(MaintenanceRequest.schedule_id.in_(schedule_ids))}
+        found = []
+        for event in events:
+            if event['extendedProps'].get('virtual'):
+                if event['extendedProps']['schedule_id'] in schedule_ids:
+                    _, schedule_id, equipment_id, _ = event['id'].split('-')
+                    found.append((int(schedule_id), int(equipment_id), datetime.fromisoformat(event['start'])))
+            elif event['id'] in generated:
+                found.append(generated[event['id']])
+        return sorted(found), len(generated)
+
+    found, generated = calendar_occurrences()
+    results.append(check("Virtual occurrences cover the window before materializing",
+                         found == expected and generated == 0, f'{len(found)} of {len(expected)}'))
+
+    # Horizon landing exactly on an occurrence: it becomes a request, the calendar must not repeat it
+    boundary = first + timedelta(days=4)
+    with app.app_context():
+        created = materialize_schedules(now=boundary - timedelta(days=14))
+        results.append(check("Materializing includes the occurrence on the horizon",
+                             MaintenanceRequest.query.filter_by(schedule_id=every_other_day.id,
+                                                                scheduled_date=boundary).count() == len(fleet)))
+        results.append(check("Materializing again is a no-op",
+                             materialize_schedules(now=boundary - timedelta(days=14)) == 0))
+    found, generated = calendar_occurrences()
+    results.append(check("Calendar shows each occurrence once across generated_until",
+                         found == expected and generated == created, f'{len(found)} of {len(expected)}'))
+
+    with app.app_context():
+        later = materialize_schedules(now=boundary - timedelta(days=14) + timedelta(days=5))
+    found, generated = calendar_occurrences()
+    results.append(check("Moving the horizon on adds only the new occurrences",
+                         found == expected and generated == created + later and later > 0,
+                         f'{len(found)} of {len(expected)}'))
+
+    return all(results)
+
+
+def test_counter_columns(app):
+    """Counter columns stay equal to fresh COUNTs through every write path"""
+    print_section("COUNTER COLUMNS TEST")
+    from backend.services.counters import verify_counters
+    from backend.models import EquipmentCategory, Equipment, TeamMember
+    results = []
+
+    def drift(label, response=None):
+        """Check the write went through, then compare every counter with a fresh COUNT"""
+        if response is not None and response.status_code >= 400:
+            return results.append(check(f"{label} succeeds", False, response.status_code))
+        with app.app_context():
+            report = verify_counters(0)
+            drifted = {name: entry['drifted'] for name, entry in report.items() if entry['drifted']}
+        results.append(check(f"No drift after {label}", not drifted, drifted))
+        return response
+
+    client = app.test_client()
+    client.post('/auth/login', json={'email': 'admin@gearguard.com', 'password': 'admin123'})
+    with app.app_context():
+        stages = MaintenanceStage.query.order_by(MaintenanceStage.sequence).all()
+        first = stages[0].id
+        open_stage = next(s.id for s in stages if s.is_open and s.id != first)
+        done = next(s.id for s in stages if s.is_done)
+        scrap = next(s.id for s in stages if s.is_scrap)
+        teams = [t.id for t in MaintenanceTeam.query.order_by(MaintenanceTeam.id)]
+        categories = [c.id for c in EquipmentCategory.query.order_by(EquipmentCategory.id)]
+        equipment = [e.id for e in Equipment.query.filter_by(is_scrapped=False).order_by(Equipment.id).limit(3)]
+        request_ids = [r.id for r in MaintenanceRequest.query.filter(MaintenanceRequest.is_open.is_(True))
+                       .order_by(MaintenanceRequest.id).limit(12)]
+    drift("seeding")
+
+    created = drift("create", client.post('/api/requests', json={
+        'name': 'Counter check', 'equipment_id': equipment[0], 'team_id': teams[0], 'stage_id': first
+    })).get_json()['id']
+    with app.app_context():
+        results.append(check("Create bumps the equipment's open request count",
+                             db.session.get(Equipment, equipment[0]).open_request_count >= 1))
+    drift("move to a done stage", client.post(f'/api/requests/{created}/move-stage', json={'stage_id': done}))
+    drift("PUT reopening with new team and equipment", client.put(f'/api/requests/{created}', json={
+        'stage_id': first, 'team_id': teams[1], 'equipment_id': equipment[1]}))
+    drift("bulk stage move and team assignment", client.post('/api/requests/bulk', json={'operations': [
+        {'op': 'move_stage', 'ids': request_ids[:6], 'value': done},
+        {'op': 'assign_team', 'ids': request_ids[6:], 'value': teams[-1]}
+    ]}))
+    drift("flagging an open stage done", client.put(f'/api/stages/{open_stage}', json={'is_done': True}))
+    drift("unflagging it", client.put(f'/api/stages/{open_stage}', json={'is_done': False}))
+    drift("move to the scrap stage", client.post(f'/api/requests/{created}/move-stage', json={'stage_id': scrap}))
+    drift("delete", client.delete(f'/api/requests/{created}'))
+    drift("equipment category change", client.put(f'/api/equipment/{equipment[2]}',
+                                                  json={'category_id': categories[-1]}))
+    member = drift("member add", client.post(f'/api/teams/{teams[0]}/members',
+                                             json={'name': 'Counter Member'})).get_json()['id']
+    with app.app_context():
+        db.session.get(TeamMember, member).team_id = teams[1]
+        db.session.commit()
+    drift("member move to another team")
+    drift("member delete", client.delete(f'/api/teams/{teams[1]}/members/{member}'))
+
+    return all(results)
+
+
+def test_change_feed_paging(app):
+    """A paged full snapshot plus the deltas after it rebuild the current tables"""
+    print_section("CHANGE FEED PAGING TEST")
+    from backend.models import Equipment
+    from backend.services.changes import CHANGE_FEEDS, encode_token
+    results = []
+    client = app.test_client()
+    client.post('/auth/login', json={'email': 'admin@gearguard.com', 'password': 'admin123'})
+    state = {name: {} for name in CHANGE_FEEDS}
+    pages = []
+
+    def pull(token=None):
+        """Apply pages the way GearGuardAPI.sync does until has_more is false"""
+        while True:
+            delta = client.get('/api/changes', query_string={'since': token or '', 'limit': 7}).get_json()
+            pages.append(delta)
+            for name in CHANGE_FEEDS:
+                if delta['full']:
+                    state[name].clear()
+            for name in CHANGE_FEEDS:
+                for row_id in delta['deleted'][name]:
+                    state[name].pop(row_id, None)
+                for row in delta['changes'][name]:
+                    state[name][row['id']] = row
+            token = delta['token']
+            if not delta['has_more'] or len(pages) > 1000:
+                return token
+
+    first = client.get('/api/changes', query_string={'limit': 7}).get_json()
+    pages.append(first)
+    for name in CHANGE_FEEDS:
+        for row in first['changes'][name]:
+            state[name][row['id']] = row
+    results.append(check("A snapshot page holds at most `limit` rows",
+                         sum(len(rows) for rows in first['changes'].values()) == 7 and first['has_more']))
+
+    # Writes while the snapshot is being paged: before and after the cursor
+    sent = min(state['requests'])
+    with app.app_context():
+        unsent = db.session.query(db.func.max(MaintenanceRequest.id)).scalar()
+        renamed = next(r for r in MaintenanceRequest.query.order_by(MaintenanceRequest.id) if r.id != sent)
+        renamed_id = renamed.id
+        category = Equipment.query.first().category_id
+    deletes = [client.delete(f'/api/requests/{request_id}').status_code for request_id in (sent, unsent)]
+    renames = client.put(f'/api/requests/{renamed_id}', json={'name': 'Renamed while paging'}).status_code
+    added = client.post('/api/equipment', json={'name': 'Added while paging', 'serial_number': 'SN-PAGING-1',
+                                                'category_id': category})
+    statuses = deletes + [renames, added.status_code]
+    results.append(check("Writes during the snapshot succeed", all(code < 400 for code in statuses), statuses))
+
+    token = pull(first['token'])
+    results.append(check("Only the first snapshot page resets the local copy",
+                         [page['full'] for page in pages].count(True) == 1 and pages[0]['full']))
+    results.append(check("Every page holds at most `limit` rows", all(
+        sum(len(rows) for rows in page['changes'].values()) <= 7 for page in pages)))
+
+    with app.app_context():
+        expected = {name: {row.id for row in model.query} for name, model in CHANGE_FEEDS.items()}
+        renamed = db.session.get(MaintenanceRequest, renamed_id).name
+    synced = {name: set(rows) for name, rows in state.items()}
+    results.append(check("Snapshot pages plus deltas match the tables", synced == expected,
+                         {name: len(ids ^ expected[name]) for name, ids in synced.items()}))
+    results.append(check("Rows changed behind the cursor arrive with their new values",
+                         state['requests'][renamed_id]['name'] == renamed == 'Renamed while paging'))
+
+    final = client.get('/api/changes', query_string={'since': token}).get_json()
+    results.append(check("The final token is an ordinary delta token",
+                         not final['full'] and not final['has_more'] and not any(final['changes'].values())))
+    bogus = encode_token(1, ('bogus', 1))
+    results.append(check("Unknown snapshot cursors are rejected",
+                         client.get('/api/changes', query_string={'since': bogus}).status_code == 400))
+
+    return all(results)
+
+
+def run_all_tests():
+    """Run all tests and return summary"""
+    print(f"\n{Colors.BOLD}{Colors.BLUE}")
+    print("╔═════════════════════════════════════════════════════════════╗")
+    print("║                                                             ║")
+    print("║     GEARGUARD SERVICE BEHAVIOUR TEST SUITE                  ║")
+    print("║                                                             ║")
+    print("╚═════════════════════════════════════════════════════════════╝")
+    print(f"{Colors.RESET}\n")
+
+    app = create_app('production')
+    with app.app_context():
+        seed_database()
+
+    tests = [
+        ("Auto-Scheduler", test_auto_scheduler),
+        ("Shift Availability", test_shift_availability),
+        ("Schedule Recurrence", test_schedule_recurrence),
+        ("Counter Columns", test_counter_columns),
+        ("Change Feed Paging", test_change_feed_paging),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            passed = test_func(app)
+            results.append((name, passed))
+        except Exception as e:
+            print_test(f"Test '{name}' crashed: {e}", "FAIL")
+            results.append((name, False))
+
+    with app.app_context():
+        db.engine.dispose()
+
+    # Print summary
+    print_section("TEST SUMMARY")
+    passed_count = sum(1 for _, passed in results if passed)
+    total_count = len(results)
+
+    for name, passed in results:
+        status = "PASS" if passed else "FAIL"
+        print_test(f"{name}: {status}", status)
+
+    print(f"\n{Colors.BOLD}")
+    print(f"Total Tests: {total_count}")
+    print(f"{Colors.GREEN}Passed: {passed_count}{Colors.RESET}")
+    print(f"{Colors.RED}Failed: {total_count - passed_count}{Colors.RESET}")
+
+    if passed_count == total_count:
+        print(f"\n{Colors.BOLD}{Colors.GREEN}{'='*60}")
+        print("ALL TESTS PASSED! ✓")
+        print(f"{'='*60}{Colors.RESET}\n")
+        return 0
+    else:
+        print(f"\n{Colors.BOLD}{Colors.RED}{'='*60}")
+        print(f"SOME TESTS FAILED! {total_count - passed_count}/{total_count} failures")
+        print(f"{'='*60}{Colors.RESET}\n")
+        return 1
+
+if __name__ == '__main__':
+    exit_code = run_all_tests()
+    os.unlink(_scratch.name)
+    sys.exit(exit_code)